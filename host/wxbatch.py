@@ -0,0 +1,128 @@
+"""
+Decoder for the batched binary telemetry published by the weather station (see src/batch.py).
+
+This module runs on the host under CPython. A batch consists of a header with magic "WB", the
+batch format version, the record layout version, and the record count, followed by fixed-size
+records. Each record holds a timestamp, a presence bitmask, and one fixed-point integer per field.
+
+Usage:
+    records = wxbatch.decode(payload)  # list of dicts like the station's JSON records
+    arr = wxbatch.to_numpy(payload)  # NumPy structured array, absent values are NaN
+"""
+import struct
+
+HDR_FMT = "<2sBBH"
+HDR_SIZE = struct.calcsize(HDR_FMT)
+MAGIC = b"WB"
+BATCH_VERSIONS = (1,)
+
+# The device timestamps records with time.time(), MicroPython's epoch is 2000-01-01
+EPOCH_OFFSET = 946684800
+
+# Record layouts by version: list of (name, struct code, decimals) in record order
+LAYOUTS = {
+    1: [
+        ("t_bme680", "h", 2),
+        ("h_bme680", "h", 1),
+        ("p_bme680", "i", 5),
+        ("g_bme680", "i", 0),
+        ("t_si7021", "h", 2),
+        ("h_si7021", "h", 1),
+        ("t_sht31", "h", 2),
+        ("h_sht31", "h", 1),
+        ("wind", "h", 2),
+        ("gust", "h", 2),
+        ("wdir", "h", 0),
+        ("pm25", "h", 1),
+        ("aqi_tvoc", "h", 0),
+        ("aqi_pm25", "h", 0),
+    ],
+}
+# Each version appends fields to the previous one
+LAYOUTS[2] = LAYOUTS[1] + [("gdir", "h", 0)]  # gust direction
+LAYOUTS[3] = LAYOUTS[2] + [("wdir_sd", "h", 1), ("ti", "h", 2)]  # direction std dev, turbulence
+LAYOUTS[4] = LAYOUTS[3] + [("rain_rate", "h", 2), ("rain_event", "h", 2), ("rain_day", "h", 2)]
+LAYOUTS[5] = LAYOUTS[4] + [("rain_1h", "h", 2), ("rain_24h", "h", 2)]  # rolling rain totals
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def _layout(version):
+    try:
+        fields = LAYOUTS[version]
+    except KeyError:
+        raise DecodeError("unknown record version %d" % version)
+    fmt = "<II" + "".join(f[1] for f in fields)
+    return fields, struct.Struct(fmt)
+
+
+def header(payload):
+    """
+    Return (batch_version, record_version, count) after validating the header and length.
+    """
+    if len(payload) < HDR_SIZE:
+        raise DecodeError("payload too short")
+    magic, bver, rver, count = struct.unpack_from(HDR_FMT, payload)
+    if magic != MAGIC:
+        raise DecodeError("bad magic %r" % magic)
+    if bver not in BATCH_VERSIONS:
+        raise DecodeError("unknown batch version %d" % bver)
+    rec = _layout(rver)[1]
+    if len(payload) != HDR_SIZE + count * rec.size:
+        raise DecodeError(
+            "length %d does not match %d records of %d bytes" % (len(payload), count, rec.size)
+        )
+    return bver, rver, count
+
+
+def decode(payload):
+    """
+    Decode a batch into a list of dicts, one per record, with the same keys and units as the
+    station's JSON records plus "ts" in Unix time. Absent fields are omitted.
+    """
+    _, rver, count = header(payload)
+    fields, rec = _layout(rver)
+    records = []
+    for i in range(count):
+        vals = rec.unpack_from(payload, HDR_SIZE + i * rec.size)
+        mask = vals[1]
+        r = {"ts": vals[0] + EPOCH_OFFSET}
+        for ix, (name, _, dec) in enumerate(fields):
+            if mask & (1 << ix):
+                v = vals[ix + 2]
+                r[name] = v / 10 ** dec if dec else v
+        records.append(r)
+    return records
+
+
+def to_numpy(payload):
+    """
+    Decode a batch into a NumPy structured array with a "ts" column in Unix time and one float64
+    column per field, absent values are NaN. Requires NumPy.
+    """
+    import numpy as np
+
+    _, rver, count = header(payload)
+    fields, rec = _layout(rver)
+    dtype = np.dtype(
+        [("ts", "<u4"), ("mask", "<u4")] + [(name, "<" + code) for name, code, _ in fields]
+    )
+    raw = np.frombuffer(payload, dtype=dtype, count=count, offset=HDR_SIZE)
+    out = np.empty(count, dtype=[("ts", "<i8")] + [(name, "<f8") for name, _, _ in fields])
+    out["ts"] = raw["ts"].astype("<i8") + EPOCH_OFFSET
+    for ix, (name, _, dec) in enumerate(fields):
+        col = raw[name] / 10.0 ** dec
+        col[(raw["mask"] & (1 << ix)) == 0] = np.nan
+        out[name] = col
+    return out
+
+
+if __name__ == "__main__":
+    import sys, json
+
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            for r in decode(f.read()):
+                print(json.dumps(r))
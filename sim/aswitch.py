@@ -0,0 +1,21 @@
+# Stand-in for mpy-lib's aswitch module: nobody presses the buttons of a simulated station.
+
+
+class Switch:
+    debounce_ms = 50
+
+    def __init__(self, pin):
+        self.pin = pin
+        self._close_func = None
+        self._open_func = None
+
+    def close_func(self, func, args=()):
+        self._close_func = func
+        self._close_args = args
+
+    def open_func(self, func, args=()):
+        self._open_func = func
+        self._open_args = args
+
+    def __call__(self):
+        return self.pin.value()
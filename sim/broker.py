@@ -0,0 +1,54 @@
+# Stand-in for the mpy-mqtt connection: an MQTT client whose broker records what is published
+# and can be unreachable during scheduled outages.
+import uasyncio as asyncio
+import vclock
+
+
+class Client:
+    """
+    Client implements the parts of mqtt_async.MQTTClient used by the station. Outages is a list
+    of (start, end) virtual seconds during which the broker can't be reached.
+    """
+
+    def __init__(self, outages=(), keep=True, rtt_ms=30):
+        self.outages = list(outages)
+        self.keep = keep  # keep every message, otherwise only counts and the last message
+        self.rtt_ms = rtt_ms
+        self.msgs = {}  # topic -> list of (device time, payload)
+        self.last = {}  # topic -> payload
+        self.count = {}  # topic -> number of messages
+        self.bytes = 0
+        self.failed = 0
+        self.listeners = []  # called with (topic, payload) on each publish
+
+    def isconnected(self):
+        s = vclock.seconds()
+        for start, end in self.outages:
+            if start <= s < end:
+                return False
+        return True
+
+    async def publish(self, topic, msg, retain=False, qos=0, sync=True):
+        if not self.isconnected():
+            self.failed += 1
+            raise OSError(113)  # EHOSTUNREACH
+        await asyncio.sleep_ms(self.rtt_ms if sync else 0)
+        if isinstance(topic, str):
+            topic = topic.encode()
+        msg = msg.encode() if isinstance(msg, str) else bytes(msg)
+        if self.keep:
+            self.msgs.setdefault(topic, []).append((vclock.time(), msg))
+        self.last[topic] = msg
+        self.count[topic] = self.count.get(topic, 0) + 1
+        self.bytes += len(msg)
+        for fn in self.listeners:
+            fn(topic, msg)
+
+
+class MQTT:
+    """
+    MQTT stands in for the board's mqtt module object passed to weather.start.
+    """
+
+    def __init__(self, client):
+        self.client = client
@@ -0,0 +1,16 @@
+# Stand-in for the ESP32 pulse counter module of mpy-lib (esp32-counter): counts the pulses of
+# the simulated board in a 16-bit counter that wraps like the hardware one.
+import devices
+
+
+class Counter:
+    def __init__(self, unit, pin):
+        self.unit = unit
+        self.pin = pin.id if hasattr(pin, "id") else pin
+        self.base = devices.board.pulses(self.pin)
+
+    def filter(self, us):
+        self.filter_us = us
+
+    def value(self):
+        return (devices.board.pulses(self.pin) - self.base) % 32768
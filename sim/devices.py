@@ -0,0 +1,432 @@
+# Simulated peripherals of the weather station: register-level I2C sensor models that produce
+# the raw readings the real drivers decode, the SSD1306 display controller, the PMSx003 UART
+# stream, the wind vane's analog output, and the pulse inputs. Readings come from the World
+# plus per-sensor offset and noise, conversions take time on the virtual clock.
+import random, struct
+import vclock
+
+ENODEV = 19
+EIO = 5
+
+
+def _nack():
+    return OSError(ENODEV)
+
+
+class I2CDevice:
+    """
+    I2CDevice is the base class of simulated I2C devices, subclasses implement the transfers.
+    """
+
+    def write(self, data):
+        raise _nack()
+
+    def read(self, n):
+        raise _nack()
+
+    def write_mem(self, reg, data):
+        raise _nack()
+
+    def read_mem(self, reg, n):
+        raise _nack()
+
+
+# ===== BME680
+
+
+class Bme680(I2CDevice):
+    """
+    Bme680 emulates the registers of the Bosch BME680. Its calibration constants are those of a
+    real part, the ADC values of each conversion are found by searching for the raw values that
+    the driver's own compensation turns into the world's temperature, pressure, humidity, and
+    gas resistance.
+    """
+
+    # calibration parameters of a sample part
+    PAR = dict(t1=25946, t2=26185, t3=3, p1=36145, p2=-10424, p3=88, p4=6541, p5=-122, p6=30,
+        p7=34, p8=-4117, p9=-2780, p10=30, h1=778, h2=1015, h3=0, h4=45, h5=20, h6=120, h7=-100,
+        gh1=-30, gh2=-5969, gh3=18)
+
+    def __init__(self, world, seed=680):
+        import bme680, bme680_consts as c
+
+        self.world = world
+        self.rng = random.Random(seed)
+        self.regs = bytearray(256)
+        cal = bytearray(c.COEFF_ADDR1_LEN + c.COEFF_ADDR2_LEN)
+        p = self.PAR
+
+        def word(msb, lsb, v):
+            cal[msb], cal[lsb] = (v >> 8) & 0xFF, v & 0xFF
+
+        word(c.T1_MSB_REG, c.T1_LSB_REG, p["t1"])
+        word(c.T2_MSB_REG, c.T2_LSB_REG, p["t2"])
+        cal[c.T3_REG] = p["t3"] & 0xFF
+        word(c.P1_MSB_REG, c.P1_LSB_REG, p["p1"])
+        word(c.P2_MSB_REG, c.P2_LSB_REG, p["p2"])
+        cal[c.P3_REG] = p["p3"] & 0xFF
+        word(c.P4_MSB_REG, c.P4_LSB_REG, p["p4"])
+        word(c.P5_MSB_REG, c.P5_LSB_REG, p["p5"])
+        cal[c.P6_REG] = p["p6"] & 0xFF
+        cal[c.P7_REG] = p["p7"] & 0xFF
+        word(c.P8_MSB_REG, c.P8_LSB_REG, p["p8"])
+        word(c.P9_MSB_REG, c.P9_LSB_REG, p["p9"])
+        cal[c.P10_REG] = p["p10"]
+        cal[c.H1_MSB_REG] = p["h1"] >> 4
+        cal[c.H1_LSB_REG] = ((p["h2"] & 0xF) << 4) | (p["h1"] & 0xF)
+        cal[c.H2_MSB_REG] = p["h2"] >> 4
+        for k in ("h3", "h4", "h5", "h6", "h7", "gh1", "gh3"):
+            cal[getattr(c, k.upper() + "_REG")] = p[k] & 0xFF
+        word(c.GH2_MSB_REG, c.GH2_LSB_REG, p["gh2"])
+        self.regs[c.COEFF_ADDR1 : c.COEFF_ADDR1 + c.COEFF_ADDR1_LEN] = cal[: c.COEFF_ADDR1_LEN]
+        self.regs[c.COEFF_ADDR2 : c.COEFF_ADDR2 + c.COEFF_ADDR2_LEN] = cal[c.COEFF_ADDR1_LEN :]
+        self.regs[c.ADDR_RES_HEAT_RANGE_ADDR] = 0x10
+        self.regs[c.ADDR_RES_HEAT_VAL_ADDR] = 50
+        self.regs[c.CHIP_ID_ADDR] = c.CHIP_ID
+        # the driver's compensation code, used to invert it
+        comp = object.__new__(bme680.BME680)
+        bme680.BME680Data.__init__(comp)
+        comp.calibration_data.set_from_array(cal)
+        comp.calibration_data.set_other(0x10, 50, 0)
+        self.comp = comp
+        self.c = c
+        self.done_us = None  # when the conversion in progress completes
+        self.meas = 0
+        self.cache = {}
+        self.conversions = 0
+
+    def _search(self, fn, target, lo, hi, rising):
+        # find the raw value in [lo, hi) for which the monotonic fn comes closest to target
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if (fn(mid) <= target) == rising:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def _raw(self, t, p, h, g):
+        key = (round(t, 2), round(p), round(h, 1), round(g, -2))
+        r = self.cache.get(key)
+        if r is not None:
+            return r
+        comp = self.comp
+        at = self._search(comp._calc_temperature, t * 100, 0, 1 << 20, True)
+        comp._calc_temperature(at)  # sets t_fine for pressure and humidity
+        ap = self._search(comp._calc_pressure, p, 0, 1 << 20, False)
+        ah = self._search(comp._calc_humidity, h * 1000, 0, 1 << 16, True)
+        # pick the gas range that puts the reading closest to mid-scale
+        best = None
+        for rng in range(16):
+            ag = self._search(lambda a: comp._calc_gas_resistance(a, rng), g, 0, 1024, False)
+            if best is None or abs(ag - 512) < abs(best[0] - 512):
+                best = (ag, rng)
+        r = (at, ap, ah) + best
+        if len(self.cache) > 4096:
+            self.cache.clear()
+        self.cache[key] = r
+        return r
+
+    def _complete(self):
+        # conversion finished: latch the results into the field registers
+        c = self.c
+        w = self.world.at()
+        rng = self.rng
+        t = w.temp + 0.3 + rng.gauss(0, 0.02)  # self-heating offset
+        p = w.press * 100 + rng.gauss(0, 2)
+        h = min(max(w.hum - 1.5 + rng.gauss(0, 0.1), 0), 100)
+        at, ap, ah, ag, grange = self._raw(t, p, h, w.gas * rng.uniform(0.98, 1.02))
+        f = c.FIELD0_ADDR
+        regs = self.regs
+        self.meas = (self.meas + 1) & 0xFF
+        regs[f] = c.NEW_DATA_MSK
+        regs[f + 1] = self.meas
+        regs[f + 2 : f + 5] = bytes((ap >> 12, (ap >> 4) & 0xFF, (ap & 0xF) << 4))
+        regs[f + 5 : f + 8] = bytes((at >> 12, (at >> 4) & 0xFF, (at & 0xF) << 4))
+        regs[f + 8 : f + 10] = bytes((ah >> 8, ah & 0xFF))
+        regs[f + 13] = ag >> 2
+        regs[f + 14] = ((ag & 3) << 6) | c.GASM_VALID_MSK | c.HEAT_STAB_MSK | grange
+        regs[c.CONF_T_P_MODE_ADDR] &= ~c.MODE_MSK & 0xFF
+        self.done_us = None
+        self.conversions += 1
+
+    def _poll(self):
+        if self.done_us is not None and vclock.now_us >= self.done_us:
+            self._complete()
+
+    def write_mem(self, reg, data):
+        c = self.c
+        self._poll()
+        for i, v in enumerate(data):
+            r = reg + i
+            if r == c.SOFT_RESET_ADDR:
+                if v == c.SOFT_RESET_CMD:
+                    self.regs[0x50:0x75] = bytes(0x75 - 0x50)
+                    self.done_us = None
+                continue
+            self.regs[r] = v
+            if r == c.CONF_T_P_MODE_ADDR and v & c.MODE_MSK == c.FORCED_MODE:
+                # TPH measurement with the configured oversampling plus the heater duration
+                wait = self.regs[c.GAS_WAIT0_ADDR]
+                wait_ms = (wait & 0x3F) * (4 ** (wait >> 6))
+                self.done_us = vclock.now_us + (30 + wait_ms) * 1000
+                self.regs[c.FIELD0_ADDR] = 0x20  # measuring
+
+    def read_mem(self, reg, n):
+        self._poll()
+        return bytes(self.regs[reg : reg + n])
+
+
+# ===== Si7021 and SHT31
+
+
+def _crc8(data, init):
+    crc = init
+    for v in data:
+        crc ^= v
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x131) if crc & 0x80 else crc << 1
+    return crc
+
+
+class Si7021(I2CDevice):
+    """
+    Si7021 emulates the no-hold-master humidity measurement followed by the read of the
+    temperature measured along with it.
+    """
+
+    def __init__(self, world, seed=7021):
+        self.world = world
+        self.rng = random.Random(seed)
+        self.done_us = None
+        self.temp = self.hum = 0
+        self.next = None  # what the next read returns
+
+    def write(self, data):
+        if data[0] == 0xF5:
+            w = self.world.at()
+            self.temp = w.temp - 0.2 + self.rng.gauss(0, 0.02)
+            self.hum = w.hum + 1.0 + self.rng.gauss(0, 0.1)
+            self.done_us = vclock.now_us + 23000
+            self.next = "rh"
+        elif data[0] == 0xE0:
+            self.next = "t"
+        elif data[0] == 0xFE:
+            self.next = None
+        else:
+            raise OSError(EIO)
+
+    def read(self, n):
+        if self.next is None or vclock.now_us < self.done_us:
+            raise _nack()  # measurement in progress
+        if self.next == "rh":
+            v = int((self.hum + 6) * 65536 / 125) & 0xFFFC
+            raw = bytes((v >> 8, v & 0xFF))
+            return (raw + bytes((_crc8(raw, 0),)))[:n]
+        v = int((self.temp + 46.85) * 65536 / 175.72) & 0xFFFC
+        return bytes((v >> 8, v & 0xFF))[:n]
+
+
+class Sht31(I2CDevice):
+    """
+    Sht31 emulates single-shot measurements of the Sensirion SHT31.
+    """
+
+    def __init__(self, world, seed=31):
+        self.world = world
+        self.rng = random.Random(seed)
+        self.done_us = None
+        self.raw = None
+
+    def write(self, data):
+        if len(data) != 2 or data[0] not in (0x2C, 0x24):
+            raise OSError(EIO)
+        w = self.world.at()
+        t = w.temp + 0.1 + self.rng.gauss(0, 0.015)
+        h = min(max(w.hum + self.rng.gauss(0, 0.08), 0), 100)
+        t = min(max(int((t + 45) * 65535 / 175), 0), 65535)
+        h = int(h * 65535 / 100)
+        raw = bytearray(6)
+        raw[0:2] = bytes((t >> 8, t & 0xFF))
+        raw[2] = _crc8(raw[0:2], 0xFF)
+        raw[3:5] = bytes((h >> 8, h & 0xFF))
+        raw[5] = _crc8(raw[3:5], 0xFF)
+        self.raw = bytes(raw)
+        self.done_us = vclock.now_us + 15000
+
+    def read(self, n):
+        if self.raw is None or vclock.now_us < self.done_us:
+            raise _nack()
+        raw, self.raw = self.raw, None
+        return raw[:n]
+
+
+# ===== SSD1306
+
+
+class Ssd1306(I2CDevice):
+    """
+    Ssd1306 emulates the display controller's horizontal addressing mode and keeps a copy of
+    its display RAM, counting the bytes sent to it.
+    """
+
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.cmd = []  # pending multi-byte command
+        self.col = [0, width - 1]
+        self.page = [0, self.pages - 1]
+        self.ptr = (0, 0)
+        self.data_bytes = 0
+        self.transfers = 0
+
+    def _command(self, b):
+        self.cmd.append(b)
+        op = self.cmd[0]
+        if op in (0x21, 0x22):
+            if len(self.cmd) < 3:
+                return
+            if op == 0x21:
+                self.col = self.cmd[1:3]
+            else:
+                self.page = self.cmd[1:3]
+            self.ptr = (self.col[0], self.page[0])
+        elif op in (0x20, 0x81, 0x8D, 0xA8, 0xD3, 0xD5, 0xD9, 0xDA, 0xDB) and len(self.cmd) < 2:
+            return
+        self.cmd = []
+
+    def _data(self, data):
+        x, p = self.ptr
+        c0, c1 = self.col
+        p0, p1 = self.page
+        ram, w = self.ram, self.width
+        for b in data:
+            ram[p * w + x] = b
+            x += 1
+            if x > c1:
+                x = c0
+                p = p + 1 if p < p1 else p0
+        self.ptr = (x, p)
+        self.data_bytes += len(data)
+        self.transfers += 1
+
+    def write(self, data):
+        # each message starts with a control byte: 0x80 a command byte, 0x40 a data stream
+        if data[0] == 0x80:
+            for i in range(1, len(data), 2):
+                self._command(data[i])
+        elif data[0] == 0x00:
+            for b in data[1:]:
+                self._command(b)
+        elif data[0] == 0x40:
+            self._data(memoryview(data)[1:])
+        else:
+            raise OSError(EIO)
+
+
+# ===== PMSx003
+
+
+class Pms(object):
+    """
+    Pms emulates the UART of a PMSx003 in active mode, which sends a frame every second.
+    """
+
+    RX_BUF = 256
+
+    def __init__(self, world, seed=3003):
+        self.world = world
+        self.rng = random.Random(seed)
+        self.buf = bytearray()
+        self.sent_s = vclock.now_us // 1000000  # second of the last frame sent
+        self.overruns = 0
+
+    def _frame(self):
+        w = self.world.at()
+        pm = max(0, int(w.pm25 + self.rng.gauss(0, 1.5)))
+        c03 = pm * 70 + self.rng.randint(0, 50)
+        c25 = pm // 2
+        words = (28, pm * 2 // 3, pm, pm * 5 // 4, pm * 2 // 3, pm, pm * 5 // 4, c03,
+            c03 // 3, c03 // 10, c25, c25 // 4, c25 // 10, 0x9700)
+        frame = bytearray(b"\x42\x4d" + struct.pack(">14H", *words) + b"\0\0")
+        struct.pack_into(">H", frame, 30, sum(frame[:30]))
+        return frame
+
+    def _fill(self):
+        now_s = vclock.now_us // 1000000
+        if now_s - self.sent_s > 8:
+            self.sent_s = now_s - 8  # older frames were lost to the overrun anyway
+        while self.sent_s < now_s:
+            self.sent_s += 1
+            f = self._frame()
+            room = self.RX_BUF - len(self.buf)
+            if room < len(f):
+                self.overruns += 1
+            self.buf += f[:room]
+
+    def any(self):
+        self._fill()
+        return len(self.buf)
+
+    def read(self, n=None):
+        self._fill()
+        if not self.buf:
+            return None
+        n = len(self.buf) if n is None else n
+        r = bytes(self.buf[:n])
+        del self.buf[:n]
+        return r
+
+
+# ===== board
+
+
+class Board:
+    """
+    Board wires the simulated peripherals to the ESP32 pins of the lolin-d32 station.
+    """
+
+    VANE_PIN = 36
+    ANEMO_PIN = 39
+    RAIN_PIN = 34
+
+    def __init__(
+        self, world, display=True, bme680=True, si7021=True, sht31=True, pms=True, reset_cause=1
+    ):
+        self.world = world
+        self.reset_cause = reset_cause  # machine.reset_cause() value
+        self.rng = random.Random(36)
+        sensors = {}
+        if bme680:
+            sensors[0x77] = Bme680(world)
+        if si7021:
+            sensors[0x40] = Si7021(world)
+        if sht31:
+            sensors[0x44] = Sht31(world)
+        self.display = Ssd1306() if display else None
+        # I2C buses by SCL pin
+        self.buses = {23: sensors, 18: {0x3C: self.display} if display else {}}
+        self.pms = Pms(world) if pms else None
+        self.i2c_bytes = 0
+
+    def adc(self, pin):
+        # raw 10-bit reading of an analog pin at 11dB attenuation
+        if pin != self.VANE_PIN:
+            return 0
+        # the vane outputs 140mV..1600mV over 360 degrees, north being at 15 degrees
+        d = (self.world.at().dir - 15) % 360
+        mv = 140 + d / 360 * 1460
+        noise = self.rng.random() - self.rng.random()
+        return min(max(int(mv * 1023 / 3300 + noise), 0), 1023)
+
+    def pulses(self, pin):
+        # cumulative count of pulses on a counter input
+        if pin == self.ANEMO_PIN:
+            return int(self.world.anemo_pulses())
+        if pin == self.RAIN_PIN:
+            return self.world.rain_tips()
+        return 0
+
+
+board = None  # the Board in use, set up by station.setup()
@@ -0,0 +1,101 @@
+# Stand-in for MicroPython's framebuf module, MONO_VLSB format only. Text uses a made-up 8x8
+# font since only the changes to the buffer matter to the simulation. Page-aligned operations
+# work on whole bytes to keep the simulation fast.
+MONO_VLSB = 0
+
+
+def _glyph(ch, k):
+    # column k of the made-up glyph for character ch
+    if ch == " ":
+        return 0
+    return ((ord(ch) * 37 + k * 11) & 0x7E) | 0x01 if k < 7 else 0
+
+
+class FrameBuffer:
+    def __init__(self, buf, width, height, fmt=MONO_VLSB, stride=None):
+        self.buf = buf
+        self.width = width
+        self.height = height
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        i = (y >> 3) * self.width + x
+        if c is None:
+            return (self.buf[i] >> (y & 7)) & 1
+        if c:
+            self.buf[i] |= 1 << (y & 7)
+        else:
+            self.buf[i] &= ~(1 << (y & 7)) & 0xFF
+
+    def fill(self, c):
+        n = self.width * ((self.height + 7) // 8)
+        self.buf[:n] = (b"\xff" if c else b"\0") * n
+
+    def fill_rect(self, x, y, w, h, c):
+        x0, x1 = max(x, 0), min(x + w, self.width)
+        y0, y1 = max(y, 0), min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        buf, W = self.buf, self.width
+        for p in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            lo = max(y0 - p * 8, 0)
+            hi = min(y1 - p * 8, 8)
+            mask = ((1 << hi) - 1) & ~((1 << lo) - 1)
+            row = p * W
+            for i in range(row + x0, row + x1):
+                buf[i] = (buf[i] | mask) if c else (buf[i] & ~mask & 0xFF)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c):
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x0, y0, x1, y1, c):
+        n = max(abs(x1 - x0), abs(y1 - y0), 1)
+        for i in range(n + 1):
+            self.pixel(x0 + (x1 - x0) * i // n, y0 + (y1 - y0) * i // n, c)
+
+    def text(self, s, x, y, c=1):
+        W = self.width
+        for ch in s:
+            for k in range(8):
+                xx = x + k
+                if not 0 <= xx < W:
+                    continue
+                g = _glyph(ch, k)
+                if y & 7 == 0 and 0 <= y < self.height:
+                    i = (y >> 3) * W + xx
+                    self.buf[i] = (self.buf[i] | g) if c else (self.buf[i] & ~g & 0xFF)
+                else:
+                    for b in range(8):
+                        if g >> b & 1:
+                            self.pixel(xx, y + b, c)
+            x += 8
+
+    def blit(self, fb, x, y, key=-1):
+        if y & 7 == 0 and fb.height & 7 == 0 and key == -1:
+            W = self.width
+            for p in range(fb.height >> 3):
+                dp = (y >> 3) + p
+                if not 0 <= dp < (self.height + 7) >> 3:
+                    continue
+                for xx in range(fb.width):
+                    if 0 <= x + xx < W:
+                        self.buf[dp * W + x + xx] = fb.buf[p * fb.width + xx]
+            return
+        for yy in range(fb.height):
+            for xx in range(fb.width):
+                v = fb.pixel(xx, yy)
+                if v != key:
+                    self.pixel(x + xx, y + yy, v)
+
+    def scroll(self, dx, dy):
+        pass
@@ -0,0 +1,64 @@
+# Stand-in for the logging module of mpy-mqtt (board/logging.py). Messages below the global
+# level are dropped before formatting so that a quiet simulation runs fast.
+import sys
+
+CRITICAL = 50
+ERROR = 40
+WARNING = 30
+INFO = 20
+DEBUG = 10
+NOTSET = 0
+
+_level_dict = {CRITICAL: "CRIT", ERROR: "ERROR", WARNING: "WARN", INFO: "INFO", DEBUG: "DEBUG"}
+_loggers = {}
+level = WARNING  # global minimum level, set by the simulation
+stream = sys.stderr
+counts = {}  # number of messages by level
+
+
+class Logger:
+    def __init__(self, name):
+        self.name = name
+        self.level = NOTSET
+
+    def setLevel(self, level):
+        self.level = level
+
+    def isEnabledFor(self, lvl):
+        return lvl >= self.level and lvl >= level
+
+    def log(self, lvl, msg, *args):
+        counts[lvl] = counts.get(lvl, 0) + 1
+        if self.isEnabledFor(lvl):
+            if args:
+                msg = msg % args
+            print("%s:%s:%s" % (_level_dict.get(lvl, lvl), self.name, msg), file=stream)
+
+    def debug(self, msg, *args):
+        if DEBUG >= level:
+            self.log(DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        if INFO >= level:
+            self.log(INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(ERROR, msg, *args)
+
+    def critical(self, msg, *args):
+        self.log(CRITICAL, msg, *args)
+
+    def exc(self, e, msg, *args):
+        self.log(ERROR, msg + ": %r" % (e,), *args)
+
+    def exception(self, lvl, e, msg, *args):
+        self.log(lvl, msg + " %r" % (e,), *args)
+
+
+def getLogger(name="root"):
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
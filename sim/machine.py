@@ -0,0 +1,152 @@
+# Stand-in for MicroPython's machine module on the ESP32, backed by the simulated board.
+import vclock, devices
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.v = 1 if pull == Pin.PULL_UP else 0
+        self.handler = None
+        if value is not None:
+            self.v = value
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.__init__(self.id, mode, pull, value)
+
+    def value(self, v=None):
+        if v is None:
+            return self.v
+        self.v = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self.v = 1
+
+    def off(self):
+        self.v = 0
+
+    def irq(self, handler=None, trigger=IRQ_RISING | IRQ_FALLING):
+        self.handler = handler
+        self.trigger = trigger
+
+    def __repr__(self):
+        return "Pin(%d)" % self.id
+
+
+class I2C:
+    """
+    I2C transfers to the simulated devices on the bus identified by its SCL pin. Each transfer
+    takes the time it would at the bus frequency, an absent device raises OSError(ENODEV).
+    """
+
+    def __init__(self, id=-1, *, scl, sda, freq=400000):
+        self.scl = scl.id if isinstance(scl, Pin) else scl
+        self.freq = freq
+        self.devs = devices.board.buses.get(self.scl, {})
+
+    def _dev(self, addr, nbytes):
+        # account for start, address, payload, and ack bits
+        vclock.advance_us((nbytes + 1) * 9 * 1000000 // self.freq + 10)
+        devices.board.i2c_bytes += nbytes + 1
+        d = self.devs.get(addr)
+        if d is None:
+            raise OSError(devices.ENODEV)
+        return d
+
+    def scan(self):
+        for a in range(0x08, 0x78):
+            vclock.advance_us(9 * 1000000 // self.freq + 10)
+        return sorted(self.devs)
+
+    def writeto(self, addr, buf, stop=True):
+        self._dev(addr, len(buf)).write(bytes(buf))
+        return 1
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(b) for b in vector)
+        self._dev(addr, len(data)).write(data)
+        return 1
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self._dev(addr, nbytes).read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        self._dev(addr, len(buf) + 1).write_mem(memaddr, bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+        d = self._dev(addr, 1)
+        vclock.advance_us((nbytes + 1) * 9 * 1000000 // self.freq)
+        return d.read_mem(memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf))
+
+
+class UART:
+    def __init__(self, id, baudrate=9600, **kw):
+        self.dev = devices.board.pms if id == 2 else None
+
+    def init(self, baudrate=9600, **kw):
+        pass
+
+    def any(self):
+        return self.dev.any() if self.dev else 0
+
+    def read(self, n=None):
+        return self.dev.read(n) if self.dev else None
+
+    def write(self, buf):
+        return len(buf)
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_11DB = 3
+    WIDTH_10BIT = 1
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin):
+        self.pin = pin.id if isinstance(pin, Pin) else pin
+
+    def atten(self, a):
+        pass
+
+    def width(self, w):
+        pass
+
+    def read(self):
+        vclock.advance_us(40)
+        return devices.board.adc(self.pin)
+
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+
+def reset_cause():
+    return devices.board.reset_cause
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x01"
+
+
+def freq():
+    return 240000000
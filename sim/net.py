@@ -0,0 +1,93 @@
+# Simulated CWOP servers for cwop.py: getaddrinfo stands in for the socket module's and rotates
+# through the servers' addresses like rotate.aprs2.net, and start() runs an HTTP server on port
+# 8080 and an APRS-IS server on port 14580 at each address on the simulated network of uasyncio's
+# streams, which record the packets they receive. getaddrinfo blocks and advances the virtual
+# clock, like it stalls the whole station on the device.
+import vclock
+import uasyncio as asyncio
+
+ADDRS = ("10.0.0.1", "10.0.0.2", "10.0.0.3")
+outages = []  # (start, end) seconds since the simulation start when the first server is down
+posted = []  # (device time, packet) of each report received
+by_addr = {}  # reports received by each server
+logins = 0  # APRS-IS logins
+lookups = 0  # getaddrinfo calls
+latency_ms = {"dns": 80, "connect": 120, "response": 250}
+_servers = []
+
+
+def getaddrinfo(host, port, *args):
+    global lookups
+    lookups += 1
+    vclock.sleep_ms(latency_ms["dns"])
+    return [(2, 1, 0, "", (ADDRS[(lookups - 1) % len(ADDRS)], port))]
+
+
+def _post(w, packet):
+    posted.append((vclock.time(), packet))
+    addr = w.get_extra_info("sockname")[0]
+    by_addr[addr] = by_addr.get(addr, 0) + 1
+
+
+async def _http(r, w):
+    # HTTP POST: the body is the login line followed by the packet
+    length = 0
+    while True:
+        line = await r.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    body = await r.read(length)
+    await asyncio.sleep_ms(latency_ms["response"])
+    _post(w, body.split(b"\r\n", 1)[-1].decode())
+    w.write(b"HTTP/1.0 200 OK\r\n")
+    await w.drain()
+    w.close()
+
+
+async def _aprs_is(r, w):
+    # APRS-IS: a banner, the login and its response, then one packet per line
+    global logins
+    w.write(b"# aprsc 2.1.10\r\n")
+    await w.drain()
+    line = await r.readline()
+    await asyncio.sleep_ms(latency_ms["response"])
+    logins += 1
+    w.write(b"# logresp %s unverified, server SIM\r\n" % line.split()[1])
+    await w.drain()
+    while True:
+        line = await r.readline()
+        if not line:
+            break
+        _post(w, line.strip().decode())
+    w.close()
+
+
+async def start():
+    """
+    Start the servers, resetting what they recorded, and run the outages of the first one.
+    """
+    global posted, logins, lookups
+    posted = []
+    by_addr.clear()
+    logins = lookups = 0
+    asyncio.connect_ms = latency_ms["connect"]
+    _servers[:] = []
+    for a in ADDRS:
+        _servers.append(await asyncio.start_server(_http, a, 8080))
+        _servers.append(await asyncio.start_server(_aprs_is, a, 14580))
+    for start, end in sorted(outages):
+        await asyncio.sleep_ms(int(start * 1000 - vclock.seconds() * 1000))
+        fail(True, ADDRS[0])
+        await asyncio.sleep_ms(int(end * 1000 - vclock.seconds() * 1000))
+        fail(False, ADDRS[0])
+
+
+def fail(f, addr=None):
+    """
+    Make connections to the servers, or the one at addr, time out, or work again.
+    """
+    for s in _servers:
+        if addr is None or s.key[0] == addr:
+            s.fail = f
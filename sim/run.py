@@ -0,0 +1,132 @@
+# Runs the weather station app on the host against the simulated hardware and weather, and
+# prints a summary of what it published. Example: python3 sim/run.py --days 2 --outage 5:7
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import station, vclock, devices, net, logging, machine
+import uasyncio as asyncio
+from broker import Client
+
+
+def parse_outage(s):
+    # "start:end" in hours since the start of the simulation
+    a, b = s.split(":")
+    return (float(a) * 3600, float(b) * 3600)
+
+
+class Accuracy:
+    """
+    Accuracy compares the values published on the sensors topic with the true weather.
+    """
+
+    FIELDS = (
+        ("t_sht31", lambda w: w.temp),
+        ("t_si7021", lambda w: w.temp),
+        ("t_bme680", lambda w: w.temp),
+        ("h_sht31", lambda w: w.hum),
+        ("p_bme680", lambda w: w.press / 1000),
+        ("wdir", lambda w: w.dir),
+    )
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.err = {}
+        self.n = {}
+
+    def __call__(self, topic, msg):
+        if topic != self.topic:
+            return
+        rec = json.loads(msg)
+        w = station.world.at()
+        for name, fn in self.FIELDS:
+            if name in rec:
+                d = rec[name] - fn(w)
+                if name == "wdir":
+                    d = (d + 180) % 360 - 180
+                self.err[name] = self.err.get(name, 0) + abs(d)
+                self.n[name] = self.n.get(name, 0) + 1
+
+    def report(self):
+        return ", ".join(
+            "%s %.3g" % (k, self.err[k] / self.n[k]) for k, _ in self.FIELDS if k in self.n
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulate the weather station on the host")
+    ap.add_argument("--days", type=float, default=1, help="days of station time to simulate")
+    ap.add_argument("--interval", type=int, default=60, help="publishing interval in seconds")
+    ap.add_argument("--seed", type=int, default=1, help="seed of the weather model")
+    ap.add_argument("--outage", action="append", type=parse_outage, default=[],
+        metavar="H0:H1", help="broker unreachable from hour H0 to hour H1")
+    ap.add_argument("--batch", type=int, default=0, help="samples per binary batch")
+    ap.add_argument("--no-journal", action="store_true", help="disable store-and-forward")
+    ap.add_argument("--cwop", nargs="?", const="http", choices=("http", "session"),
+        help="send CWOP reports to a fake server by HTTP POST or on an APRS-IS session")
+    ap.add_argument("--cwop-outage", action="append", type=parse_outage, default=[],
+        metavar="H0:H1", help="first CWOP server unreachable from hour H0 to hour H1")
+    ap.add_argument("--absent", default="", metavar="DEV,...",
+        help="devices missing: display, bme680, si7021, sht31, pms")
+    ap.add_argument("--reset", choices=("power", "watchdog"), default="power",
+        help="cause of the reset the station boots from")
+    ap.add_argument("--flash", help="host directory holding the flash filesystem")
+    ap.add_argument("--stats", type=int, default=600, help="stats period in seconds, 0: off")
+    ap.add_argument("--adaptive", metavar="MIN:MAX", help="adaptive interval bounds in seconds")
+    ap.add_argument("-v", "--verbose", action="count", default=0, help="log INFO (-vv DEBUG)")
+    args = ap.parse_args()
+
+    level = (logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)]
+    absent = {d: False for d in args.absent.split(",") if d}
+    reset = machine.PWRON_RESET if args.reset == "power" else machine.WDT_RESET
+    station.setup(seed=args.seed, flash=args.flash, log_level=level, reset_cause=reset, **absent)
+    cfg = station.default_config(interval=args.interval, batch=args.batch,
+        journal=not args.no_journal, stats=args.stats)
+    if args.adaptive:
+        lo, hi = args.adaptive.split(":")
+        cfg["adaptive"] = {"min": int(lo), "max": int(hi)}
+    client = Client(outages=args.outage, keep=False)
+    acc = Accuracy((cfg["prefix"] + "/sensors").encode())
+    client.listeners.append(acc)
+    cwop = None
+    net.outages = args.cwop_outage
+    if args.cwop:
+        cwop = {"usr": "user SIM pass -1", "sta": "SIM", "server": "cwop.example",
+            "coord": "3429.95N/11949.07W", "baro_off": 0, "session": args.cwop == "session"}
+
+    t0 = time.perf_counter()
+    wx = station.boot(cfg, client, cwop)
+    asyncio.run_until(int(args.days * 86400 * 1000000))
+    host_s = time.perf_counter() - t0
+
+    virt_s = vclock.seconds()
+    print("Simulated %.1f hours in %.1fs (%.0fx)" % (virt_s / 3600, host_s, virt_s / host_s))
+    for topic, n in sorted(client.count.items()):
+        print("  %-24s %6d messages" % (topic.decode(), n))
+    print("  %d bytes published, %d publishes failed" % (client.bytes, client.failed))
+    if wx.journal:
+        print("  journal: backlog %d, dropped %d" % (wx.journal.backlog(), wx.journal.dropped))
+    b = devices.board
+    print("  I2C: %d bytes" % b.i2c_bytes, end="")
+    if b.display:
+        print(", display: %d bytes in %d transfers" % (b.display.data_bytes, b.display.transfers))
+    else:
+        print()
+    if args.cwop:
+        print("  CWOP: %d reports posted, %d DNS lookups, %d logins, by server: %s" % (
+            len(net.posted), net.lookups, net.logins,
+            ", ".join("%s %d" % kv for kv in sorted(net.by_addr.items()))))
+    boot = client.last.get((cfg["prefix"] + "/boot").encode())
+    if boot:
+        print("  boot: " + boot.decode())
+    stats = client.last.get((cfg["prefix"] + "/stats").encode())
+    if stats:
+        print("  last stats: " + stats.decode())
+    if acc.n:
+        print("  mean abs error: " + acc.report())
+    if logging.counts:
+        print("  log messages: %s" % ", ".join(
+            "%s %d" % (logging._level_dict[k], v) for k, v in sorted(logging.counts.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Stand-in for mpy-lib's seven-segments module: draws seven-segment digits with fill_rect.
+
+# segments a..g per character, bit 0 is segment a
+_SEGS = {"0": 0x3F, "1": 0x06, "2": 0x5B, "3": 0x4F, "4": 0x66, "5": 0x6D, "6": 0x7D, "7": 0x07,
+    "8": 0x7F, "9": 0x6F, "-": 0x40, "o": 0x63, " ": 0}
+
+
+def draw_number(d, s, x, y, w, h, c, t):
+    h2 = h // 2
+    for ch in s:
+        if ch == ".":
+            d.fill_rect(x, y + h - t, t, t, c)
+            x += 2 * t
+            continue
+        segs = _SEGS.get(ch, 0)
+        for i, (sx, sy, sw, sh) in enumerate(((t, 0, w, t), (w + t, t, t, h2 - t),
+                (w + t, h2, t, h2 - t), (t, h - t, w, t), (0, h2, t, h2 - t), (0, t, t, h2 - t),
+                (t, h2 - t // 2, w, t))):
+            if segs >> i & 1:
+                d.fill_rect(x + sx, y + sy, sw, sh, c)
+        x += w + 2 * t
@@ -0,0 +1,107 @@
+# Soak benchmark: runs the station for many publishing cycles on the simulated hardware and
+# reports the host CPU time per cycle and the growth of the memory allocated by the app's own
+# code (src/), which exposes leaks that would eventually exhaust the MicroPython heap. Memory
+# allocated by the simulation itself is excluded.
+# Example: python3 sim/soak.py --cycles 100000
+import argparse, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import station, vclock, logging
+import uasyncio as asyncio
+from broker import Client
+
+
+_SRC = tracemalloc.Filter(True, os.path.join("*", "src", "*"))
+
+
+def app_heap():
+    # snapshot of the live memory allocated by code in src/ and its total size
+    snap = tracemalloc.take_snapshot().filter_traces([_SRC])
+    return snap, sum(s.size for s in snap.statistics("filename"))
+
+
+class Cycles:
+    """
+    Cycles records the host time at each publish on the sensors topic, each marks the end of a
+    cycle of the main loop, and samples the app's heap periodically.
+    """
+
+    def __init__(self, topic, warmup, every):
+        self.topic = topic
+        self.warmup = warmup
+        self.every = every
+        self.n = 0
+        self.at = None
+        self.dt = []  # host seconds per cycle after warm-up
+        self.heap = []  # (cycle, traced bytes)
+        self.snap = None
+
+    def __call__(self, topic, msg):
+        if topic != self.topic:
+            return
+        now = time.perf_counter()
+        self.n += 1
+        if self.n == self.warmup:
+            if tracemalloc.is_tracing():
+                self.snap, size = app_heap()
+                self.heap.append((self.n, size))
+        elif self.n > self.warmup:
+            self.dt.append(now - self.at)
+            if self.n % self.every == 0 and tracemalloc.is_tracing():
+                self.heap.append((self.n, app_heap()[1]))
+        self.at = time.perf_counter()  # exclude the time spent here
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Soak test of the weather station app")
+    ap.add_argument("--cycles", type=int, default=100000, help="publishing cycles to run")
+    ap.add_argument("--interval", type=int, default=1, help="publishing interval in seconds")
+    ap.add_argument("--seed", type=int, default=1, help="seed of the weather model")
+    ap.add_argument("--batch", type=int, default=0, help="samples per binary batch")
+    ap.add_argument("--no-trace", action="store_true", help="don't trace heap allocations")
+    args = ap.parse_args()
+
+    station.setup(seed=args.seed)
+    cfg = station.default_config(interval=args.interval, batch=args.batch)
+    topic = cfg["prefix"] + ("/batch" if args.batch else "/sensors")
+    client = Client(keep=False)
+    warmup = max(args.cycles // 100, 10)
+    cycles = Cycles(topic.encode(), warmup, max(args.cycles // 10, 1))
+    client.listeners.append(cycles)
+    if not args.no_trace:
+        tracemalloc.start()
+
+    t0 = time.perf_counter()
+    station.boot(cfg, client)
+    per = max(args.batch, 1)
+    end_us = (args.cycles * per + 2) * args.interval * 1000000
+    step_us = 3600 * 1000000
+    while cycles.n < args.cycles and vclock.now_us < end_us:
+        asyncio.run_until(min(vclock.now_us + step_us, end_us))
+    host_s = time.perf_counter() - t0
+
+    dt = sorted(cycles.dt)
+    n = len(dt)
+    print("%d cycles (%.1f station hours) in %.1fs" % (cycles.n, vclock.seconds() / 3600, host_s))
+    if n:
+        print("Host time per cycle: min %.0fus avg %.0fus p50 %.0fus p99 %.0fus max %.0fus" % (
+            dt[0] * 1e6, sum(dt) / n * 1e6, dt[n // 2] * 1e6, dt[n * 99 // 100] * 1e6,
+            dt[-1] * 1e6))
+        if tracemalloc.is_tracing():
+            print("  (includes the overhead of tracing allocations, see --no-trace)")
+    if cycles.heap:
+        c0, h0 = cycles.heap[0]
+        c1, h1 = cycles.heap[-1]
+        print("Heap growth after warm-up: %+d bytes over %d cycles (%+.2f bytes/cycle)" % (
+            h1 - h0, c1 - c0, (h1 - h0) / max(c1 - c0, 1)))
+        print("  " + "  ".join("%d:%+d" % (c, h - h0) for c, h in cycles.heap))
+        # lines of the app whose allocations grew the most
+        top = app_heap()[0].compare_to(cycles.snap, "lineno")
+        for s in [s for s in top if s.size_diff > 0][:5]:
+            f = s.traceback[0]
+            print("  %+7d bytes %6d blocks  %s:%d" % (s.size_diff, s.count_diff,
+                os.path.basename(f.filename), f.lineno))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Sets up the simulated station: installs the MicroPython built-ins and module aliases that the
+# device code expects, the virtual clock, the flash filesystem, the weather model, and the
+# board, and then boots the weather app the way the board's main.py does.
+import builtins, gc, os, sys, tempfile, types
+import binascii, json, struct, traceback
+
+here = os.path.dirname(os.path.abspath(__file__))
+src = os.path.join(here, "..", "src")
+if src not in sys.path:
+    sys.path.insert(1 if sys.path and sys.path[0] == here else 0, src)
+
+import vclock, devices, uos, logging
+import uasyncio as asyncio
+from world import World
+from broker import Client, MQTT
+
+HEAP = 110000  # bytes of MicroPython heap on an ESP32 without SPIRAM
+START = 20 * 365 * 86400 + 5 * 86400  # device time.time() at start: 2020-01-01 00:00
+
+world = None
+board = None
+config = None
+
+
+_mem_base = 0
+
+
+def _mem_alloc():
+    # host memory allocated since setup() if tracemalloc is active
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        return 0
+    return max(tracemalloc.get_traced_memory()[0] - _mem_base, 0)
+
+
+def _install_builtins():
+    builtins.const = lambda x: x
+    mp = types.ModuleType("micropython")
+    mp.const = builtins.const
+    mp.schedule = lambda fn, arg: fn(arg)
+    mp.alloc_emergency_exception_buf = lambda n: None
+    mp.mem_info = lambda *a: None
+    sys.modules["micropython"] = mp
+    sys.modules["ujson"] = json
+    sys.modules["ustruct"] = struct
+    sys.modules["ubinascii"] = binascii
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = lambda: max(HEAP - _mem_alloc(), 0)
+    gc.mem_maxfree = lambda: gc.mem_free() // 2
+    if not hasattr(sys, "print_exception"):
+        sys.print_exception = lambda e, f=sys.stderr: traceback.print_exception(
+            type(e), e, e.__traceback__, file=f
+        )
+
+
+def setup(seed=1, start=START, flash=None, log_level=logging.WARNING, **hw):
+    """
+    Prepare a fresh simulation: the clock is reset to start (device time), the flash
+    filesystem is the host directory flash (default: a new temporary directory), and hw
+    selects the peripherals that are present (see devices.Board).
+    """
+    global world, board, _mem_base
+    _install_builtins()
+    _mem_base = 0
+    _mem_base = _mem_alloc()
+    vclock.install(start)
+    asyncio.reset()
+    uos.install(flash or tempfile.mkdtemp(prefix="wxflash-"))
+    logging.level = log_level
+    world = World(seed)
+    board = devices.board = devices.Board(world, **hw)
+    return world
+
+
+def default_config(**kw):
+    c = {
+        "kind": "lolin-d32",
+        "interval": 60,
+        "prefix": "esp32/wx",
+    }
+    c.update(kw)
+    return c
+
+
+def boot(cfg, client, cwop=None):
+    """
+    Import the weather app and start it like the board's main.py does. If cwop is a config
+    dict the CWOP reports are posted to the simulated server in net.
+    """
+    global config, _mem_base
+    config = cfg
+    for m in ("weather", "cwop", "wind", "rain", "journal", "sched"):
+        sys.modules.pop(m, None)
+    import weather
+
+    if cwop is not None:
+        import cwop as cwop_mod, net
+
+        cwop_mod.socket = net
+        asyncio.create_task(net.start())
+        cwop_mod.start(None, cwop)
+    _mem_base = 0
+    _mem_base = _mem_alloc()  # the app's heap starts out empty
+    weather.start(MQTT(client), cfg)
+    return weather
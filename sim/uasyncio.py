@@ -0,0 +1,419 @@
+# Stand-in for MicroPython's uasyncio (v3 API) that runs on the virtual clock: when every task
+# is waiting the clock jumps straight to the next wake-up, so sleeping costs no host time.
+# Only the subset of the API used by the station code is provided.
+import heapq, sys, traceback
+import vclock
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+_PARK = object()  # yielded by a task that waits to be woken up explicitly
+_queue = []  # heap of (wake_us, seq, task, token)
+_seq = 0
+_cur = None  # task currently running
+_stop = False
+
+
+class Task:
+    """
+    Task wraps a coroutine scheduled by the kernel, it can be awaited for its result.
+    """
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.state = True  # True while running, False once done
+        self.data = None  # result or exception
+        self.waiters = []
+        self.token = 0  # bumped on each (re)schedule to invalidate stale queue entries
+        self.exc = None  # exception to throw into the coroutine on its next step
+
+    def __await__(self):
+        if self.state:
+            self.waiters.append(_cur)
+            yield _PARK
+        if isinstance(self.data, BaseException):
+            raise self.data
+        return self.data
+
+    def done(self):
+        return not self.state
+
+    def cancel(self):
+        if not self.state:
+            return False
+        self.exc = CancelledError()
+        _push(self, vclock.now_us)
+        return True
+
+
+def _push(task, at_us):
+    global _seq
+    _seq += 1
+    task.token += 1
+    heapq.heappush(_queue, (at_us, _seq, task, task.token))
+
+
+def _wake(task):
+    _push(task, vclock.now_us)
+
+
+class _Cmd:
+    # awaitable that yields a command to the kernel
+    __slots__ = ("cmd",)
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+
+    def __await__(self):
+        yield self.cmd
+
+
+def sleep_ms(ms):
+    return _Cmd(int(ms * 1000) if ms > 0 else 0)
+
+
+def sleep(s):
+    return _Cmd(int(s * 1000000) if s > 0 else 0)
+
+
+def _park():
+    return _Cmd(_PARK)
+
+
+def create_task(coro):
+    t = Task(coro)
+    _push(t, vclock.now_us)
+    return t
+
+
+def current_task():
+    return _cur
+
+
+def _finish(t, data):
+    t.state = False
+    t.data = data
+    for w in t.waiters:
+        _wake(w)
+    if isinstance(data, BaseException) and not t.waiters and not isinstance(data, CancelledError):
+        print("Task exception wasn't retrieved", file=sys.stderr)
+        traceback.print_exception(type(data), data, data.__traceback__)
+
+
+def _step(t):
+    global _cur
+    _cur = t
+    exc, t.exc = t.exc, None
+    try:
+        cmd = t.coro.throw(exc) if exc else t.coro.send(None)
+    except StopIteration as e:
+        _finish(t, e.value)
+    except BaseException as e:
+        if isinstance(e, (KeyboardInterrupt, SystemExit)):
+            raise
+        _finish(t, e)
+    else:
+        if cmd is None:
+            _push(t, vclock.now_us)
+        elif cmd is not _PARK:
+            _push(t, vclock.now_us + cmd)
+    _cur = None
+
+
+def _run(until=None, until_us=None):
+    # run tasks until the until task is done, the clock reaches until_us, or stop() is called
+    global _stop
+    _stop = False
+    while not _stop:
+        if until is not None and not until.state:
+            return
+        if not _queue:
+            raise RuntimeError("deadlock: no runnable tasks")
+        at, _, t, token = _queue[0]
+        if until_us is not None and at > until_us:
+            vclock.set_us(until_us)
+            return
+        heapq.heappop(_queue)
+        if token != t.token or not t.state:
+            continue
+        vclock.set_us(at)
+        _step(t)
+
+
+def run_until(us):
+    """
+    Simulation extension: run all tasks until the virtual clock reaches us.
+    """
+    _run(until_us=us)
+
+
+def reset():
+    """
+    Simulation extension: drop all tasks, used between independent simulation runs.
+    """
+    global _seq, connect_ms
+    _queue.clear()
+    _seq = 0
+    _servers.clear()
+    hosts.clear()
+    connect_ms = 0
+
+
+def run(coro):
+    t = create_task(coro)
+    _run(until=t)
+    if isinstance(t.data, BaseException):
+        raise t.data
+    return t.data
+
+
+class Loop:
+    create_task = staticmethod(create_task)
+
+    @staticmethod
+    def run_forever():
+        _run()
+
+    @staticmethod
+    def run_until_complete(aw):
+        if not isinstance(aw, Task):
+            aw = create_task(aw)
+        _run(until=aw)
+        if isinstance(aw.data, BaseException):
+            raise aw.data
+        return aw.data
+
+    @staticmethod
+    def stop():
+        global _stop
+        _stop = True
+
+    @staticmethod
+    def close():
+        pass
+
+
+def get_event_loop(runq_len=0, waitq_len=0):
+    return Loop
+
+
+def new_event_loop():
+    reset()
+    return Loop
+
+
+class Lock:
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def locked(self):
+        return self.state
+
+    async def acquire(self):
+        if self.state:
+            # ownership is handed over by release()
+            self.waiting.append(_cur)
+            await _park()
+        self.state = True
+        return True
+
+    def release(self):
+        if not self.state:
+            raise RuntimeError("Lock not acquired")
+        if self.waiting:
+            _wake(self.waiting.pop(0))
+        else:
+            self.state = False
+
+    async def __aenter__(self):
+        return await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class Event:
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        for t in self.waiting:
+            _wake(t)
+        self.waiting = []
+        self.state = True
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            self.waiting.append(_cur)
+            await _park()
+        return True
+
+
+async def _canceller(task, us, fired):
+    await _Cmd(us)
+    fired.append(True)
+    task.cancel()
+
+
+async def wait_for(aw, timeout):
+    if timeout is None:
+        return await aw
+    t = aw if isinstance(aw, Task) else create_task(aw)
+    fired = []
+    timer = create_task(_canceller(t, max(int(timeout * 1000000), 0), fired))
+    try:
+        return await t
+    except CancelledError:
+        if fired:
+            raise TimeoutError
+        raise
+    finally:
+        timer.cancel()
+
+
+def wait_for_ms(aw, timeout):
+    return wait_for(aw, timeout / 1000)
+
+
+async def gather(*aws, return_exceptions=False):
+    ts = [aw if isinstance(aw, Task) else create_task(aw) for aw in aws]
+    res = []
+    for t in ts:
+        try:
+            res.append(await t)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            res.append(e)
+    return res
+
+
+# ===== streams: connections are in-memory pipes between open_connection and start_server
+
+_servers = {}  # (host, port) -> Server
+hosts = {}  # simulation extension: host name -> address, resolved by open_connection
+connect_ms = 0  # simulation extension: time a connection takes to establish
+
+
+class _Pipe:
+    # one direction of a connection
+    def __init__(self):
+        self.buf = bytearray()
+        self.eof = False  # the writer closed its end
+        self.gone = False  # the reader closed its end
+        self.waiting = []
+
+    def put(self, data):
+        if self.gone:
+            raise OSError(104)  # ECONNRESET
+        self.buf += data
+        self._wake()
+
+    def close(self):
+        self.eof = True
+        self._wake()
+
+    def _wake(self):
+        for t in self.waiting:
+            _wake(t)
+        self.waiting = []
+
+    async def wait(self):
+        self.waiting.append(_cur)
+        await _park()
+
+
+class Stream:
+    """
+    Stream is both the reader and the writer of one end of a connection.
+    """
+
+    def __init__(self, rx, tx, peer, local):
+        self.rx = rx
+        self.tx = tx
+        self.peer = peer
+        self.local = local
+        self.out = bytearray()  # written but not drained
+
+    def get_extra_info(self, v):
+        return self.local if v == "sockname" else self.peer
+
+    async def read(self, n=-1):
+        while not self.rx.buf and not self.rx.eof:
+            await self.rx.wait()
+        if n < 0:
+            n = len(self.rx.buf)
+        data = bytes(self.rx.buf[:n])
+        del self.rx.buf[:n]
+        return data
+
+    async def readline(self):
+        while b"\n" not in self.rx.buf and not self.rx.eof:
+            await self.rx.wait()
+        i = self.rx.buf.find(b"\n") + 1 or len(self.rx.buf)
+        data = bytes(self.rx.buf[:i])
+        del self.rx.buf[:i]
+        return data
+
+    def write(self, buf):
+        self.out += buf.encode() if isinstance(buf, str) else buf
+
+    async def drain(self):
+        data, self.out = self.out, bytearray()
+        await sleep_ms(0)
+        self.tx.put(data)
+
+    def close(self):
+        self.tx.close()
+        self.rx.gone = True
+
+    async def wait_closed(self):
+        await sleep_ms(0)
+
+
+class Server:
+    def __init__(self, cb, key):
+        self.cb = cb
+        self.key = key
+        self.fail = False  # simulation extension: connections time out
+
+    def close(self):
+        _servers.pop(self.key, None)
+
+    async def wait_closed(self):
+        await sleep_ms(0)
+
+
+async def start_server(cb, host, port, backlog=5):
+    srv = Server(cb, (host, port))
+    _servers[srv.key] = srv
+    return srv
+
+
+async def open_connection(host, port):
+    addr = hosts.get(host, host)
+    srv = _servers.get((addr, port)) or _servers.get(("0.0.0.0", port))
+    await sleep_ms(connect_ms)
+    if srv is None:
+        raise OSError(113)  # EHOSTUNREACH
+    if srv.fail:
+        raise OSError(110)  # ETIMEDOUT
+    up, down = _Pipe(), _Pipe()
+    s = Stream(up, down, ("10.0.1.1", 50000), (addr, port))
+    create_task(srv.cb(s, s))
+    s = Stream(down, up, (addr, port), ("10.0.1.1", 50000))
+    return s, s
@@ -0,0 +1,72 @@
+# Stand-in for MicroPython's uos: the board's flash filesystem is a directory on the host. Device
+# paths are absolute, install() also redirects the built-in open() for them.
+import builtins, os
+
+root = None  # host directory holding the flash contents
+_open = builtins.open
+sep = "/"
+
+
+def _is_flash(path):
+    # absolute paths whose top directory doesn't exist on the host belong to the flash
+    if not isinstance(path, str) or not path.startswith("/") or root is None:
+        return False
+    top = path.split("/")[1]
+    return not os.path.isdir("/" + top) or top == ""
+
+
+def _host(path):
+    if _is_flash(path):
+        return os.path.join(root, path.lstrip("/"))
+    return path
+
+
+def _open_flash(path, *args, **kw):
+    return _open(_host(path), *args, **kw)
+
+
+def install(dir):
+    """
+    Use the host directory dir as the flash filesystem.
+    """
+    global root
+    root = dir
+    os.makedirs(dir, exist_ok=True)
+    builtins.open = _open_flash
+
+
+def stat(path):
+    st = os.stat(_host(path))
+    return (st.st_mode, 0, 0, 0, 0, 0, st.st_size, 0, int(st.st_mtime), 0)
+
+
+def remove(path):
+    os.remove(_host(path))
+
+
+def rename(old, new):
+    os.replace(_host(old), _host(new))
+
+
+def listdir(path="/"):
+    return sorted(os.listdir(_host(path) if path != "/" else root))
+
+
+def mkdir(path):
+    os.mkdir(_host(path))
+
+
+def rmdir(path):
+    os.rmdir(_host(path))
+
+
+def statvfs(path):
+    return (4096, 4096, 512, 400, 400, 0, 0, 0, 0, 255)
+
+
+def urandom(n):
+    return os.urandom(n)
+
+
+def uname():
+    return ("esp32", "sim", "1.12.0", "sim", "ESP32 module with ESP32")
@@ -0,0 +1,94 @@
+# Virtual clock shared by the simulated uasyncio kernel and the simulated hardware. Time only
+# advances when all tasks are asleep (the kernel jumps to the next wake-up) or when device code
+# blocks (time.sleep_ms, I2C transfers), so days of station time run in seconds of host time.
+# install() patches the MicroPython time functions onto CPython's time module.
+import time as _time
+
+EPOCH_OFFSET = 946684800  # MicroPython's time.time() counts from 2000-01-01
+_TICKS_MAX = 0x3FFFFFFF
+_TICKS_HALF = 0x20000000
+
+now_us = 0  # virtual microseconds since the simulation started
+epoch = 0  # device time.time() at now_us == 0
+
+
+def advance_us(us):
+    """
+    Advance the clock by us microseconds, used by device code that blocks.
+    """
+    global now_us
+    if us > 0:
+        now_us += int(us)
+
+
+def set_us(us):
+    # used by the kernel to jump to the next wake-up time, the clock never runs backwards
+    global now_us
+    if us > now_us:
+        now_us = us
+
+
+def seconds():
+    """
+    Return the virtual time in seconds (float) since the simulation started.
+    """
+    return now_us / 1000000
+
+
+def ticks_ms():
+    return (now_us // 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return now_us & _TICKS_MAX
+
+
+def ticks_diff(a, b):
+    return ((a - b + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def ticks_add(a, b):
+    return (a + b) & _TICKS_MAX
+
+
+def sleep_ms(ms):
+    advance_us(ms * 1000)
+
+
+def sleep_us(us):
+    advance_us(us)
+
+
+def sleep(s):
+    advance_us(s * 1000000)
+
+
+def time():
+    return epoch + now_us // 1000000
+
+
+def localtime(t=None):
+    if t is None:
+        t = time()
+    return _time.gmtime(t + EPOCH_OFFSET)[:8]
+
+
+def mktime(t):
+    # inverse of localtime(), the device has no timezone
+    import calendar
+
+    return calendar.timegm(tuple(t[:6]) + (0, 0, 0)) - EPOCH_OFFSET
+
+
+def install(start_epoch):
+    """
+    Reset the clock and patch the MicroPython time functions into the time module. The
+    start_epoch is the device time.time() at which the simulation starts.
+    """
+    global now_us, epoch
+    now_us = 0
+    epoch = start_epoch
+    for fn in (ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms, sleep_us, sleep, time):
+        setattr(_time, fn.__name__, fn)
+    _time.localtime = localtime
+    _time.mktime = mktime
@@ -0,0 +1,125 @@
+# Deterministic weather model that drives the simulated sensors. The state advances in one
+# second steps using seeded random processes: a diurnal temperature cycle with anomalies, dew
+# point, pressure drifting through fronts, wind with a mean, turbulence and gusts, a wandering
+# wind direction, rain storms, and particulate matter. Pulse outputs (anemometer, rain gauge)
+# are cumulative so that counters can read them at any instant.
+import math, random
+import vclock
+
+MPH_PER_HZ = 2.5  # anemometer calibration of the simulated station
+MS_PER_MPH = 0.44704
+INCH_PER_TIP = 0.01
+
+
+class World:
+    """
+    World holds the true weather at the current virtual time, sensors read it through at().
+    """
+
+    def __init__(self, seed=1):
+        self.rng = random.Random(seed)
+        self.sec = 0  # virtual second the state below is for
+        self.t_anom = 0.0  # temperature anomaly in C
+        self.dew_anom = 0.0
+        self.press = 1013.0  # hPa
+        self.p_trend = 0.0  # hPa per hour
+        self.wind_mean = 3.0  # m/s
+        self.turb = 0.0  # turbulence fraction of the mean
+        self.gust = 0.0  # m/s added by the current gust
+        self.gust_left = 0  # seconds the current gust lasts
+        self.wdir = self.rng.uniform(0, 360)  # degrees
+        self.wdir_turb = 0.0
+        self.storm_left = 0  # seconds of rain left in the current storm
+        self.rain_rate = 0.0  # in/h
+        self.storm_mean = 0.0  # mean rain rate of the current storm
+        self.pm25 = 8.0  # ug/m3
+        self.gas = 120000.0  # ohm
+        # instantaneous values at self.sec
+        self.temp = self.hum = self.speed = self.dir = 0.0
+        # cumulative pulses at the start of self.sec and their rate during the second
+        self.anemo_cum = 0.0
+        self.anemo_hz = 0.0
+        self.rain_cum = 0.0
+        self.rain_tps = 0.0  # tips per second
+        self._update()
+
+    def _ou(self, x, mu, tau, sigma):
+        # one second step of an Ornstein-Uhlenbeck process
+        return x + (mu - x) / tau + sigma * math.sqrt(2 / tau) * self.rng.gauss(0, 1)
+
+    def _update(self):
+        # derive the instantaneous values from the state
+        hour = ((vclock.epoch + self.sec) % 86400) / 3600
+        rain = self.rain_rate > 0
+        self.temp = 13 + 7 * math.sin(2 * math.pi * (hour - 9) / 24) + self.t_anom - 3 * rain
+        dew = 7 + 2 * math.sin(2 * math.pi * (hour - 12) / 24) + self.dew_anom
+        if rain or dew > self.temp:
+            dew = self.temp - 0.3
+        a = 17.625
+        self.hum = 100 * math.exp(a * dew / (243.04 + dew) - a * self.temp / (243.04 + self.temp))
+        speed = self.wind_mean * (1 + self.turb) + self.gust
+        self.speed = max(speed, 0.0)
+        self.dir = (self.wdir + self.wdir_turb) % 360
+        self.anemo_hz = self.speed / MS_PER_MPH / MPH_PER_HZ
+        self.rain_tps = self.rain_rate / INCH_PER_TIP / 3600
+
+    def _step(self):
+        rng = self.rng
+        self.anemo_cum += self.anemo_hz
+        self.rain_cum += self.rain_tps
+        self.sec += 1
+        hour = ((vclock.epoch + self.sec) % 86400) / 3600
+        self.t_anom = self._ou(self.t_anom, 0, 4 * 3600, 2.5)
+        self.dew_anom = self._ou(self.dew_anom, 0, 6 * 3600, 3)
+        # pressure follows a slowly changing trend, pulled back towards normal
+        self.p_trend = self._ou(self.p_trend, (1013 - self.press) / 24, 6 * 3600, 0.8)
+        self.press += self.p_trend / 3600
+        # afternoon breeze plus weather-driven mean wind, turbulence, and occasional gusts
+        breeze = 2.5 * max(0.0, math.sin(2 * math.pi * (hour - 10) / 24))
+        self.wind_mean = max(0.0, self._ou(self.wind_mean, 2 + breeze, 1200, 1.5))
+        self.turb = self._ou(self.turb, 0, 5, 0.25)
+        if self.gust_left > 0:
+            self.gust_left -= 1
+            if not self.gust_left:
+                self.gust = 0.0
+        elif rng.random() < 1 / 120:
+            self.gust = self.wind_mean * rng.uniform(0.3, 1.2)
+            self.gust_left = rng.randint(2, 6)
+        wander = 2 + 20 / (1 + self.speed)
+        self.wdir = (self.wdir + rng.gauss(0, wander / 10)) % 360
+        self.wdir_turb = self._ou(self.wdir_turb, 0, 10, wander)
+        # rain storms, about one every two days
+        if self.storm_left > 0:
+            self.storm_left -= 1
+            self.rain_rate = max(0.0, self._ou(self.rain_rate, self.storm_mean, 300, 0.1))
+            if not self.storm_left:
+                self.rain_rate = 0.0
+        elif rng.random() < 1 / (2 * 86400):
+            self.storm_left = int(rng.expovariate(1 / (3 * 3600))) + 600
+            self.storm_mean = rng.lognormvariate(math.log(0.15), 0.8)
+            self.rain_rate = self.storm_mean
+        self.pm25 = max(0.0, self._ou(self.pm25, 8, 2 * 3600, 5))
+        self.gas = max(5000.0, self._ou(self.gas, 150000 - 800 * self.hum, 3600, 20000))
+        self._update()
+
+    def at(self, t=None):
+        """
+        Advance the state to virtual time t seconds (default: now) and return self.
+        """
+        if t is None:
+            t = vclock.now_us // 1000000
+        while self.sec < t:
+            self._step()
+        return self
+
+    def anemo_pulses(self):
+        # cumulative anemometer pulses at the current virtual time
+        s = vclock.now_us / 1000000
+        self.at(int(s))
+        return self.anemo_cum + self.anemo_hz * (s - self.sec)
+
+    def rain_tips(self):
+        # cumulative rain gauge tips at the current virtual time
+        s = vclock.now_us / 1000000
+        self.at(int(s))
+        return int(self.rain_cum + self.rain_tps * (s - self.sec))
@@ -0,0 +1,69 @@
+# Adaptive publishing interval: the interval drops to its minimum as soon as the weather gets
+# volatile (strong gusts, rain, fast pressure change) and stretches back out, doubling each
+# calm cycle, up to its maximum.
+import time
+from sample import GUST, P_BME680
+
+_P_WINDOW = const(15 * 60 * 1000)  # window in ms over which the pressure change is measured
+
+
+class Adaptive:
+    """
+    Adaptive computes the next publishing interval from each sample. Thresholds: gust in m/s,
+    rain in gauge tips per interval, and pressure in hPa per hour.
+    """
+
+    def __init__(self, min_ms, max_ms, gust=8.0, rain=1, pressure=1.0):
+        if min_ms <= 0 or min_ms > max_ms:
+            raise ValueError("Invalid adaptive interval bounds")
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.gust = gust
+        self.rain = rain
+        self.pressure = pressure
+        self.interval = min_ms
+        self.tips = None  # rain gauge count at the previous update
+        self.p_ref = None  # pressure at the start of the current window, in Bar
+        self.p_at = 0  # ticks_ms when p_ref was taken
+        self.p_fast = False  # whether the pressure changed fast in the last window
+
+    def _pressure(self, p):
+        # track the rate of pressure change over consecutive windows
+        now = time.ticks_ms()
+        if self.p_ref is None:
+            self.p_ref = p
+            self.p_at = now
+            return
+        dt = time.ticks_diff(now, self.p_at)
+        if dt >= _P_WINDOW:
+            rate = (p - self.p_ref) * 1000 * 3600000 / dt  # hPa per hour
+            self.p_fast = abs(rate) >= self.pressure
+            self.p_ref = p
+            self.p_at = now
+
+    def volatile(self, sample, tips=None):
+        """
+        Return whether the sample shows volatile weather, tips is the rain gauge count, if any.
+        """
+        v = False
+        if sample.get(GUST, 0) >= self.gust:
+            v = True
+        if tips is not None:
+            if self.tips is not None and (tips - self.tips) & 0x7FFF >= self.rain:
+                v = True
+            self.tips = tips
+        p = sample.get(P_BME680)
+        if p is not None:
+            self._pressure(p)
+            v = v or self.p_fast
+        return v
+
+    def update(self, sample, tips=None):
+        """
+        Return the interval in milliseconds until the next sample.
+        """
+        if self.volatile(sample, tips):
+            self.interval = self.min_ms
+        else:
+            self.interval = min(self.interval * 2, self.max_ms)
+        return self.interval
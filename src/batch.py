@@ -0,0 +1,46 @@
+# Batched binary telemetry: packs N consecutive sample records into a single MQTT message.
+# Layout (little-endian): a header with magic "WB", the batch format version, the record layout
+# version (sample.REC_VERSION), and the record count, followed by count records of
+# sample.REC_SIZE bytes each in sample.REC_FMT format. See host/wxbatch.py for the decoder.
+import struct
+from sample import REC_SIZE, REC_VERSION
+
+BATCH_VERSION = const(1)
+HDR_FMT = "<2sBBH"
+HDR_SIZE = const(6)
+
+
+class Batch:
+    """
+    Batch accumulates sample records in binary form in a preallocated buffer.
+    """
+
+    def __init__(self, size=10):
+        self.size = size
+        self.buf = bytearray(HDR_SIZE + size * REC_SIZE)
+        self.count = 0
+
+    def add(self, sample):
+        """
+        Add the sample to the batch and return True if the batch is full.
+        """
+        sample.pack_into(self.buf, HDR_SIZE + self.count * REC_SIZE)
+        self.count += 1
+        return self.count >= self.size
+
+    def add_packed(self, recs, cnt):
+        """
+        Add cnt records that are already in binary form.
+        """
+        off = HDR_SIZE + self.count * REC_SIZE
+        self.buf[off : off + cnt * REC_SIZE] = recs[: cnt * REC_SIZE]
+        self.count += cnt
+
+    def payload(self):
+        """
+        Return the batch as bytes and reset it.
+        """
+        struct.pack_into(HDR_FMT, self.buf, 0, b"WB", BATCH_VERSION, REC_VERSION, self.count)
+        msg = bytes(self.buf[: HDR_SIZE + self.count * REC_SIZE])
+        self.count = 0
+        return msg
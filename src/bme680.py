@@ -1,6 +1,7 @@
 # Taken from upstream pimoroni
 # https://github.com/pimoroni/bme680
-# unmodified
+# modified: conversions are split into convert/ready/read_data and __init__ can skip its
+# blocking conversion
 
 from bme680_consts import *
 #import math
@@ -15,9 +16,12 @@ class BME680(BME680Data):
 
     :param i2c_addr: One of I2C_ADDR_PRIMARY (0x76) or I2C_ADDR_SECONDARY (0x77)
     :param i2c_device: Optional smbus or compatible instance for facilitating i2c communications.
+    :param convert: Perform a blocking conversion to measure the ambient temperature used by the
+        gas heater calculation, if False 25C is assumed. The heater setting is computed by
+        set_gas_heater_temperature(), call it again after a read_data() to use the measured one.
 
     """
-    def __init__(self, i2c_dev, i2c_addr=I2C_ADDR_PRIMARY):
+    def __init__(self, i2c_dev, i2c_addr=I2C_ADDR_PRIMARY, convert=True):
         BME680Data.__init__(self)
 
         self.i2c_addr = i2c_addr
@@ -38,6 +42,9 @@ class BME680(BME680Data):
         self.set_filter(FILTER_SIZE_3)
         self.set_gas_status(ENABLE_GAS_MEAS)
 
+        if not convert:
+            self.ambient_temperature = 2500
+            return
         # perform a whole conversion so we can set gas stuff
         self.convert()
         while not self.ready():
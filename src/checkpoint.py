@@ -0,0 +1,93 @@
+# Checkpoint log: persists a small fixed-format state, such as the rain gauge's totals, so it
+# survives resets. Each checkpoint is appended as a fixed-size record with a sequence number and
+# a CRC to the current of two log files; when that file is full the other one is truncated and
+# becomes the current one. Appending small records keeps the flash writes per checkpoint small
+# and bounded, and restoring only needs to look at the tail of each file.
+import struct
+import uos as os
+import ubinascii as binascii
+import logging
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class Checkpoint:
+    """
+    Checkpoint saves and restores a tuple of values packed with the struct format fmt, in files
+    path + ".0" and path + ".1" of max_recs records each.
+    """
+
+    def __init__(self, path, fmt, max_recs=64):
+        self.path = path
+        self.fmt = "<I" + fmt.lstrip("<")  # sequence number, then the state
+        self.size = struct.calcsize(self.fmt) + 4  # plus CRC32
+        self.max_recs = max_recs
+        self.buf = bytearray(self.size)
+        self.seq = 0  # sequence number of the last record written or restored
+        self.cur = 0  # file being appended to
+        self.recs = 0  # records in the current file
+        self.writes = 0  # records written since boot
+
+    def _file(self, i):
+        return self.path + "." + str(i)
+
+    def _last(self, i):
+        # return (seq, values, records) for the last valid record in file i, (0, None, 0) if none,
+        # records being the number of records up to it, or max_recs if anything follows it
+        try:
+            with open(self._file(i), "rb") as f:
+                length = os.stat(self._file(i))[6]
+                n = length // self.size
+                # a record torn by a reset can only be at the end, walk back to a valid one
+                for k in range(n - 1, -1, -1):
+                    f.seek(k * self.size)
+                    if f.readinto(self.buf) != self.size:
+                        continue
+                    crc = struct.unpack_from("<I", self.buf, self.size - 4)[0]
+                    if binascii.crc32(memoryview(self.buf)[: self.size - 4]) & 0xFFFFFFFF != crc:
+                        continue
+                    vals = struct.unpack_from(self.fmt, self.buf, 0)
+                    clean = length == (k + 1) * self.size
+                    return vals[0], vals[1:], k + 1 if clean else self.max_recs
+        except OSError:
+            pass
+        return 0, None, 0
+
+    def restore(self):
+        """
+        Return the values of the most recent valid checkpoint, or None if there is none.
+        """
+        s0, v0, r0 = self._last(0)
+        s1, v1, r1 = self._last(1)
+        if v0 is None and v1 is None:
+            return None
+        if v1 is None or v0 is not None and s0 > s1:
+            self.seq, vals, self.cur, self.recs = s0, v0, 0, r0
+        else:
+            self.seq, vals, self.cur, self.recs = s1, v1, 1, r1
+        log.info("Restored %s, checkpoint %d", self.path, self.seq)
+        return vals
+
+    def save(self, vals):
+        """
+        Append a checkpoint of the values, which must match the format.
+        """
+        self.seq += 1
+        struct.pack_into(self.fmt, self.buf, 0, self.seq, *vals)
+        crc = binascii.crc32(memoryview(self.buf)[: self.size - 4]) & 0xFFFFFFFF
+        struct.pack_into("<I", self.buf, self.size - 4, crc)
+        mode = "ab"
+        if self.recs >= self.max_recs:
+            # switch files, the full one keeps the latest checkpoint until this write succeeds,
+            # this is also how a file with a torn record at its end gets left behind
+            self.cur ^= 1
+            self.recs = 0
+            mode = "wb"
+        try:
+            with open(self._file(self.cur), mode) as f:
+                f.write(self.buf)
+            self.recs += 1
+            self.writes += 1
+        except OSError as e:
+            log.warning("Checkpoint %s failed: %s", self.path, e)
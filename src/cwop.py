@@ -1,25 +1,217 @@
-import socket, logging, sys
+import socket, logging, time
+import uasyncio as asyncio
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
-_ipaddr = None
 _config = None
+_pool = []  # servers resolved from the configured host names, see _Server
+_resolved_at = 0  # time.time() of the last lookup
+_session = None  # stream of the open APRS-IS login session, if any
+_session_srv = None  # server of the session
+_reader = None  # task draining what the server sends on the session
+_lock = asyncio.Lock()  # serializes logins and writes on the session
+_pending = None  # packet waiting for the upload in flight to finish
+_ready = asyncio.Event()  # set when there's a pending packet
+_sum = [0.0, 0.0, 0.0]  # sums of the temperature, humidity, and pressure since the last report
+_cnt = [0, 0, 0]
+_wind = None  # latest (direction, speed), the speed being a 2 minute average
+_gust = None  # max gust since the last report
+_rain = None  # latest (past hour, past 24 hours)
 
-# send a weather report to CWOP via APRS-I servers
-# config must have: usr, sta, server, coord
-async def send_wx(
+DNS_TTL = 3600  # seconds a resolved server address is used for
+POOL_MAX = 4  # max servers in the pool
+TRIES = 3  # max servers tried per report
+BACKOFF = 300  # seconds a server is avoided after it fails, doubling with each failure in a row
+BACKOFF_MAX = 6 * 3600
+# timeouts in ms of each phase of a send, so a slow server can't hold up a report for long
+CONNECT_MS = 10000
+SEND_MS = 5000
+RESPONSE_MS = 10000
+
+
+class _Server:
+    """
+    _Server is an APRS-IS server's address with its health: the smoothed latency of its
+    uploads and the failures in a row, which keep it out of use for a growing backoff.
+    """
+
+    def __init__(self, host, addr):
+        self.host = host
+        self.addr = addr
+        self.expires = 0  # time.time() when the address needs to be resolved again
+        self.latency = None  # smoothed ms an upload takes
+        self.fails = 0  # failures in a row
+        self.retry_at = 0  # time.time() before which the server isn't used
+
+    def score(self):
+        # lower is better, a server that hasn't been used yet counts as taking a second
+        return 1000 if self.latency is None else self.latency
+
+    def ok(self, ms):
+        self.latency = ms if self.latency is None else (self.latency * 3 + ms) // 4
+        self.fails = 0
+        self.retry_at = 0
+
+    def failed(self):
+        self.fails += 1
+        self.retry_at = time.time() + min(BACKOFF << min(self.fails - 1, 16), BACKOFF_MAX)
+        log.warning("Server %s failed %d times, backing off", self.addr, self.fails)
+
+
+# config["server"] is a host name or a list of them, rotate.aprs2.net by default
+def _hosts():
+    h = _config.get("server", "rotate.aprs2.net")
+    return (h,) if isinstance(h, str) else h
+
+
+# resolve host and add its addresses to the pool, or refresh them, getaddrinfo blocks so it's
+# only called when a host's addresses expired or when the servers in the pool all failed
+def _resolve(host, port):
+    global _resolved_at
+    _resolved_at = time.time()
+    try:
+        infos = socket.getaddrinfo(host, port)
+    except OSError as e:
+        log.warning("Cannot resolve %s: %s", host, e)
+        return
+    now = time.time()
+    for ai in infos:
+        addr = ai[-1][0]
+        for srv in _pool:
+            if srv.addr == addr:
+                break
+        else:
+            srv = _Server(host, addr)
+            _pool.append(srv)
+        srv.host = host
+        srv.expires = now + DNS_TTL
+    # servers the host no longer resolves to stay as fallbacks until the pool is full, then the
+    # expired ones go first, and of those the least healthy
+    while len(_pool) > POOL_MAX:
+        _pool.remove(max(_pool, key=lambda s: (s.expires <= now, s.fails, s.score())))
+
+
+# return the healthiest server that isn't backing off and isn't in tried, the server of the
+# open session first, or None
+def _pick(port, tried):
+    hosts = _hosts()
+    if _session_srv and _session_srv not in tried:
+        return _session_srv
+    now = time.time()
+    for h in hosts:
+        if not any(s.host == h and s.expires > now for s in _pool):
+            _resolve(h, port)
+    for again in (False, True):
+        best = None
+        for s in _pool:
+            if s in tried or s.retry_at > now or s.host not in hosts:
+                continue
+            if best is None or s.score() < best.score():
+                best = s
+        if best or again or time.time() - _resolved_at < BACKOFF:
+            return best
+        # all the servers failed, the hosts may resolve to other ones
+        for h in hosts:
+            _resolve(h, port)
+
+
+# post the packet to the server using HTTP, return the HTTP status line split into its parts
+async def _post(srv, port, data):
+    content = _config["usr"] + "\r\n" + data
+    r, w = await asyncio.wait_for_ms(asyncio.open_connection(srv.addr, port), CONNECT_MS)
+    try:
+        w.write(
+            (
+                "POST / HTTP/1.0\r\nHost:%s\r\nContent-Type: application/octet-stream\r\n"
+                "Accept-Type: text/plain\r\nContent-Length:%d\r\n\r\n%s"
+                % (srv.host, len(content), content)
+            ).encode()
+        )
+        await asyncio.wait_for_ms(w.drain(), SEND_MS)
+        line = await asyncio.wait_for_ms(r.readline(), RESPONSE_MS)
+    finally:
+        w.close()
+        await w.wait_closed()
+    return line.split(None, 2)
+
+
+# read and drop what the server sends on the session (keepalive comments) so it doesn't pile up
+# in the socket, and close the session when the server closes it
+async def _drain(r, w):
+    global _session, _session_srv
+    try:
+        while await r.readline():
+            pass
+    except Exception:
+        pass
+    if _session is w:
+        _session = _session_srv = None
+        w.close()
+
+
+def _close():
+    global _session, _session_srv, _reader
+    _session_srv = None
+    if _session:
+        _session.close()
+        _session = None
+    if _reader:
+        _reader.cancel()
+        _reader = None
+
+
+# open an APRS-IS session: log in and wait for the server's response to the login
+async def _login(srv, port):
+    global _session, _session_srv, _reader
+    r, w = await asyncio.wait_for_ms(asyncio.open_connection(srv.addr, port), CONNECT_MS)
+    try:
+        w.write((_config["usr"] + "\r\n").encode())
+        await asyncio.wait_for_ms(w.drain(), SEND_MS)
+        # the server sends a banner comment first, then "# logresp <call> verified, ..."
+        while True:
+            line = await asyncio.wait_for_ms(r.readline(), RESPONSE_MS)
+            if not line:
+                raise OSError(104)  # ECONNRESET
+            if line.startswith(b"# logresp"):
+                break
+    except Exception:
+        w.close()
+        raise
+    log.info("APRS-IS %s", line[2:].strip().decode())
+    _session = w
+    _session_srv = srv
+    _reader = asyncio.create_task(_drain(r, w))
+
+
+# send the packet on the APRS-IS session, logging in first if there's none, a session that
+# fails is closed and the packet is sent once more on a new one
+async def _send(srv, port, data):
+    async with _lock:
+        for retry in (False, True):
+            if _session_srv is not srv:
+                _close()
+                await _login(srv, port)
+            try:
+                _session.write((data + "\r\n").encode())
+                await asyncio.wait_for_ms(_session.drain(), SEND_MS)
+                return
+            except Exception:
+                _close()
+                if retry:
+                    raise
+
+
+# format a weather report as an APRS packet
+def _packet(
     temp=None,  # temperature in centigrade
     hum=None,  # humidity in percent
     winddir=None,  # wind direction in degrees
     windspeed=None,  # wind speed in mph
     windgust=None,  # wind gust speed in mph
     rainrate=None,  # rain in the past hour in 0.01in
-    rainevent=None,  # rain "today" in 0.01in
+    rainevent=None,  # rain in the past 24 hours in 0.01in
     baro=None,  # barometric pressure in Bar
 ):
-    global _ipaddr, _config
-    if not _config:
-        return
     if winddir is not None:
         data = "_%03d" % winddir
     else:
@@ -45,43 +237,140 @@ async def send_wx(
     # L000 = luminosity (in watts per square meter) 999 and below.
     # l000 = luminosity (in watts per square meter) 1000 and above.
     # content = "%s\r\n%s>%s,TCPIP*:@000000z%s%sXTvEWx\r\n" % (
-    data = "%s>APESPW,TCPIP*:!%s%sXTvEWx" % (_config["sta"], _config["coord"], data)
-    content = _config["usr"] + "\r\n" + data
-    try:
-        if _ipaddr is None:
-            _ipaddr = socket.getaddrinfo(_config["server"], 8080)[0][-1]
-
-        log.debug("To %s: %s", _ipaddr[0], data)
-        s = socket.socket()
-        s.settimeout(30)
-        s.connect(_ipaddr)
-        s.write("POST / HTTP/1.0\r\nHost:")
-        s.write(_config["server"])
-        s.write(
-            "\r\nContent-Type: application/octet-stream\r\n"
-            "Accept-Type: text/plain\r\nContent-Length:"
-        )
-        s.write(str(len(content)))
-        s.write("\r\n\r\n")
-        s.write(content)
-
-        line = s.readline()
-        # print(l)
-        line = line.split(None, 2)
-        status = int(line[1])
+    return "%s>APESPW,TCPIP*:!%s%sXTvEWx" % (_config["sta"], _config["coord"], data)
+
+
+# upload a packet to CWOP via APRS-IS servers, by default as an HTTP POST to port 8080, or with
+# config["session"] on an APRS-IS login session to port 14580 that stays open; a server that
+# fails backs off and the packet is uploaded to the next healthiest one
+async def _upload(data):
+    session = _config.get("session", False)
+    port = _config.get("port", 14580 if session else 8080)
+    tried = []
+    for _ in range(TRIES):
+        srv = _pick(port, tried)
+        if srv is None:
+            break
+        tried.append(srv)
+        log.debug("To %s: %s", srv.addr, data)
+        t0 = time.ticks_ms()
+        try:
+            if session:
+                await _send(srv, port, data)
+                srv.ok(time.ticks_diff(time.ticks_ms(), t0))
+                log.info("Sent %s", data)
+                return
+            line = await _post(srv, port, data)
+            status = int(line[1])
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+            log.exception(logging.WARNING, e, "CWOP send to %s failed:", srv.addr)
+            srv.failed()
+            continue
+        if status >= 500:
+            log.warning("POST error %d: %s", status, line[-1].decode("utf-8").strip())
+            srv.failed()
+            continue
+        srv.ok(time.ticks_diff(time.ticks_ms(), t0))
         if status >= 200 and status < 300:
             log.info("Posted %s", data)
         else:
             log.warning("POST error %d: %s", status, line[-1].decode("utf-8").strip())
-            if status >= 500:
-                _ipaddr = None
-    except OSError as e:
-        _ipaddr = None
-        log.exception(logging.WARNING, e, "POST failed:")
-    finally:
-        s.close()
+        return
+    log.warning("No CWOP server available, report dropped")
+
+
+# send a weather report right away, see _packet() for the arguments
+# config must have: usr, sta, coord, baro_off; it may have: server, session, port, period
+async def send_wx(**kw):
+    if _config:
+        await _upload(_packet(**kw))
+
+
+# add a sample to the next report, the arguments being those of _packet(); the report has the
+# mean temperature, humidity, and pressure, the latest wind, which should be the 2 minute average,
+# the max gust, and the latest rain totals
+def collect(
+    temp=None,
+    hum=None,
+    winddir=None,
+    windspeed=None,
+    windgust=None,
+    rainrate=None,
+    rainevent=None,
+    baro=None,
+):
+    global _wind, _gust, _rain
+    for i, v in enumerate((temp, hum, baro)):
+        if v is not None:
+            _sum[i] += v
+            _cnt[i] += 1
+    if windspeed is not None:
+        _wind = (winddir, windspeed)
+    if windgust is not None and (_gust is None or windgust > _gust):
+        _gust = windgust
+    if rainrate is not None:
+        _rain = (rainrate, rainevent)
+
+
+# return the packet aggregated from the samples collected since the last one, None if there
+# are none
+def _aggregate():
+    global _wind, _gust, _rain
+    if not any(_cnt) and _wind is None:
+        return None
+    mean = [_sum[i] / _cnt[i] if _cnt[i] else None for i in range(3)]
+    w, r = _wind or (None, None), _rain or (None, None)
+    data = _packet(
+        temp=mean[0],
+        hum=mean[1] and round(mean[1]),
+        winddir=w[0],
+        windspeed=w[1],
+        windgust=_gust,
+        rainrate=r[0],
+        rainevent=r[1],
+        baro=mean[2],
+    )
+    for i in range(3):
+        _sum[i] = 0.0
+        _cnt[i] = 0
+    _wind = _gust = _rain = None
+    return data
+
+
+# produce a report every period, if the upload of the previous one hasn't finished yet the report
+# waits, replacing any report already waiting
+async def _reporter(period_ms):
+    global _pending
+    t = time.ticks_ms()
+    while True:
+        t = time.ticks_add(t, period_ms)
+        await asyncio.sleep_ms(time.ticks_diff(t, time.ticks_ms()))
+        data = _aggregate()
+        if data is None:
+            continue
+        if _pending is not None:
+            log.warning("Dropping stale report, upload still in flight")
+        _pending = data
+        _ready.set()
+
+
+# upload the reports one at a time, an unexpected error drops the report but not the task
+async def _uploader():
+    global _pending
+    while True:
+        await _ready.wait()
+        _ready.clear()
+        data, _pending = _pending, None
+        if data:
+            try:
+                await _upload(data)
+            except Exception as e:
+                log.exception(logging.ERROR, e, "CWOP upload failed:")
 
 
+# config["period"] is the seconds between reports, CWOP asks for no more than one per 5 minutes
 def start(mqtt, config):
     global _config
     _config = config
+    asyncio.create_task(_reporter(config.get("period", 300) * 1000))
+    asyncio.create_task(_uploader())
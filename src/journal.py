@@ -0,0 +1,281 @@
+import logging
+import uos as os
+import uasyncio as asyncio
+from sample import Sample, REC_SIZE, REC_VERSION
+from batch import Batch
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+_MAGIC = b"WJ"
+_HDR_SIZE = const(4)  # magic, record version, record size
+_JSON_REC_MAX = const(400)  # max length of a JSON-encoded record with timestamp
+
+
+class Journal:
+    """
+    Journal implements store-and-forward of sample records for times when the MQTT broker cannot
+    be reached. Records are first kept in a RAM ring buffer, when that fills up its contents are
+    spilled to an append-only journal in flash. Once the broker is reachable again, the backlog
+    is replayed oldest-first in batches at a throttled rate.
+    The flash journal consists of two segment files: new records are appended to the current
+    segment and when it is full the previous segment is deleted, i.e., the oldest records are
+    dropped, and the current one becomes the previous one. The RAM ring only drops its oldest
+    record if spilling to flash fails. The replay position in the previous segment is saved in a
+    cursor file after each batch, so a reset doesn't replay the records already sent again.
+    """
+
+    def __init__(self, path="/journal", ram_recs=30, seg_recs=1024, batch_recs=8, binary=False):
+        """
+        Initialize the journal with segment files at path + ".0" (previous) and path + ".1"
+        (current), and the replay cursor at path + ".off". The RAM ring holds ram_recs records,
+        each flash segment holds seg_recs records, and replay publishes batch_recs records per
+        message, either as a JSON array or, if binary is true, in the batched binary format of
+        the batch module.
+        """
+        self.path = path
+        self.seg_recs = seg_recs
+        self.batch_recs = batch_recs
+        self.ram = bytearray(ram_recs * REC_SIZE)
+        self.ram_recs = ram_recs
+        self.ram_head = 0  # index of the oldest record in the RAM ring
+        self.ram_cnt = 0  # number of records in the RAM ring
+        self.replay_off = _HDR_SIZE  # read offset into the oldest segment file being replayed
+        self.dropped = 0  # number of records dropped since boot
+        self.gen = 0  # incremented when segments rotate, invalidates a batch being replayed
+        self.ram_gen = 0  # incremented when the RAM ring's oldest records move or get dropped
+        self.ram_busy = 0  # oldest records of the RAM ring being replayed, they're not spilled
+        if binary:
+            self.bin = Batch(batch_recs)
+        else:
+            self.bin = None
+            self.rec = Sample(0)  # record used to decode for replay
+            self.batch = bytearray(2 + batch_recs * _JSON_REC_MAX)  # JSON batch encoding buffer
+        for seg in (0, 1):
+            self._check_seg(seg)
+        self._load_cursor()
+
+    def _seg(self, seg):
+        return self.path + "." + str(seg)
+
+    def _cursor(self):
+        return self.path + ".off"
+
+    def _load_cursor(self):
+        # restore the replay offset into the previous segment, a cursor that doesn't fit the
+        # segment is left over from one that's gone
+        try:
+            with open(self._cursor(), "rb") as f:
+                off = int.from_bytes(f.read(4), "little")
+        except OSError:
+            return
+        end = _HDR_SIZE + self._seg_recs(0) * REC_SIZE
+        if off < _HDR_SIZE or off > end or (off - _HDR_SIZE) % REC_SIZE:
+            self._clear_cursor()
+            return
+        self.replay_off = off
+        log.info("Resuming replay at record %d", (off - _HDR_SIZE) // REC_SIZE)
+
+    def _save_cursor(self):
+        # a reset while writing leaves the cursor short, the segment is then replayed from the
+        # start, which sends records twice rather than losing them
+        try:
+            with open(self._cursor(), "wb") as f:
+                f.write(self.replay_off.to_bytes(4, "little"))
+        except OSError as e:
+            log.warning("Journal cursor save failed: %s", e)
+
+    def _clear_cursor(self):
+        # the cursor goes before the previous segment does, so it can't apply to the next one
+        try:
+            os.remove(self._cursor())
+        except OSError:
+            pass
+
+    def _seg_recs(self, seg):
+        # number of records in a segment file, 0 if it does not exist
+        try:
+            return (os.stat(self._seg(seg))[6] - _HDR_SIZE) // REC_SIZE
+        except OSError:
+            return 0
+
+    def _check_seg(self, seg):
+        # remove a segment left behind with a different record layout
+        try:
+            with open(self._seg(seg), "rb") as f:
+                hdr = f.read(_HDR_SIZE)
+            if hdr[:2] != _MAGIC or hdr[2] != REC_VERSION or hdr[3] != REC_SIZE:
+                log.warning("Discarding journal %s: incompatible", self._seg(seg))
+                os.remove(self._seg(seg))
+        except OSError:
+            pass
+        except IndexError:
+            os.remove(self._seg(seg))
+
+    def backlog(self):
+        """
+        Return the number of records waiting to be replayed.
+        """
+        prev = self._seg_recs(0)
+        if prev:
+            prev -= (self.replay_off - _HDR_SIZE) // REC_SIZE
+        return prev + self._seg_recs(1) + self.ram_cnt
+
+    def store(self, sample):
+        """
+        Store a sample record in the journal.
+        """
+        sample.pack_into(self.ram, self._slot())
+
+    def store_packed(self, buf, off):
+        """
+        Store a record that is already in binary form at offset off in buf.
+        """
+        ix = self._slot()
+        self.ram[ix : ix + REC_SIZE] = buf[off : off + REC_SIZE]
+
+    def _slot(self):
+        # allocate a slot for a new record in the RAM ring and return its offset
+        if self.ram_cnt == self.ram_recs:
+            self._spill()
+        if self.ram_cnt == self.ram_recs:
+            # spilling failed, drop the oldest record
+            self.ram_head = (self.ram_head + 1) % self.ram_recs
+            self.ram_cnt -= 1
+            self.ram_gen += 1
+            self.dropped += 1
+        ix = (self.ram_head + self.ram_cnt) % self.ram_recs
+        self.ram_cnt += 1
+        return ix * REC_SIZE
+
+    def _spill(self):
+        # append the contents of the RAM ring to the current flash segment, except for records
+        # that are being replayed: spilling those would replay them twice
+        busy = self.ram_busy
+        cnt = self.ram_cnt - busy
+        if cnt <= 0:
+            return
+        try:
+            if self._seg_recs(1) + cnt > self.seg_recs:
+                self._rotate()
+            with open(self._seg(1), "ab") as f:
+                if f.tell() == 0:
+                    f.write(_MAGIC + bytes((REC_VERSION, REC_SIZE)))
+                mv = memoryview(self.ram)
+                # the ring may wrap around, write the two halves in order
+                start = (self.ram_head + busy) % self.ram_recs
+                end = start + cnt
+                if end > self.ram_recs:
+                    f.write(mv[start * REC_SIZE :])
+                    f.write(mv[: (end - self.ram_recs) * REC_SIZE])
+                else:
+                    f.write(mv[start * REC_SIZE : end * REC_SIZE])
+            log.debug("Spilled %d records to %s", cnt, self._seg(1))
+            self.ram_cnt = busy
+            if busy == 0:
+                self.ram_head = 0
+                self.ram_gen += 1
+        except OSError as e:
+            log.warning("Journal spill failed: %s", e)
+
+    def _rotate(self):
+        # drop the previous segment and make the current one the previous one
+        dropped = self._seg_recs(0) - (self.replay_off - _HDR_SIZE) // REC_SIZE
+        if dropped > 0:
+            log.warning("Journal full, dropping %d oldest records", dropped)
+            self.dropped += dropped
+        self._clear_cursor()
+        try:
+            os.remove(self._seg(0))
+        except OSError:
+            pass
+        os.rename(self._seg(1), self._seg(0))
+        self.replay_off = _HDR_SIZE
+        self.gen += 1
+
+    def _read_batch(self):
+        # read the next batch of oldest records, returns (count, records, from_ram)
+        if self._seg_recs(0) == 0 and self._seg_recs(1) > 0:
+            # replay the current segment by making it the previous one, new records get
+            # appended to a fresh current segment in the meantime
+            self._rotate()
+        avail = self._seg_recs(0) - (self.replay_off - _HDR_SIZE) // REC_SIZE
+        if avail > 0:
+            cnt = min(avail, self.batch_recs)
+            with open(self._seg(0), "rb") as f:
+                f.seek(self.replay_off)
+                return cnt, f.read(cnt * REC_SIZE), False
+        # copy the records out of the RAM ring, it may change while the batch is being published,
+        # one slot is left for new records so the ring can't fill up with records in flight
+        cnt = min(self.ram_cnt, self.batch_recs, max(self.ram_recs - 1, 1))
+        recs = bytearray(cnt * REC_SIZE)
+        for i in range(cnt):
+            ix = ((self.ram_head + i) % self.ram_recs) * REC_SIZE
+            recs[i * REC_SIZE : (i + 1) * REC_SIZE] = self.ram[ix : ix + REC_SIZE]
+        return cnt, recs, True
+
+    def _ack_batch(self, cnt, from_ram):
+        # mark cnt records as replayed
+        if from_ram:
+            self.ram_head = (self.ram_head + cnt) % self.ram_recs
+            self.ram_cnt -= cnt
+            return
+        self.replay_off += cnt * REC_SIZE
+        if (self.replay_off - _HDR_SIZE) // REC_SIZE >= self._seg_recs(0):
+            self._clear_cursor()
+            os.remove(self._seg(0))
+            self.replay_off = _HDR_SIZE
+        else:
+            self._save_cursor()
+
+    def encode_batch(self, recs, cnt):
+        """
+        Encode cnt binary records as a JSON array of objects with timestamp into the batch
+        buffer and return the length.
+        """
+        buf = self.batch
+        n = 0
+        buf[n] = 0x5B  # [
+        n += 1
+        for i in range(cnt):
+            if i:
+                buf[n] = 0x2C  # ,
+                n += 1
+            self.rec.unpack_from(recs, i * REC_SIZE)
+            n = self.rec.encode_into(buf, n, ts=True)
+        buf[n] = 0x5D  # ]
+        return n + 1
+
+    async def replay(self, client, topic, period_ms=2000):
+        """
+        Replay the backlog to the topic whenever the client is connected, publishing one batch
+        every period_ms so the live samples and other tasks are not starved.
+        """
+        while True:
+            await asyncio.sleep_ms(period_ms)
+            if not client.isconnected() or self.backlog() == 0:
+                continue
+            try:
+                cnt, recs, from_ram = self._read_batch()
+                if cnt == 0:
+                    continue
+                gen, ram_gen = self.gen, self.ram_gen
+                if self.bin:
+                    self.bin.add_packed(recs, cnt)
+                    msg = self.bin.payload()
+                else:
+                    msg = self.batch[: self.encode_batch(recs, cnt)]
+                if from_ram:
+                    self.ram_busy = cnt
+                try:
+                    await client.publish(topic, msg, qos=1, sync=True)
+                finally:
+                    self.ram_busy = 0
+                if from_ram and ram_gen != self.ram_gen or not from_ram and gen != self.gen:
+                    # the records moved or were dropped while publishing, they're either gone or
+                    # will be replayed again from their new location
+                    continue
+                self._ack_batch(cnt, from_ram)
+                log.info("Replayed %d records, %d to go", cnt, self.backlog())
+            except OSError as e:
+                log.warning("Journal replay failed: %s", e)
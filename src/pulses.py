@@ -0,0 +1,70 @@
+# Timestamps of the most recent pulses on a pin, recorded by the pin's interrupt, and the rate
+# computed from the intervals between them, for the anemometer's period mode and the rain
+# gauge's tip mode.
+import array, machine, time
+
+
+class PulseTimes:
+    """
+    PulseTimes records the time of each falling edge on a pin in a ring of size entries (a
+    power of 2), from the pin interrupt and without allocating. The times come from clock,
+    ticks_ms or ticks_us, and edges within debounce of the previous one are ignored.
+    """
+
+    def __init__(self, pin, size, clock=time.ticks_ms, debounce=0):
+        if size & (size - 1) or size < 2:
+            raise ValueError("Invalid size")
+        self.ts = array.array("i", (0 for _ in range(size)))
+        self.ix = 0  # next entry to overwrite
+        self.n = 0  # pulses recorded, up to size
+        self.clock = clock
+        self.debounce = debounce
+        pin.irq(handler=self._irq, trigger=machine.Pin.IRQ_FALLING)
+
+    def _irq(self, pin):
+        self.record(self.clock())
+
+    def record(self, t):
+        """
+        Record a pulse at time t, this is what the interrupt handler does.
+        """
+        i = self.ix
+        if self.debounce and self.n and time.ticks_diff(t, self.ts[i - 1]) < self.debounce:
+            return  # contact bounce
+        self.ts[i] = t
+        self.ix = (i + 1) & (len(self.ts) - 1)
+        if self.n < len(self.ts):
+            self.n += 1
+
+    def rate(self, now, window, max_n=None, dead=0):
+        """
+        Return the pulse rate per clock unit from the intervals between the pulses within window
+        before now, at most the last max_n pulses, each interval taken as dead shorter, or None
+        if there are fewer than two. If the time since the last pulse is longer than the average
+        interval, the rate is at most the one implied by that time.
+        """
+        ts = self.ts
+        i = self.ix  # the interrupt may advance ix while this runs, which is harmless
+        n = self.n if max_n is None else min(self.n, max_n)
+        if n < 2:
+            return None
+        last = ts[i - 1]
+        gap = time.ticks_diff(now, last)
+        if gap < 0 or gap >= window:
+            return None
+        first = last
+        k = 0  # intervals between pulses in the window
+        for j in range(2, n + 1):
+            t = ts[i - j]
+            dt = time.ticks_diff(now, t)
+            if dt < 0 or dt >= window:
+                break
+            first = t
+            k += 1
+        span = time.ticks_diff(last, first) - k * dead
+        if k == 0 or span <= 0:
+            return None
+        r = k / span
+        if gap > 0 and 1 / gap < r:
+            r = 1 / gap
+        return r
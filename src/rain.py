@@ -1,26 +1,37 @@
-import time
+import array, time
+from pulses import PulseTimes
 
 
 RATE_OFF = const(5 * 60)  # force rain rate to zero if no tip in this many seconds
 EVENT_OFF = const(12 * 60 * 60)  # reset rain event if no tip in this many seconds
 DAY_START = const(8 * 60)  # start rain day this many minutes after midnight
+STATE_FMT = "<iiiiiiii"  # struct format of Rain.state(), for checkpoints
+_MINUTES = const(24 * 60)  # slots of the per-minute tip ring, covering the past 24 hours
+
 
 class Rain:
     """
     Rain implements methods to measure rainfall using a tipping bucket gauge.
     """
 
-    def __init__(self, counter, mils=10):
+    def __init__(self, counter, mils=10, pin=None):
         """
         Initialize the tipping gauge using the provided counter object, which must be init'ed for
         the appropriate pin. Bucket tipping counts are converted to inches of rain using the mils
         factor: it describes how many 1/1000th of an inch each tip represents. Typically this is
         the value 10 but may depart from that top adjust for calibration.
+        The optional pin is the counter's input pin, which is needed for tip_mode().
         """
         if counter is None or counter.value is None:
             raise ValueError("Counter object needed as argument!")
         self.ctr = counter
         self.mils = mils
+        self.pin = pin
+        self.tip_times = None  # PulseTimes of the most recent tips, see tip_mode()
+        # tip count that doesn't wrap around and continues across resets, see restore()
+        self.count = 0
+        self.hw = None  # counter value at the last read
+        self.dirty = False  # whether the state changed in a way worth a checkpoint
         # data for rain rate
         self.last_read_at = None
         self.last_tip_at = None
@@ -29,19 +40,85 @@ class Rain:
         self.event_start_at = None
         self.event_start_count = None
         # data for rain volume "today", reset at 8am like San Marcos Pass
-        self.day_updated_min = None
+        self.day = None  # rain day of the last read, counted since the epoch
         self.day_start_count = None
+        # tips per minute over the past 24 hours for the rolling totals, the running sums
+        # are updated as minutes enter and leave the windows so reading them is O(1)
+        self.mins = array.array("H", (0 for _ in range(_MINUTES)))
+        self.minute = None  # minute since the epoch of the current slot
+        self.tips_1h = 0
+        self.tips_24h = 0
+
+    def tip_mode(self, debounce_ms=50, tip_ms=0, size=4):
+        """
+        Enable computing the rain rate from the times between the most recent tips instead of
+        from the count between reads, so it follows intense cells within seconds. A pin
+        interrupt records the time of each tip in a ring of size entries (a power of 2),
+        ignoring bounces within debounce_ms of the previous tip, and the rate is the average
+        over the last size-1 intervals within RATE_OFF. The rate is corrected for the
+        rain that falls while the bucket tips, which the gauge misses at high intensities:
+        with tip_ms the duration of a tip, each interval between tips is taken as tip_ms shorter.
+        """
+        if self.pin is None:
+            raise ValueError("Rain gauge pin needed for tip mode")
+        self.tip_times = PulseTimes(self.pin, size, debounce=debounce_ms)
+        self.tip_ms = tip_ms
 
-    def read(self, now=None, count=None):
+    def _tip_rate(self, now):
+        # Return the rate in mils/sec from the intervals between the tips within RATE_OFF before
+        # now (ticks_ms), or None if there are fewer than two.
+        r = self.tip_times.rate(now, RATE_OFF * 1000, dead=self.tip_ms)
+        return None if r is None else r * self.mils * 1000
+
+    def _tally(self, now, tips):
+        # advance the per-minute ring to now and add the tips to the current minute
+        m = now // 60
+        if self.minute is None or m - self.minute >= _MINUTES:
+            for i in range(_MINUTES):
+                self.mins[i] = 0
+            self.tips_1h = self.tips_24h = 0
+        elif m > self.minute:
+            for k in range(self.minute + 1, m + 1):
+                # minute k-60 leaves the hour, minute k-1440 leaves the day and its slot is reused
+                self.tips_1h -= self.mins[(k - 60) % _MINUTES]
+                i = k % _MINUTES
+                self.tips_24h -= self.mins[i]
+                self.mins[i] = 0
+        if self.minute is None or m > self.minute:
+            self.minute = m
+        # tips are accounted to the minute they are read in, a clock going back keeps the slot
+        i = self.minute % _MINUTES
+        tips = min(tips, 0xFFFF - self.mins[i])
+        self.mins[i] += tips
+        self.tips_1h += tips
+        self.tips_24h += tips
+
+    def totals(self):
+        """
+        Return the rain in the past hour and in the past 24 hours (in) as of the last read. The
+        per-minute history isn't checkpointed, so after a reset these only cover the time since.
+        """
+        return (self.mils * self.tips_1h / 1000.0, self.mils * self.tips_24h / 1000.0)
+
+    def read(self, now=None, count=None, ms=None):
         """
         Reads the rain gauge and returns a 3-tuple with rain rate (in/hr), rain this event (in),
         and rain today (in).
-        The now and count parameters are for testing purposes to be able to simulate tips.
+        The now, count, and ms (ticks_ms) parameters are for testing purposes to be able to
+        simulate tips.
         """
         if now is None:
             now = time.time()
         if count is None:
             count = self.ctr.value()
+        # handle roll-over of the 16-bit signed counter value
+        tips = 0
+        if self.hw is not None:
+            tips = (count - self.hw) & 0x7FFF
+            self.count += tips
+        self.hw = count
+        count = self.count
+        self._tally(now, tips)
         # Initialize
         if self.last_tip_at is None:
             self.last_read_at = now
@@ -56,7 +133,8 @@ class Rain:
                 # the gauge recently tipped, calculate average rate since last tip as if it tipped
                 # now (provides graceful drop in rain rate)
                 rate = self.mils / dt  # [mils/sec]
-            elif dt > EVENT_OFF:
+            elif dt > EVENT_OFF and self.event_start_at is not None:
+                self.dirty = True
                 self.event_start_at = None
                 self.event_start_count = None
         else:
@@ -68,6 +146,11 @@ class Rain:
                 self.event_start_at = self.last_read_at
                 self.event_start_count = self.last_tip_count
             self.last_tip_at = now
+            self.dirty = True
+        if self.tip_times is not None:
+            r = self._tip_rate(time.ticks_ms() if ms is None else ms)
+            if r is not None:
+                rate = r
         if rate != 0:
             rate = round(rate * 3.6, 3)  # [in/hr]
         # Update rain event
@@ -76,17 +159,52 @@ class Rain:
             # we are in a rain event
             event = self.mils * (count - self.event_start_count) / 1000.0
         # Update rain today
-        lt = time.localtime(now)
-        minute = lt[3] * 60 + lt[4]  # minutes since midnight
-        today = 0
-        if self.day_updated_min is None or (
-            self.day_updated_min < DAY_START and minute >= DAY_START
-        ):
+        day = (now - DAY_START * 60) // 86400
+        if day != self.day:
             self.day_start_count = self.last_tip_count
+            self.dirty = True
         today = self.mils * (count - self.day_start_count) / 1000.0
         # Update data
         self.last_read_at = now
         self.last_tip_count = count
-        self.day_updated_min = minute
+        self.day = day
         # that's it...
         return (rate, event, today)
+
+    def state(self):
+        """
+        Return the state as a tuple of ints in STATE_FMT for a checkpoint.
+        """
+        return tuple(
+            -1 if v is None else v
+            for v in (
+                self.count,
+                self.last_read_at,
+                self.last_tip_at,
+                self.last_tip_count,
+                self.event_start_at,
+                self.event_start_count,
+                self.day,
+                self.day_start_count,
+            )
+        )
+
+    def restore(self, vals):
+        """
+        Restore the state from a checkpoint after a reset. The counter restarts after a reset, so
+        its current value becomes the base for the next read, tips while the station was down
+        are lost.
+        """
+        v = [None if x == -1 else x for x in vals]
+        (
+            self.count,
+            self.last_read_at,
+            self.last_tip_at,
+            self.last_tip_count,
+            self.event_start_at,
+            self.event_start_count,
+            self.day,
+            self.day_start_count,
+        ) = v
+        self.hw = self.ctr.value()
+        self.dirty = False
@@ -0,0 +1,201 @@
+# Fixed-schema sample record for the weather station.
+# A Sample holds one slot per published field, each as a fixed-point integer with a per-field
+# number of decimals. It is allocated once and reused for every cycle, and its JSON encoder writes
+# into a preallocated bytearray, so steady-state cycles don't churn the heap.
+# Records can also be packed into a compact fixed-size binary form for storage and batching.
+import array, struct
+
+# Field indexes
+T_BME680 = const(0)  # temperature in °C
+H_BME680 = const(1)  # relative humidity in %
+P_BME680 = const(2)  # barometric pressure in Bar
+G_BME680 = const(3)  # gas resistance in Ohm
+T_SI7021 = const(4)
+H_SI7021 = const(5)
+T_SHT31 = const(6)
+H_SHT31 = const(7)
+WIND = const(8)  # wind speed in m/s
+GUST = const(9)  # wind gust in m/s
+WDIR = const(10)  # wind direction in degrees
+PM25 = const(11)  # PM2.5 concentration in µg/m³
+AQI_TVOC = const(12)
+AQI_PM25 = const(13)
+GDIR = const(14)  # wind gust direction in degrees
+WDIR_SD = const(15)  # standard deviation of the wind direction in degrees
+TI = const(16)  # turbulence intensity, std dev of the wind speed over its mean
+RAIN_RATE = const(17)  # rain rate in in/h
+RAIN_EVENT = const(18)  # rain this event in in
+RAIN_DAY = const(19)  # rain today, since 8am, in in
+RAIN_1H = const(20)  # rain in the past hour in in
+RAIN_24H = const(21)  # rain in the past 24 hours in in
+NFIELDS = const(22)
+
+# Field names as published in the JSON record, indexed by field
+NAMES = (
+    b"t_bme680",
+    b"h_bme680",
+    b"p_bme680",
+    b"g_bme680",
+    b"t_si7021",
+    b"h_si7021",
+    b"t_sht31",
+    b"h_sht31",
+    b"wind",
+    b"gust",
+    b"wdir",
+    b"pm25",
+    b"aqi_tvoc",
+    b"aqi_pm25",
+    b"gdir",
+    b"wdir_sd",
+    b"ti",
+    b"rain_rate",
+    b"rain_event",
+    b"rain_day",
+    b"rain_1h",
+    b"rain_24h",
+)
+
+# Number of decimals kept for each field, indexed by field
+DECIMALS = (2, 1, 5, 0, 2, 1, 2, 1, 2, 2, 0, 1, 0, 0, 0, 1, 2, 2, 2, 2, 2, 2)
+_SCALE = (1, 10, 100, 1000, 10000, 100000)
+
+# Binary record layout: timestamp, presence mask, and the fixed-point value of each field.
+# REC_VERSION must be incremented whenever the layout changes.
+REC_VERSION = const(5)
+REC_FMT = "<II" + "hhiihhhhhhhhhhhhhhhhhh"
+REC_SIZE = struct.calcsize(REC_FMT)
+
+
+class Sample:
+    """
+    Sample is a fixed-slot record of the values measured in one cycle. Values are stored as
+    fixed-point integers in an array and a bitmask tracks which fields are present.
+    """
+
+    def __init__(self, bufsize=400):
+        self.v = array.array("i", (0 for _ in range(NFIELDS)))
+        self.mask = 0  # bit i set if field i has a value
+        self.ts = 0  # time.time() when the sample was taken
+        self.buf = bytearray(bufsize)  # JSON encoding buffer
+
+    def clear(self):
+        """
+        Mark all fields as absent, the values themselves are left in place.
+        """
+        self.mask = 0
+
+    def set(self, ix, val):
+        """
+        Set field ix to val, which is rounded to the number of decimals of the field.
+        Setting None clears the field.
+        """
+        if val is None:
+            self.mask &= ~(1 << ix)
+            return
+        val = val * _SCALE[DECIMALS[ix]]
+        self.v[ix] = int(val + 0.5) if val >= 0 else -int(0.5 - val)
+        self.mask |= 1 << ix
+
+    def merge(self, other):
+        """
+        Copy the fields present in the other sample into this one.
+        """
+        m = other.mask
+        for ix in range(NFIELDS):
+            if m & (1 << ix):
+                self.v[ix] = other.v[ix]
+        self.mask |= m
+
+    def has(self, ix):
+        return self.mask & (1 << ix) != 0
+
+    def get(self, ix, dflt=None):
+        """
+        Return field ix as a float (or int for fields without decimals), or dflt if the field is
+        absent.
+        """
+        if not self.mask & (1 << ix):
+            return dflt
+        dec = DECIMALS[ix]
+        if dec == 0:
+            return self.v[ix]
+        return self.v[ix] / _SCALE[dec]
+
+    def encode(self):
+        """
+        Encode the present fields as a JSON object into the buffer and return the length.
+        The result can be accessed as memoryview(sample.buf)[:length].
+        """
+        return self.encode_into(self.buf, 0)
+
+    def encode_into(self, buf, n, ts=False):
+        """
+        Encode the present fields as a JSON object into buf starting at offset n and return the
+        offset just past the end. If ts is true the timestamp is included as "ts" field.
+        """
+        buf[n] = 0x7B  # {
+        n += 1
+        start = n
+        if ts:
+            buf[n : n + 5] = b'"ts":'
+            n = _put_fixed(buf, n + 5, self.ts, 0)
+        for ix in range(NFIELDS):
+            if not self.mask & (1 << ix):
+                continue
+            if n > start:
+                buf[n] = 0x2C  # ,
+                n += 1
+            name = NAMES[ix]
+            buf[n] = 0x22  # "
+            buf[n + 1 : n + 1 + len(name)] = name
+            n += len(name) + 1
+            buf[n] = 0x22
+            buf[n + 1] = 0x3A  # :
+            n = _put_fixed(buf, n + 2, self.v[ix], DECIMALS[ix])
+        buf[n] = 0x7D  # }
+        return n + 1
+
+    def pack_into(self, buf, off):
+        """
+        Pack the record in binary form into buf at offset off, using REC_SIZE bytes.
+        """
+        struct.pack_into(REC_FMT, buf, off, self.ts, self.mask, *self.v)
+
+    def unpack_from(self, buf, off):
+        """
+        Load the record from its binary form at offset off in buf.
+        """
+        vals = struct.unpack_from(REC_FMT, buf, off)
+        self.ts = vals[0]
+        self.mask = vals[1]
+        for ix in range(NFIELDS):
+            self.v[ix] = vals[ix + 2]
+
+
+# _put_fixed writes the fixed-point value v with dec decimals as ascii into buf at offset n and
+# returns the offset just past the last character written
+def _put_fixed(buf, n, v, dec):
+    if v < 0:
+        buf[n] = 0x2D  # -
+        n += 1
+        v = -v
+    # count digits, there must be at least one before the decimal point
+    digits = 1
+    p = 10
+    while p <= v:
+        digits += 1
+        p *= 10
+    if digits <= dec:
+        digits = dec + 1
+    end = n + digits + (1 if dec else 0)
+    # write digits back to front
+    i = end
+    for k in range(digits):
+        if k == dec and dec:
+            i -= 1
+            buf[i] = 0x2E  # .
+        i -= 1
+        buf[i] = 0x30 + v % 10
+        v //= 10
+    return end
@@ -0,0 +1,122 @@
+import time, logging
+import uasyncio as asyncio
+from sample import Sample
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+_MAX_SLEEP = const(1000)  # max ms a task sleeps before re-checking its period
+
+
+class Task:
+    """
+    Task is a sensor reader run periodically by the Scheduler. Each run fills in the latest
+    values of the sensor in the task's cache.
+    """
+
+    def __init__(self, name, period_ms, fn, lock, stretch):
+        self.name = name
+        self.period_ms = period_ms
+        self.fn = fn  # fn(cache), may be a plain function or a coroutine function
+        self.lock = lock  # optional lock held while fn runs
+        self.stretch = stretch  # whether the period stretches to the scheduler's slow_ms
+        self.cache = Sample(0)  # latest values
+        self.at = None  # ticks_ms when the cache was last updated
+        self.errors = 0  # consecutive failures
+        self.stat = 0  # stage index in the scheduler's stats
+
+
+class Scheduler:
+    """
+    Scheduler runs each registered sensor task in its own asyncio task with its own period, so
+    slow sensors never delay fast ones. Consumers read the latest values from the task caches.
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self.fast_ms = 0  # if non-zero: cap on all periods, used for rapid-update display modes
+        self.slow_ms = 0  # if non-zero: floor on the periods of the stretch tasks, see add()
+        self.stats = None  # optional stats.Stats that each task run is recorded in
+
+    def add(self, name, period_ms, fn, lock=None, stretch=False):
+        """
+        Register a sensor task that calls fn(cache) every period_ms milliseconds. The function
+        must set the fields it measures in the cache (a sample.Sample). If a lock is provided
+        it is held while fn runs, which serializes all tasks sharing the lock. A stretch task
+        is one whose values summarize its whole period, like the max gust, its period stretches
+        to slow_ms when that is longer so the values cover the time between two collects.
+        """
+        t = Task(name, period_ms, fn, lock, stretch)
+        self.tasks.append(t)
+        return t
+
+    def start(self):
+        """
+        Launch the asyncio tasks.
+        """
+        for t in self.tasks:
+            if self.stats:
+                t.stat = self.stats.stage(t.name)
+            asyncio.create_task(self._run(t))
+
+    def _period(self, t):
+        if self.fast_ms and self.fast_ms < t.period_ms:
+            return self.fast_ms
+        if t.stretch and self.slow_ms > t.period_ms:
+            return self.slow_ms
+        return t.period_ms
+
+    async def _run(self, t):
+        at = time.ticks_ms()
+        while True:
+            st = self.stats
+            try:
+                if t.lock:
+                    await t.lock.acquire()
+                try:
+                    if st:
+                        st.begin(t.stat)
+                    r = t.fn(t.cache)
+                    if r is not None:
+                        await r
+                    if st:
+                        st.end(t.stat)
+                finally:
+                    if t.lock:
+                        t.lock.release()
+                t.at = time.ticks_ms()
+                t.errors = 0
+                log.debug("%s: %dms", t.name, time.ticks_diff(t.at, at))
+            except Exception as e:
+                t.errors += 1
+                if t.errors == 1:
+                    log.warning("%s failed: %s", t.name, e)
+            # sleep until the next period, skipping periods that have been missed entirely
+            while True:
+                dt = time.ticks_diff(time.ticks_ms(), at)
+                p = self._period(t)
+                if dt >= p:
+                    break
+                await asyncio.sleep_ms(min(p - dt, _MAX_SLEEP))
+            at = time.ticks_ms() if dt >= 2 * p else time.ticks_add(at, p)
+
+    async def settle(self, timeout_ms=2000):
+        """
+        Wait until every task has filled in its cache once, or until timeout_ms has elapsed.
+        """
+        t0 = time.ticks_ms()
+        while time.ticks_diff(time.ticks_ms(), t0) < timeout_ms:
+            if all(t.at is not None for t in self.tasks):
+                return
+            await asyncio.sleep_ms(50)
+
+    def collect(self, sample):
+        """
+        Merge the cached values of all tasks into the sample. Caches that haven't been updated
+        for three periods are considered stale and are skipped.
+        """
+        now = time.ticks_ms()
+        for t in self.tasks:
+            p = max(t.period_ms, self._period(t))
+            if t.at is not None and time.ticks_diff(now, t.at) < 3 * p:
+                sample.merge(t.cache)
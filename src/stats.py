@@ -0,0 +1,110 @@
+# Per-stage timing and memory instrumentation. Each stage of the station's work (a sensor read,
+# the display update, a publish, ...) is bracketed by begin() and end(), which record the time
+# spent using ticks_us and the bytes allocated using gc.mem_alloc. The aggregates are kept in
+# preallocated arrays so that measuring doesn't allocate, and are encoded and reset periodically.
+import array, gc, time
+import ujson as json
+
+MAX_STAGES = const(16)
+_BIG = const(0x3FFFFFFF)
+
+
+def _zeros():
+    return array.array("i", (0 for _ in range(MAX_STAGES)))
+
+
+class Stats:
+    """
+    Stats aggregates min/avg/max time and allocation per stage since the last encode().
+    Allocation is measured as the growth of the allocated heap over the span, so spans that
+    await can include allocations of other tasks, and spans during which a garbage collection
+    ran are left out of the allocation numbers.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.heap = gc.mem_alloc() + gc.mem_free()  # the MicroPython heap has a fixed size
+        self.t0 = _zeros()  # begin of the span in progress
+        self.m0 = _zeros()
+        self.cnt = _zeros()
+        self.t_min = _zeros()
+        self.t_max = _zeros()
+        self.t_sum = _zeros()
+        self.a_cnt = _zeros()  # spans without garbage collection
+        self.a_max = _zeros()
+        self.a_sum = _zeros()
+        self.peak = _zeros()  # max heap allocated at end of stage
+        self.reset()
+
+    def stage(self, name):
+        """
+        Register a stage and return its index, which is passed to begin() and end().
+        """
+        if name in self.names:
+            return self.names.index(name)
+        if len(self.names) >= MAX_STAGES:
+            raise ValueError("too many stages")
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def reset(self):
+        for i in range(MAX_STAGES):
+            self.cnt[i] = 0
+            self.t_min[i] = _BIG
+            self.t_max[i] = 0
+            self.t_sum[i] = 0
+            self.a_cnt[i] = 0
+            self.a_max[i] = 0
+            self.a_sum[i] = 0
+            self.peak[i] = 0
+        self.at = time.ticks_ms()
+
+    def begin(self, ix):
+        self.m0[ix] = gc.mem_alloc()
+        self.t0[ix] = time.ticks_us()
+
+    def end(self, ix):
+        dt = time.ticks_diff(time.ticks_us(), self.t0[ix])
+        m = gc.mem_alloc()
+        self.cnt[ix] += 1
+        self.t_sum[ix] += dt
+        if dt < self.t_min[ix]:
+            self.t_min[ix] = dt
+        if dt > self.t_max[ix]:
+            self.t_max[ix] = dt
+        if m > self.peak[ix]:
+            self.peak[ix] = m
+        da = m - self.m0[ix]
+        if da >= 0:
+            self.a_cnt[ix] += 1
+            self.a_sum[ix] += da
+            if da > self.a_max[ix]:
+                self.a_max[ix] = da
+
+    def encode(self):
+        """
+        Return the aggregates as JSON and reset them. Times are in microseconds, allocations
+        in bytes, free is the least free heap seen at the end of a stage.
+        """
+        st = {}
+        for i, name in enumerate(self.names):
+            n = self.cnt[i]
+            if not n:
+                continue
+            a = self.a_cnt[i]
+            st[name] = {
+                "n": n,
+                "t_min": self.t_min[i],
+                "t_avg": self.t_sum[i] // n,
+                "t_max": self.t_max[i],
+                "a_avg": self.a_sum[i] // a if a else None,
+                "a_max": self.a_max[i] if a else None,
+                "free": self.heap - self.peak[i],
+            }
+        msg = {
+            "period": time.ticks_diff(time.ticks_ms(), self.at) // 1000,
+            "mem_free": gc.mem_free(),
+            "stages": st,
+        }
+        self.reset()
+        return json.dumps(msg)
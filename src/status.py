@@ -0,0 +1,129 @@
+import framebuf, seg7
+
+_SET_COL_ADDR = const(0x21)
+_SET_PAGE_ADDR = const(0x22)
+
+
+class StatusDisplay:
+    """
+    StatusDisplay renders the station status on an SSD1306 display incrementally: a screen
+    consists of static labels, one per text line, which are drawn once, and values, which are
+    only re-rendered when they change. Only the pages (8-pixel rows) that changed are sent to the
+    display. Text lines are page-aligned so each one maps to exactly one page.
+    """
+
+    def __init__(self, display, digit_w=18, digit_h=48, thickness=3):
+        """
+        Initialize using an SSD1306 display object. The digit_w, digit_h, and thickness
+        parameters specify the size of the seven-segment digits drawn by big().
+        """
+        self.d = display
+        self.mv = memoryview(display.buffer)
+        self.pages = display.height // 8
+        self.labels = None  # labels of the screen currently drawn, None if unknown
+        self.vals = [None] * self.pages  # value currently drawn on each line
+        self.number = None  # seven-segment number currently drawn
+        self.dirty = 0  # bitmask of pages that need to be sent to the display
+        self.digit_w = digit_w
+        self.digit_h = digit_h
+        self.thickness = thickness
+        self.glyphs = {}  # cache of seven-segment glyphs by character
+
+    def invalidate(self):
+        """
+        Forget what is on the display, for example because something else drew on it. The next
+        update redraws everything.
+        """
+        self.labels = None
+
+    def screen(self, labels):
+        """
+        Switch to a screen with the given tuple of static labels, one per line. Nothing happens
+        if that screen is already shown.
+        """
+        if labels is self.labels:
+            return
+        self.d.fill(0)
+        for i, label in enumerate(labels):
+            self.d.text(label, 0, i * 8)
+        for i in range(self.pages):
+            self.vals[i] = None
+        self.number = None
+        self.labels = labels
+        self.dirty = (1 << self.pages) - 1
+
+    def line(self, i, text):
+        """
+        Show text as value of line i, following the line's label.
+        """
+        if text == self.vals[i]:
+            return
+        x = len(self.labels[i]) * 8 if i < len(self.labels) else 0
+        self.d.fill_rect(x, i * 8, self.d.width - x, 8, 0)
+        self.d.text(text, x, i * 8)
+        self.vals[i] = text
+        self.dirty |= 1 << i
+
+    def big(self, title, number, x=10, y=16):
+        """
+        Show a screen with a title line and a large seven-segment number at x, y, which should
+        be page-aligned.
+        """
+        self.screen(_BIG)
+        self.line(0, title)
+        if number == self.number:
+            return
+        w = self.digit_w + 2 * self.thickness
+        self.d.fill_rect(x, y, self.d.width - x, self.digit_h, 0)
+        for ch in number:
+            if ch != " ":
+                self.d.blit(self._glyph(ch), x, y)
+            x += w
+        self.number = number
+        for p in range(y // 8, min((y + self.digit_h + 7) // 8, self.pages)):
+            self.dirty |= 1 << p
+
+    def _glyph(self, ch):
+        # return a frame buffer with the seven-segment glyph for ch, rendering it on first use
+        g = self.glyphs.get(ch)
+        if g is None:
+            w, h = self.digit_w, self.digit_h
+            g = framebuf.FrameBuffer(bytearray(w * ((h + 7) // 8)), w, h, framebuf.MONO_VLSB)
+            seg7.draw_number(g, ch, 0, 0, w, h, 1, self.thickness)
+            self.glyphs[ch] = g
+        return g
+
+    def flush(self):
+        """
+        Send the pages that changed to the display, coalescing adjacent pages into one transfer.
+        """
+        dirty = self.dirty
+        if dirty == (1 << self.pages) - 1:
+            self.d.show()
+        else:
+            p = 0
+            while dirty >> p:
+                if not dirty & (1 << p):
+                    p += 1
+                    continue
+                q = p
+                while dirty & (1 << (q + 1)):
+                    q += 1
+                self._send(p, q)
+                p = q + 1
+        self.dirty = 0
+
+    def _send(self, p0, p1):
+        # send pages p0 through p1 from the frame buffer to the display
+        d = self.d
+        w = d.width
+        d.write_cmd(_SET_COL_ADDR)
+        d.write_cmd(0)
+        d.write_cmd(w - 1)
+        d.write_cmd(_SET_PAGE_ADDR)
+        d.write_cmd(p0)
+        d.write_cmd(p1)
+        d.write_data(self.mv[p0 * w : (p1 + 1) * w])
+
+
+_BIG = ("",)  # labels of the big number screen: none
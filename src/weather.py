@@ -1,7 +1,9 @@
-import machine, time, aqi, logging, gc
-import uasyncio as asyncio
+import array, machine, time, aqi, logging, gc
 import ujson as json
+import uasyncio as asyncio
 import aswitch, seg7
+from sample import *
+from sched import Scheduler
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -16,16 +18,112 @@ vane = None
 rain = None
 cwop = None
 display = None
+status = None  # incremental renderer for the display
+journal = None  # store-and-forward of samples while the broker is unreachable
+batch = None  # batches samples into binary messages on batch_topic when configured
+batch_topic = None
+stats = None  # per-stage timing and memory instrumentation when config["stats"] is non-zero
+adapt = None  # adaptive interval when config["adaptive"] is set
 
 # PM2.5 sensor averaging
 pm_sum = [0, 0]
 pm_cnt = 0
+pm_at = 0  # ticks_ms when the current averaging period started
+pm_avg_ms = 60000  # averaging period
+
+# Sample record, allocated once and filled in anew each cycle
+sample = Sample()
+
+# Scheduler running the sensor tasks
+sched = None
+
+# Stages instrumented by stats in addition to the sensor tasks
+ST_CYCLE = const(0)  # one iteration of the main loop, excluding the sleep
+ST_PUBLISH = const(1)
+ST_DISPLAY = const(2)
+ST_CWOP = const(3)
+ST_AQI = const(4)
+STAGES = ("cycle", "publish", "display", "cwop", "aqi")
+
+
+# I2C addresses of the devices
+ADDR_OLED = const(0x3C)
+ADDR_BME680 = const(0x77)
+ADDR_SI7021 = const(0x40)
+ADDR_SHT31 = const(0x44)
+
+# Default named wind statistics windows in seconds, config["wind_windows"] replaces them; CWOP
+# reports use "2m" if present
+WIND_WINDOWS = {"2m": 120, "10m": 600, "1h": 3600}
+# Default speed bounds in mph of the wind rose bins, config["rose_bins"] replaces them
+ROSE_BINS = [1, 4, 8, 13, 19, 25, 32]
+rose = None  # wind rose unless config["rose"] is 0
+sampler = None  # aligned wind speed and direction sampler when there's an anemometer and vane
+rain_ckpt = None  # checkpoint log of the rain gauge's state
+
+# Last known hardware: the devices found on each I2C bus and the ones that failed to init, saved
+# by each boot so a warm boot can skip the bus scans and the probes that failed the boot before
+HW_FILE = "/hw.json"
+hw = None  # hardware map of this boot
+hw_prev = None  # hardware map of the previous boot, if it is to be trusted
+boot = None  # boot timing info, published along with the first sample
+boot_topic = None
+
+
+# load the hardware map saved by the previous boot, None if there is none for this board kind
+def load_hw(kind):
+    try:
+        with open(HW_FILE) as f:
+            m = json.load(f)
+        if m.get("kind") == kind:
+            return m
+    except (OSError, ValueError):
+        pass
+    return None
+
 
+def save_hw():
+    try:
+        with open(HW_FILE, "w") as f:
+            json.dump(hw, f)
+    except OSError as e:
+        log.warning("Cannot save hardware map: %s", e)
+
+
+# return the addresses of the devices on an I2C bus, taken from the previous map on a warm boot
+def scan_bus(name, i2c):
+    if hw_prev and name in hw_prev:
+        addrs = hw_prev[name]
+    else:
+        try:
+            addrs = i2c.scan()
+        except OSError:
+            addrs = []
+    hw[name] = addrs
+    return addrs
 
-# load sensor modules and initialize sensors
+
+# return whether a device should be probed, i.e. it didn't fail on the previous warm boot; a
+# skipped device isn't recorded as failed, so the boot after probes it again
+def should_probe(name):
+    if hw_prev and name in hw_prev["failed"]:
+        hw["skipped"].append(name)
+        log.info("Skipping %s, failed on previous boot", name)
+        return False
+    return True
+
+
+def probe_failed(name, e):
+    hw["failed"].append(name)
+    log.warning("%s failed to init: %s", name, e)
+
+
+# load sensor modules and initialize sensors, only the drivers of devices found on the I2C buses
+# are imported; after a power-on reset the buses are scanned, after other resets the hardware
+# map saved by the previous boot is used instead
 def init_sensors(kind):
     global bme680, si7021, sht31, pmsx003, anemo, vane, rain
-    global cwop, display
+    global cwop, display, status, hw, hw_prev
 
     # ===== pin configuration, see also Projects/kicad/esp32-weather/README.md
     if kind == "lolin-d32":
@@ -40,23 +138,32 @@ def init_sensors(kind):
     else:
         raise ("Unknown board kind: " + kind)
 
+    saved = load_hw(kind)
+    hw_prev = saved if machine.reset_cause() != machine.PWRON_RESET else None
+    hw = {"kind": kind, "failed": [], "skipped": []}
+
     # ===== init devices
 
     # show splash screen on display
-    from ssd1306 import SSD1306_I2C
-
-    try:
-        scl1_pin = machine.Pin(scl1)
-        sda1_pin = machine.Pin(sda1, pull=machine.Pin.PULL_UP)  # pup: helps presence detection
-        display = SSD1306_I2C(128, 64, machine.I2C(scl=scl1_pin, sda=sda1_pin, freq=1000000))
-        display.fill(1)
-        display.fill_rect(10, 10, 108, 44, 0)
-        display.text("WCC Weather", 20, 20, 1)
-        display.show()
-        log.info("Found display")
-    except Exception as e:
-        display = None
-        log.warning("No display: %s", e)
+    scl1_pin = machine.Pin(scl1)
+    sda1_pin = machine.Pin(sda1, pull=machine.Pin.PULL_UP)  # pup: helps presence detection
+    i2c1_dev = machine.I2C(scl=scl1_pin, sda=sda1_pin, freq=1000000)
+    if ADDR_OLED in scan_bus("i2c1", i2c1_dev) and should_probe("display"):
+        from ssd1306 import SSD1306_I2C
+        from status import StatusDisplay
+
+        try:
+            display = SSD1306_I2C(128, 64, i2c1_dev, ADDR_OLED)
+            display.fill(1)
+            display.fill_rect(10, 10, 108, 44, 0)
+            display.text("WCC Weather", 20, 20, 1)
+            display.show()
+            status = StatusDisplay(display)
+            log.info("Found display")
+        except Exception as e:
+            display = None
+            status = None
+            probe_failed("display", e)
 
     # start power for anemo, vane, etc.
     pow_3v3_pin = machine.Pin(pow_3v3, machine.Pin.OUT)
@@ -66,50 +173,55 @@ def init_sensors(kind):
     scl0_pin = machine.Pin(scl0)
     sda0_pin = machine.Pin(sda0)
     i2c0_dev = machine.I2C(scl=scl0_pin, sda=sda0_pin, freq=100000)
+    found = scan_bus("i2c0", i2c0_dev)
 
-    # BME680 temperature/humidity/pressure/voc
-    from bme680 import BME680
+    # BME680 temperature/humidity/pressure/voc, its first conversion is left to the sensor task
+    if ADDR_BME680 in found and should_probe("bme680"):
+        from bme680 import BME680
 
-    try:
-        bme680 = BME680(i2c0_dev)
-        bme680.set_gas_heater_temperature(320)
-        bme680.set_gas_heater_duration(100)
-        log.info("Found BME680")
-    except Exception as e:
-        bme680 = None
-        log.warning("No BME680 found: %s", e)
+        try:
+            bme680 = BME680(i2c0_dev, ADDR_BME680, convert=False)
+            bme680.set_gas_heater_temperature(320)
+            bme680.set_gas_heater_duration(100)
+            log.info("Found BME680")
+        except Exception as e:
+            bme680 = None
+            probe_failed("bme680", e)
 
     # SI7021 temperature/humidity
-    from si7021 import Si7021
+    if ADDR_SI7021 in found and should_probe("si7021"):
+        from si7021 import Si7021
 
-    try:
-        si7021 = Si7021(i2c0_dev)
-        si7021.convert()
-        log.info("Found Si7021")
-    except Exception as e:
-        si7021 = None
-        log.warning("No Si7021 found: %s", e)
+        try:
+            si7021 = Si7021(i2c0_dev, ADDR_SI7021)
+            si7021.convert()
+            log.info("Found Si7021")
+        except Exception as e:
+            si7021 = None
+            probe_failed("si7021", e)
 
     # SHT31 temperature/humidity
-    from sht31 import SHT31
+    if ADDR_SHT31 in found and should_probe("sht31"):
+        from sht31 import SHT31
 
-    try:
-        sht31 = SHT31(i2c0_dev)
-        sht31.convert()
-        log.info("Found SHT31")
-    except Exception as e:
-        sht31 = None
-        log.warning("No SHT31 found: %s", e)
+        try:
+            sht31 = SHT31(i2c0_dev, ADDR_SHT31)
+            sht31.convert()
+            log.info("Found SHT31")
+        except Exception as e:
+            sht31 = None
+            probe_failed("sht31", e)
 
     # PMSx003 PM sensor
-    from pms_x003 import PMSx003
+    if should_probe("pmsx003"):
+        from pms_x003 import PMSx003
 
-    try:
-        pmsx003 = PMSx003(tx=pm_tx, rx=pm_rx)
-        log.info("Found PMSx003")
-    except Exception as e:
-        pmsx003 = None
-        log.warning("No PMSx003 found: %s", e)
+        try:
+            pmsx003 = PMSx003(tx=pm_tx, rx=pm_rx)
+            log.info("Found PMSx003")
+        except Exception as e:
+            pmsx003 = None
+            probe_failed("pmsx003", e)
 
     # Anemometer and wind vane
     from wind import Anemo, Vane
@@ -117,32 +229,43 @@ def init_sensors(kind):
 
     try:
         # configure pin with pull-up
-        machine.Pin(anemo_pin, mode=machine.Pin.IN)
+        pin = machine.Pin(anemo_pin, mode=machine.Pin.IN)
         anemo_ctr = Counter(0, anemo_pin)
         anemo_ctr.filter(10)  # 10us filter
-        anemo = Anemo(anemo_ctr, 2.5)  # 2.5 mph per Hz
-        anemo.start()
+        anemo = Anemo(anemo_ctr, 2.5, pin=pin)  # 2.5 mph per Hz
     except Exception as e:
         anemo = None
         log.exc(e, "Anemometer failed to init")
     try:
         vane = Vane(vane_pin, 140, 1600, 15)
-        vane.start()
     except Exception as e:
         vane = None
         log.exc(e, "Wind vane failed to init")
 
     # init rain gauge
-    pass
+    from rain import Rain
+
+    try:
+        pin = machine.Pin(rain_pin, mode=machine.Pin.IN)
+        rain_ctr = Counter(1, rain_pin)
+        rain_ctr.filter(10)  # 10us filter
+        rain = Rain(rain_ctr, pin=pin)  # 0.01in per tip
+    except Exception as e:
+        rain = None
+        log.exc(e, "Rain gauge failed to init")
 
     # init CWOP
     try:
-        from cwop import send_wx
+        from cwop import collect
 
-        cwop = send_wx
+        cwop = collect
     except ImportError:
         log.warning("Cannot import CWOP, skipping")
 
+    # remember the hardware for the next warm boot, writing the flash only if something changed
+    if hw != saved:
+        save_hw()
+
 
 # ===== read queryable sensors
 
@@ -150,6 +273,25 @@ mode = 0  # values 0 .. mode_max+1
 mode_led = None
 mode_max = const(3)  # largest "debug" value, mode_max+1 is used to switch back to 0
 mode_period = (0, 500, 4000, 4000, 500)  # milliseconds sleep per mode
+status_labels = ("BME ", "    ", "SHT ", "Si  ", "PM  ", "Wnd ", "Free ")  # normal mode screen
+# raw values shown on each line of the normal mode screen, two per line, so a line is only
+# formatted when what it shows changed
+_ABSENT = const(-0x7FFFFFFF)
+line_vals = array.array("i", (_ABSENT for _ in range(2 * len(status_labels))))
+
+
+# return the raw fixed-point value of a sample field, comparing these allocates nothing
+def raw(ix):
+    return sample.v[ix] if sample.has(ix) else _ABSENT
+
+
+# return whether the values a and b shown on line i changed since the line was last formatted
+def line_changed(i, a, b=_ABSENT):
+    if line_vals[2 * i] == a and line_vals[2 * i + 1] == b:
+        return False
+    line_vals[2 * i] = a
+    line_vals[2 * i + 1] = b
+    return True
 
 
 async def mode_blink(ms=100):
@@ -178,145 +320,427 @@ async def next_mode(pin):
         display.fill(1)
         seg7.draw_number(display, str(mode % (mode_max + 1)), 50, 10, 24, 48, 0, 3)
         display.show()
+        status.invalidate()
     #
     log.info("MODE = %d", mode)
 
 
+# ===== sensor tasks, each one runs with its own period and fills in its cache
+
+
+# convert a reading to an AQI using fn, instrumented as a stage
+def to_aqi(fn, val):
+    if not stats:
+        return fn(val)
+    stats.begin(ST_AQI)
+    r = fn(val)
+    stats.end(ST_AQI)
+    return r
+
+
+async def read_bme680(c):
+    await asyncio.sleep_ms(bme680.convert())
+    while not bme680.ready():
+        await asyncio.sleep_ms(10)
+    (t, h, p, gas) = bme680.read_data()
+    # the heater resistance for the target temperature depends on the ambient temperature, which
+    # was assumed to be 25C at init and drifts over the day
+    bme680.set_gas_heater_temperature(bme680.gas_settings.heatr_temp)
+    tF = t * 1.8 + 32
+    log.info("BME680 : T=%.1f°F H=%.0f%% P=%.3fmBar G=%.3fkΩ", tF, h, p, gas / 1000)
+    c.set(T_BME680, t)
+    c.set(H_BME680, h)
+    c.set(P_BME680, p / 1000)
+    c.set(G_BME680, gas)
+    c.set(AQI_TVOC, to_aqi(aqi.tvoc_bme680, gas))
+
+
+async def read_si7021(c):
+    await asyncio.sleep_ms(si7021.convert() + 2)
+    (t, h) = si7021.read_temp_humi()
+    log.info("Si7021 : T=%.1f°F H=%.0f%%", t * 1.8 + 32, h)
+    c.set(T_SI7021, t)
+    c.set(H_SI7021, h)
+
+
+async def read_sht31(c):
+    await asyncio.sleep_ms(sht31.convert() + 2)
+    (t, h) = sht31.read_temp_humi()
+    log.info("SHT31  : T=%.1f°F H=%.0f%%", t * 1.8 + 32, h)
+    c.set(T_SHT31, t)
+    c.set(H_SHT31, h)
+
+
+def read_wind(c):
+    c.set(TI, anemo.turbulence())  # before read(), which resets it
+    (w, g) = anemo.read()
+    logstr = "Wind   : %.0fmph gust:%.0fmph"
+    logvars = [w, g]
+    c.set(WIND, w * 0.44704)  # in m/s
+    c.set(GUST, g * 0.44704)
+    if sampler:
+        c.set(GDIR, sampler.read_gust_dir())
+    # vector average direction over the interval, weighted by speed, and its variability
+    if vane:
+        c.set(WDIR_SD, vane.sigma_theta())
+    d = vane.read_vector()[0] if vane else None
+    if d is not None:  # None until the vane has been polled
+        logstr += " dir=%0f°"
+        logvars.append(d)
+        c.set(WDIR, d)
+    log.info(logstr, *logvars)
+
+
+# read the PMSx003, which sends data when it pleases, and average it over pm_avg_ms
+def read_pmsx003(c):
+    global pm_cnt, pm_at
+    pm2_5 = pmsx003.read()
+    while pm2_5 is not None:
+        for i, v in enumerate(pm2_5):
+            pm_sum[i] += v
+        pm_cnt += 1
+        log.debug("PMSx003: D=%dµg/m³ X=%d", pm2_5[0], pm2_5[1])
+        pm2_5 = pmsx003.read()
+    now = time.ticks_ms()
+    if time.ticks_diff(now, pm_at) < pm_avg_ms:
+        return
+    if pm_cnt > 0:
+        pm25 = pm_sum[0] / pm_cnt
+        c.set(PM25, pm25)
+        c.set(AQI_PM25, to_aqi(aqi.pm25, pm25))
+        log.info("PMSx003: D=%.1fµg/m³ X=%.1f", pm25, pm_sum[1] / pm_cnt)
+    elif c.has(PM25):
+        # the sensor stopped sending, drop its last average rather than publish it forever
+        log.warning("PMSx003: no data")
+        c.set(PM25, None)
+        c.set(AQI_PM25, None)
+    pm_sum[0] = pm_sum[1] = 0
+    pm_cnt = 0
+    pm_at = now
+
+
+# read the rain gauge and checkpoint its state when it changed, so a reset doesn't lose the
+# event and day totals
+def read_rain(c):
+    rate, event, today = rain.read()
+    if rate is None:
+        return  # first reading
+    c.set(RAIN_RATE, rate)
+    c.set(RAIN_EVENT, event)
+    c.set(RAIN_DAY, today)
+    h1, h24 = rain.totals()
+    c.set(RAIN_1H, h1)
+    c.set(RAIN_24H, h24)
+    log.info("Rain   : %.2fin/h event:%.2fin today:%.2fin 24h:%.2fin", rate, event, today, h24)
+    if rain.dirty and rain_ckpt:
+        rain_ckpt.save(rain.state())
+        rain.dirty = False
+
+
+# register the sensors that were found with the scheduler, config["periods"] can set the
+# period in milliseconds of each task by name, the default being the publishing interval
+def init_tasks(config):
+    global sched, pm_avg_ms, pm_at, rose, sampler, rain_ckpt
+    interval_ms = config["interval"] * 1000
+    periods = config.get("periods", {})
+    # without overlap the I2C sensor conversions are serialized using a lock
+    lock = None if config.get("overlap", True) else asyncio.Lock()
+    sched = Scheduler()
+    sched.stats = stats
+    if bme680:
+        sched.add("bme680", periods.get("bme680", interval_ms), read_bme680, lock)
+    if si7021:
+        sched.add("si7021", periods.get("si7021", interval_ms), read_si7021, lock)
+    if sht31:
+        sched.add("sht31", periods.get("sht31", interval_ms), read_sht31, lock)
+    if pmsx003:
+        pm_avg_ms = interval_ms
+        pm_at = time.ticks_ms()
+        sched.add("pmsx003", periods.get("pmsx003", 500), read_pmsx003)
+    if anemo:
+        # config["wind_slot"] is the ms between wind samples, the gust being over 3 seconds
+        if "wind_slot" in config:
+            anemo.gust_window(3000, config["wind_slot"])
+        # config["anemo_cal"] = {"table": [[Hz, mph], ...], "offset": mph} replaces the 2.5mph/Hz
+        if "anemo_cal" in config:
+            cal = config["anemo_cal"]
+            anemo.calibrate(cal["table"], cal.get("offset", 0))
+        # below config["anemo_crossover"] Hz the speed comes from the periods between pulses
+        if config.get("anemo_crossover", 0):
+            anemo.period_mode(config["anemo_crossover"])
+        for name, secs in config.get("wind_windows", WIND_WINDOWS).items():
+            anemo.window(name, secs)
+        sched.add("wind", periods.get("wind", interval_ms), read_wind, stretch=True)
+    if anemo and vane:
+        # a single task samples speed and direction together every slot
+        from wind import Sampler
+
+        if config.get("rose", 3600):
+            from wind import Rose
+
+            rose = Rose(config.get("rose_bins", ROSE_BINS))
+        sampler = Sampler(anemo, vane, rose)
+        sched.add("sampler", anemo.slot_ms, lambda c: sampler.poll())
+    elif anemo:
+        sched.add("anemo", anemo.slot_ms, lambda c: anemo.poll())
+    elif vane:
+        vane.poll_ms = periods.get("vane", 1000)
+        sched.add("vane", vane.poll_ms, lambda c: vane.poll())
+    if rain:
+        # config["rain_debounce"] ms enables timing each tip for a rain rate that follows intense
+        # cells, config["rain_tip_ms"] is how long a tip takes, to correct for the rain it misses
+        if config.get("rain_debounce", 0):
+            rain.tip_mode(config["rain_debounce"], config.get("rain_tip_ms", 0))
+        # config["rain_log"] is the path of the checkpoint log, empty to not keep one
+        path = config.get("rain_log", "/rain")
+        if path:
+            from checkpoint import Checkpoint
+            from rain import STATE_FMT
+
+            rain_ckpt = Checkpoint(path, STATE_FMT)
+            st = rain_ckpt.restore()
+            if st:
+                rain.restore(st)
+        sched.add("rain", periods.get("rain", interval_ms), read_rain)
+    sched.start()
+
+
+# ===== publishing
+
+
+async def publish(client, topic):
+    # publish the sample, or store it in the journal if the broker can't be reached
+    if journal and not client.isconnected():
+        journal.store(sample)
+        return
+    if batch:
+        await publish_batch(client)
+        return
+    n = sample.encode()
+    log.debug("pub: %d bytes", n)  # not the payload, which would be copied on every publish
+    try:
+        # the payload is a view of the reusable encoding buffer rather than a copy, the publish
+        # waits for the PUBACK so a QoS 1 retransmission can't send a later sample's encoding
+        await client.publish(topic, memoryview(sample.buf)[:n], qos=1, sync=True)
+    except OSError as e:
+        if not journal:
+            raise
+        log.warning("Publish failed, journaling: %s", e)
+        journal.store(sample)
+
+
+# publish the stats every period_ms
+async def publish_stats(client, topic, period_ms):
+    while True:
+        await asyncio.sleep_ms(period_ms)
+        msg = stats.encode()
+        if not client.isconnected():
+            continue
+        try:
+            await client.publish(topic, msg, qos=0, sync=False)
+        except OSError as e:
+            log.warning("Stats publish failed: %s", e)
+
+
+# publish the wind statistics over the named windows every period_ms, speeds in m/s
+async def publish_wind(client, topic, period_ms):
+    while True:
+        await asyncio.sleep_ms(period_ms)
+        if not client.isconnected():
+            continue
+        msg = {}
+        for name in anemo.windows:
+            w, g, n = anemo.read_window(name)
+            msg[name] = {"wind": round(w * 0.44704, 2), "gust": round(g * 0.44704, 2), "n": n}
+        try:
+            await client.publish(topic, json.dumps(msg), qos=0, sync=False)
+        except OSError as e:
+            log.warning("Wind publish failed: %s", e)
+
+
+# publish the wind rose and reset it every period seconds, aligned to the clock so hourly and
+# daily roses cover whole hours and days
+async def publish_rose(client, topic, period):
+    while True:
+        await asyncio.sleep(period - time.time() % period)
+        msg = rose.encode()
+        if not client.isconnected():
+            continue
+        try:
+            await client.publish(topic, msg, qos=1, sync=False)
+        except OSError as e:
+            log.warning("Wind rose publish failed: %s", e)
+
+
+# publish the boot timing info: ticks_ms counts from the reset, so first_pub_ms is the time from
+# reset to the first sample published
+async def publish_boot(client):
+    global boot
+    boot["first_pub_ms"] = time.ticks_ms()
+    log.info("Boot: init %dms, first publish after %dms", boot["init_ms"], boot["first_pub_ms"])
+    msg = json.dumps(boot)
+    boot = None
+    if client.isconnected():
+        try:
+            await client.publish(boot_topic, msg, qos=1, sync=False)
+        except OSError as e:
+            log.warning("Boot info publish failed: %s", e)
+
+
+async def publish_batch(client):
+    # add the sample to the batch and publish the batch once it's full
+    if not batch.add(sample):
+        return
+    msg = batch.payload()
+    log.debug("pub: batch of %d bytes", len(msg))
+    try:
+        await client.publish(batch_topic, msg, qos=1, sync=False)
+    except OSError as e:
+        if not journal:
+            raise
+        log.warning("Publish failed, journaling: %s", e)
+        from batch import HDR_SIZE
+
+        for off in range(HDR_SIZE, len(msg), REC_SIZE):
+            journal.store_packed(msg, off)
+
+
+# ===== main sensor loop
+
+
 async def query_sensors(client, topic, interval):
-    global bme680, si7021, sht31, pmsx003, anemo, vane, rain
-    global cwop, display
-    global pm_cnt, pm_sum
+    global cwop, display, status
     global mode
+    await sched.settle()
     t0 = time.ticks_ms()
+    iv = interval
+    fast_ms = 0  # cap on the sensor periods so they keep up with a shortened interval
     while True:
-        data = {}
-        gas, pm25 = None, None
-        # convert the bme680
-        if bme680:
-            await asyncio.sleep_ms(bme680.convert())
-            while not bme680.ready():
-                await asyncio.sleep_ms(10)
-            (t, h, p, gas) = bme680.read_data()
-            tF = t * 1.8 + 32
-            log.info("BME680 : T=%.1f°F H=%.0f%% P=%.3fmBar G=%.3fkΩ", tF, h, p, gas / 1000)
-            (data["t_bme680"], data["h_bme680"]) = (t, h)
-            (data["p_bme680"], data["g_bme680"]) = (p / 1000, gas)
-        # read the si7021
-        if si7021:
-            await asyncio.sleep_ms(si7021.convert() + 2)
-            (t, h) = si7021.read_temp_humi()
-            log.info("Si7021 : T=%.1f°F H=%.0f%%", t * 1.8 + 32, h)
-            (data["t_si7021"], data["h_si7021"]) = (t, h)
-        # read sht31
-        if sht31:
-            await asyncio.sleep_ms(sht31.convert() + 2)
-            (t, h) = sht31.read_temp_humi()
-            log.info("SHT31  : T=%.1f°F H=%.0f%%", t * 1.8 + 32, h)
-            (data["t_sht31"], data["h_sht31"]) = (t, h)
-        # read wind
-        if anemo:
-            (w, g) = anemo.read()
-            logstr = "Wind   : %.0fmph gust:%.0fmph"
-            logvars = [w, g]
-            (data["wind"], data["gust"]) = (w*0.44704, g*0.44704) # in m/s
-            if vane:
-                d = vane.read()
-                logstr += " dir=%0f°"
-                logvars.append(d)
-                data["wdir"] = d
-            log.info(logstr, *logvars)
-        # read rain gauge
-        # TODO!
-
-        # insert averaged dust data
-        if pm_cnt > 0:
-            d = [v / pm_cnt for v in pm_sum]
-            pm25 = d[0]
-            data["pm25"] = pm25
-            log.info("PMSx003: D=%.1fµg/m³ X=%.1f", d[0], d[1])
-            pm_sum = [0 for _ in pm_sum]
-            pm_cnt = 0
-
-        # AQI conversions
-        if gas is not None:
-            data["aqi_tvoc"] = aqi.tvoc_bme680(gas)
-        if pm25 is not None:
-            data["aqi_pm25"] = aqi.pm25(pm25)
-
-        if display:
-            display.fill(0)
+        if stats:
+            stats.begin(ST_CYCLE)
+        # collect the latest value of each sensor, in the test modes the sensors are sampled at
+        # the rapid display update rate
+        sched.fast_ms = mode_period[mode] if mode else fast_ms
+        sample.clear()
+        sample.ts = time.time()
+        sched.collect(sample)
+
+        # publish data
+        if mode == 0 and sample.mask:
+            if stats:
+                stats.begin(ST_PUBLISH)
+            await publish(client, topic)
+            if stats:
+                stats.end(ST_PUBLISH)
+            if boot:
+                await publish_boot(client)
+
+        if status:
+            if stats:
+                stats.begin(ST_DISPLAY)
             if mode == 1:
                 # Test mode for wind vane
-                wdir = data.get("wdir", -1)
-                display.text("Wind dir: %d" % wdir, 0, 0)
-                wdir_str = "%3do" % wdir
-                seg7.draw_number(display, wdir_str, 10, 14, 18, 48, 1, 3)
+                wdir = sample.get(WDIR, -1)
+                status.big("Wind dir: %d" % wdir, "%3do" % wdir)
 
             elif mode == 2:
                 # Test mode for wind speed
-                wspd = data.get("wind", -1) * 2.237
-                display.text("Wind: %.1f mph" % wspd, 0, 0)
-                wspd_str = "%4.1f" % (wspd/2.5)
-                seg7.draw_number(display, wspd_str, 10, 14, 18, 48, 1, 3)
+                wspd = sample.get(WIND, -1) * 2.237
+                status.big("Wind: %.1f mph" % wspd, "%4.1f" % (wspd / 2.5))
 
             # else mode == 3: # regular function is rapid update test mode, "falls thru" into else
             # else mode == 4: # regular function 1 quick update then switch to mode 0, "falls thru"
 
             else:
-                # Regular operating mode, display lots of data and send it too
-
-                # publish data
-                if mode == 0 and any(d is not None for d in data):
-                    log.debug("pub: %s", data)
-                    await client.publish(topic, json.dumps(data), qos=1, sync=False)
-
-                # display data
-                display.text(
-                    "BME {:.1f}F {:.0f}%".format(data["t_bme680"] * 1.8 + 32, data["h_bme680"]),
-                    0,
-                    0,
-                )
-                display.text(
-                    "    {:.0f}mB {:.0f}kO".format(
-                        data["p_bme680"] * 1000, data["g_bme680"] / 1000
-                    ),
-                    0,
-                    9,
-                )
-                display.text(
-                    "SHT {:.1f}F {:.0f}%".format(data["t_sht31"] * 1.8 + 32, data["h_sht31"]),
-                    0,
-                    18,
-                )
-                display.text(
-                    "Si  {:.1f}F {:.0f}%".format(data["t_si7021"] * 1.8 + 32, data["h_si7021"]),
-                    0,
-                    27,
-                )
-                display.text("PM  {:.1f} Rn {:.2f}".format(data.get("pm25", -1), 0), 0, 36)
-                display.text(
-                    "Wnd {:.0f} {:3d}*".format(data.get("wind", -1), data.get("wdir", -1)), 0, 45
-                )
-                display.text("Free {:d} {:d}".format(gc.mem_free(), gc.mem_maxfree()), 0, 54)
-
+                # Regular operating mode, display lots of data
+                if status.labels is not status_labels:
+                    for i in range(len(line_vals)):
+                        line_vals[i] = _ABSENT  # the screen gets redrawn from scratch
+                status.screen(status_labels)
+                if line_changed(0, raw(T_BME680), raw(H_BME680)):
+                    status.line(
+                        0,
+                        "{:.1f}F {:.0f}%".format(
+                            sample.get(T_BME680, -1) * 1.8 + 32, sample.get(H_BME680, -1)
+                        ),
+                    )
+                if line_changed(1, raw(P_BME680), raw(G_BME680)):
+                    status.line(
+                        1,
+                        "{:.0f}mB {:.0f}kO".format(
+                            sample.get(P_BME680, -1) * 1000, sample.get(G_BME680, -1) / 1000
+                        ),
+                    )
+                if line_changed(2, raw(T_SHT31), raw(H_SHT31)):
+                    status.line(
+                        2,
+                        "{:.1f}F {:.0f}%".format(
+                            sample.get(T_SHT31, -1) * 1.8 + 32, sample.get(H_SHT31, -1)
+                        ),
+                    )
+                if line_changed(3, raw(T_SI7021), raw(H_SI7021)):
+                    status.line(
+                        3,
+                        "{:.1f}F {:.0f}%".format(
+                            sample.get(T_SI7021, -1) * 1.8 + 32, sample.get(H_SI7021, -1)
+                        ),
+                    )
+                if line_changed(4, raw(PM25)):
+                    status.line(4, "{:.1f} Rn {:.2f}".format(sample.get(PM25, -1), 0))
+                if line_changed(5, raw(WIND), raw(WDIR)):
+                    status.line(
+                        5, "{:.0f} {:3d}*".format(sample.get(WIND, -1), sample.get(WDIR, -1))
+                    )
+                free, maxfree = gc.mem_free(), gc.mem_maxfree()
+                if line_changed(6, free, maxfree):
+                    status.line(6, "{:d} {:d}".format(free, maxfree))
+
+            status.flush()
+            if stats:
+                stats.end(ST_DISPLAY)
             if mode_led:
                 await mode_blink()
-            display.show()
 
         if mode == 0 and cwop:
-            asyncio.get_event_loop().create_task(
-                cwop(
-                    temp=data.get("t_bme680", None),
-                    hum=data.get("h_bme680", None),
-                    baro=data.get("p_bme680", None),
-                    winddir=data.get("wdir", None),
-                    windspeed=data.get("wind", None),
-                    windgust=data.get("gust", None),
-                )
+            # the CWOP module aggregates the samples into a report every few minutes, it wants
+            # the 2 minute average wind and the gusts, both in mph
+            if stats:
+                stats.begin(ST_CWOP)
+            g = sample.get(GUST)
+            g = g and g / 0.44704
+            if anemo and "2m" in anemo.windows:
+                w = anemo.read_window("2m")[0]
+            else:
+                w = sample.get(WIND)
+                w = w and w / 0.44704
+            r1, r24 = sample.get(RAIN_1H), sample.get(RAIN_24H)
+            cwop(
+                temp=sample.get(T_BME680),
+                hum=sample.get(H_BME680),
+                baro=sample.get(P_BME680),
+                winddir=sample.get(WDIR),
+                windspeed=w,
+                windgust=g,
+                rainrate=r1 and round(r1 * 100),  # in 0.01in
+                rainevent=r24 and round(r24 * 100),
             )
+            if stats:
+                stats.end(ST_CWOP)
+
+        if stats:
+            stats.end(ST_CYCLE)
+
+        # pick the interval, with adaptive sampling it depends on how volatile the weather is
+        if adapt and mode == 0:
+            new_iv = adapt.update(sample, rain.ctr.value() if rain else None)
+            if new_iv != iv:
+                log.info("Interval %ds", new_iv // 1000)
+            iv = new_iv
+            fast_ms = iv if iv < interval else 0
+            # the wind is read once per interval, so the gusts of a longer one are all published
+            sched.slow_ms = iv if iv > interval else 0
 
         # sleep
-        iv = interval
         while True:
             t1 = time.ticks_ms()
             dt = time.ticks_diff(t1, t0)
@@ -331,36 +755,65 @@ async def query_sensors(client, topic, interval):
             mode = 0
 
 
-# ===== read uart sensors that send data when they please
-
-
-async def poll_uarts(client):
-    global pm_sum, pm_cnt
-    while True:
-        # read the PMSA003
-        if pmsx003:
-            pm2_5 = pmsx003.read()
-            while pm2_5 is not None:
-                for i, v in enumerate(pm2_5):
-                    pm_sum[i] += v
-                pm_cnt += 1
-                log.debug("PMSx003: D=%dµg/m³ X=%d", pm2_5[0], pm2_5[1])
-                pm2_5 = pmsx003.read()
-        # sleep
-        # global wdt_poll_uarts
-        # wdt_poll_uarts = time.ticks_ms()
-        await asyncio.sleep_ms(500)
-
-
 # ===== main task
 
 
 def start(mqtt, config):
+    global stats, boot, boot_topic, adapt
+    t0 = time.ticks_ms()
     init_sensors(config["kind"])
+    boot_topic = config["prefix"] + "/boot"
+    boot = {
+        "reset": machine.reset_cause(),
+        "warm": hw_prev is not None,
+        "init_ms": time.ticks_diff(time.ticks_ms(), t0),
+        "hw": hw,
+    }
+    stats_s = config.get("stats", 600)  # stats period in seconds, 0 to turn them off
+    if stats_s:
+        from stats import Stats
+
+        stats = Stats()
+        for name in STAGES:
+            stats.stage(name)
+    init_tasks(config)
+    # adaptive interval: seconds min and max, thresholds gust (m/s), rain (tips per interval),
+    # and pressure (hPa/h), see adaptive.Adaptive
+    if "adaptive" in config:
+        from adaptive import Adaptive
+
+        a = config["adaptive"]
+        adapt = Adaptive(
+            a.get("min", 15) * 1000,
+            a.get("max", 300) * 1000,
+            a.get("gust", 8.0),
+            a.get("rain", 1),
+            a.get("pressure", 1.0),
+        )
     loop = asyncio.get_event_loop()
     interval_ms = config["interval"] * 1000
+    if config.get("batch", 0) > 0:
+        from batch import Batch
+
+        global batch, batch_topic
+        batch = Batch(config["batch"])
+        batch_topic = config["prefix"] + "/batch"
+    if config.get("journal", True):
+        from journal import Journal
+
+        global journal
+        journal = Journal(binary=batch is not None)
+        topic = batch_topic if batch else config["prefix"] + "/backlog"
+        loop.create_task(journal.replay(mqtt.client, topic))
     loop.create_task(query_sensors(mqtt.client, config["prefix"] + "/sensors", interval_ms))
-    loop.create_task(poll_uarts(mqtt.client))
+    wind_s = config.get("wind_period", 600)  # wind windows period in seconds, 0 to turn off
+    if anemo and anemo.windows and wind_s:
+        loop.create_task(publish_wind(mqtt.client, config["prefix"] + "/wind", wind_s * 1000))
+    if rose:
+        rose_s = config.get("rose", 3600)  # wind rose period in seconds, e.g. 3600 or 86400
+        loop.create_task(publish_rose(mqtt.client, config["prefix"] + "/rose", rose_s))
+    if stats:
+        loop.create_task(publish_stats(mqtt.client, config["prefix"] + "/stats", stats_s * 1000))
     if "mode_pin" in config:
         mode_pin = machine.Pin(config["mode_pin"], machine.Pin.IN)
         mode_sw = aswitch.Switch(mode_pin)
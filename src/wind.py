@@ -1,10 +1,17 @@
-import machine, time, logging
+import array, machine, math, time, logging
+import ujson as json
 import uasyncio as asyncio
 from esp32_adccal import ADCCal
+from pulses import PulseTimes
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
+# sine of each whole degree, the cosine being _SIN[(d + 90) % 360], so the pollers don't need
+# to call math.sin
+_SIN = array.array("f", (math.sin(math.radians(d)) for d in range(360)))
+_SEC_MAX = const(600)  # longest window kept per second, longer ones are kept per minute
+
 
 class Anemo:
     """
@@ -12,59 +19,345 @@ class Anemo:
     anemometer attached to a pulse counter input pin on an ESP32.
     """
 
-    def __init__(self, counter, fct):
+    def __init__(self, counter, fct, gust_ms=3000, slot_ms=250, pin=None):
         """
         Initialize the anemometer using the provided counter object, which must be init'ed for the
         appropriate pin. The fct converts the frequency in Hertz (pulses per second) to mph and is
         typically a value around 2.5 to 3.5.
         (Note that fct can be specified for pulses per km/h or per m/s instead and read_wind will
         return the values for that measurement unit.)
+        The gust is the max average speed over a gust_ms window that slides by slot_ms.
+        The optional pin is the counter's input pin, which is needed for period_mode().
         """
         if counter is None or counter.value is None:
             raise ValueError("Counter object needed as argument!")
         self.ctr = counter
+        self.pin = pin
         self.ws_at = None  # when wind speed was last measured
         self.ws_count = 0  # count at least measurement
         self.fct = fct * 1000  # convert from pulses per millisecond to mph
+        self.lut = None  # calibration curve sampled every 1/c_scale Hz, see calibrate()
+        self.c_scale = 0
+        self.c_off = 0
+        # gust measurement state
+        self.g_at = time.ticks_ms()
+        self.g_count = counter.value()
+        self.gust_window(gust_ms, slot_ms)
+        # per-second and per-minute history for the named windows, see window()
+        self.windows = {}  # name -> [seconds, sum of counts over the window]
+        self.h_cnt = None  # ring of pulses per second
+        self.h_gust = None  # ring of max gust per second in 0.01Hz
+        self.h_ix = 0  # next second to overwrite
+        self.h_fill = 0  # seconds of history, up to the length of the ring
+        self.sec_cnt = 0  # pulses in the current second
+        self.sec_ms = 0  # elapsed ms of the current second
+        self.sec_gust = 0  # max gust in the current second, in pulses per ms
+        self.m_cnt = None  # ring of pulses per minute, for the windows longer than _SEC_MAX
+        self.m_gust = None  # ring of max gust per minute in 0.01Hz
+        self.m_ix = 0  # next minute to overwrite
+        self.m_fill = 0  # minutes of history, up to the length of the ring
+        self.min_cnt = 0  # pulses in the current minute
+        self.min_secs = 0  # elapsed seconds of the current minute
+        self.min_gust = 0  # max gust in the current minute, in pulses per ms
+        # turbulence: streaming mean and sum of squared deviations of the pulses per second
+        self.t_n = 0
+        self.t_mean = 0.0
+        self.t_m2 = 0.0
+        self.pulses = None  # PulseTimes in ticks_us of the most recent pulses, see period_mode()
+        self.p_cross = 0  # crossover in pulses per ms
+
+    def period_mode(self, crossover_hz=4, size=32, debounce_us=5000):
+        """
+        Enable measuring the speed from the periods between pulses when the pulse rate is below
+        crossover_hz, which gives a much finer resolution at light winds than counting the few
+        pulses in a gust window. A pin interrupt records the time of each pulse in a ring of
+        size entries (a power of 2), which must exceed the pulses in a gust window at the
+        crossover, ignoring reed switch bounces within debounce_us of the previous pulse, which
+        would add near-zero periods. The default is well below the period at any real speed.
+        """
+        if self.pin is None:
+            raise ValueError("Anemometer pin needed for period mode")
+        if size < crossover_hz * len(self.s_cnt) * self.slot_ms // 1000:
+            raise ValueError("Invalid size")
+        self.pulses = PulseTimes(self.pin, size, clock=time.ticks_us, debounce=debounce_us)
+        self.p_cross = crossover_hz / 1000
+
+    def _period_speed(self, now, speed):
+        # Return the speed in pulses per ms from the periods between the pulses within the gust
+        # window ending at now (ticks_us), or the count-based speed if there are fewer than two.
+        # The counter bounds how many entries are looked at, so pulses the counter didn't count
+        # don't get in.
+        r = self.pulses.rate(now, self.w_dt * 1000, self.w_cnt)
+        return speed if r is None else r * 1000
+
+    def calibrate(self, table, offset=0, size=64):
+        """
+        Replace the linear conversion by fct with a calibration curve: table is a list of
+        (Hz, speed) points in ascending Hz, which is interpolated linearly and extrapolated
+        beyond its last point, and offset is added to any non-zero speed to account for the
+        starting threshold of the cups. The curve is sampled into an evenly spaced table of size
+        entries, so converting a frequency takes an index and one linear interpolation.
+        """
+        if len(table) < 2 or size < 2:
+            raise ValueError("Invalid calibration table")
+        for i in range(len(table) - 1):
+            if table[i][0] >= table[i + 1][0]:
+                raise ValueError("Calibration table not in ascending Hz")
+        step = table[-1][0] / (size - 1)
+        lut = array.array("f", (0 for _ in range(size + 1)))
+        j = 0
+        for i in range(size + 1):
+            hz = i * step
+            # find the segment of the table containing hz, the last one extrapolates
+            while j < len(table) - 2 and hz > table[j + 1][0]:
+                j += 1
+            (h0, s0), (h1, s1) = table[j], table[j + 1]
+            lut[i] = s0 + (s1 - s0) * (hz - h0) / (h1 - h0)
+        self.lut = lut
+        self.c_scale = 1 / step
+        self.c_off = offset
+
+    def to_speed(self, hz):
+        """
+        Convert a pulse frequency to a speed, using the calibration curve if one is set.
+        """
+        lut = self.lut
+        if lut is None:
+            return hz * self.fct / 1000
+        if hz <= 0:
+            return 0
+        x = hz * self.c_scale
+        i = int(x)
+        n = len(lut) - 2
+        if i > n:
+            i = n  # extrapolate the last interval of the table
+        return lut[i] + (lut[i + 1] - lut[i]) * (x - i) + self.c_off
+
+    def speed(self):
+        """
+        Return the current wind speed in mph (assuming the fct converts from Hz to mph), which
+        is the average over the gust window.
+        """
+        return self.to_speed(self.w_speed * 1000)
+
+    def gust_window(self, gust_ms, slot_ms):
+        """
+        Set the gust window to gust_ms sliding by slot_ms, poll() must then be called every
+        slot_ms. This resets the gust measurement and must precede period_mode().
+        """
+        if slot_ms <= 0 or gust_ms < slot_ms:
+            raise ValueError("Invalid gust_ms or slot_ms")
+        n = gust_ms // slot_ms
+        self.slot_ms = slot_ms
+        self.s_cnt = array.array("H", (0 for _ in range(n)))  # pulses in each slot
+        self.s_dt = array.array("H", (0 for _ in range(n)))  # duration of each slot in ms
+        self.s_ix = 0  # next slot to overwrite
+        self.s_fill = 0  # number of slots filled so far, up to n
+        self.w_cnt = 0  # pulses in the window, i.e. sum of s_cnt
+        self.w_dt = 0  # duration of the window in ms, i.e. sum of s_dt
+        self.w_speed = 0  # speed over the window in pulses per ms
+        self.wg_max = 0
 
     # handle roll-over of 16-bit signed counter value
     @staticmethod
     def _count_diff(a, b):
         return (a - b) & 0x7FFF
 
-    async def _gust_poller(self, gust_ms):
-        last_at = time.ticks_ms()
-        last_count = self.ctr.value()
-        self.wg_max = 0
+    def _slot(self, count, dt):
+        # Add a slot with count pulses over dt ms to the window, evicting the oldest slot, and
+        # track the max speed over the window. Running sums make this O(1) per slot.
+        if dt > 0xFFFF:
+            dt = 0xFFFF
+        i = self.s_ix
+        self.w_cnt += count - self.s_cnt[i]
+        self.w_dt += dt - self.s_dt[i]
+        self.s_cnt[i] = count
+        self.s_dt[i] = dt
+        i += 1
+        n = len(self.s_cnt)
+        self.s_ix = 0 if i == n else i
+        speed = self.w_cnt / self.w_dt
+        if 0 < speed < self.p_cross:
+            speed = self._period_speed(time.ticks_us(), speed)
+        self.w_speed = speed
+        if self.s_fill < n:
+            self.s_fill += 1
+            if self.s_fill < n:
+                return  # no full window yet
+        if speed > self.wg_max:
+            self.wg_max = speed
+        if speed > self.sec_gust:
+            self.sec_gust = speed
+
+    def _history(self, count, dt):
+        # accumulate the slot into the current second and, for each completed second, update the
+        # turbulence accumulators and push it into the ring, if any; the pulses of a slot are
+        # attributed to the second in which the slot ends
+        self.sec_cnt += count
+        self.sec_ms += dt
+        n = 1
+        if self.h_cnt is not None:
+            n = len(self.h_cnt)
+        if self.m_cnt is not None:
+            n = max(n, len(self.m_cnt) * 60)
+        if self.sec_ms > n * 1000:
+            self.sec_ms = n * 1000  # after a long stall push only a ring's worth of seconds
+        while self.sec_ms >= 1000:
+            self.sec_ms -= 1000
+            # Welford's streaming mean and variance of the pulses per second
+            self.t_n += 1
+            d = self.sec_cnt - self.t_mean
+            self.t_mean += d / self.t_n
+            self.t_m2 += d * (self.sec_cnt - self.t_mean)
+            if self.h_cnt is not None:
+                self._push(min(self.sec_cnt, 0xFFFF))
+            if self.m_cnt is not None:
+                self._minute(self.sec_cnt)
+            self.sec_cnt = 0
+            self.sec_gust = 0
+
+    def _push(self, cnt):
+        # push a completed second into the ring and update the window sums
+        i = self.h_ix
+        for w in self.windows.values():
+            if w[0] > _SEC_MAX:
+                continue
+            # the second leaving window w is secs back from the one being written
+            if self.h_fill >= w[0]:
+                w[1] -= self.h_cnt[i - w[0]]  # negative index wraps around the ring
+            w[1] += cnt
+        self.h_cnt[i] = cnt
+        self.h_gust[i] = min(int(self.sec_gust * 100000), 0xFFFF)
+        n = len(self.h_cnt)
+        self.h_ix = 0 if i + 1 == n else i + 1
+        if self.h_fill < n:
+            self.h_fill += 1
+
+    def _minute(self, cnt):
+        # accumulate a completed second into the current minute and push each completed minute
+        # into the minute ring, updating the sums of the long windows like _push()
+        self.min_cnt += cnt
+        if self.sec_gust > self.min_gust:
+            self.min_gust = self.sec_gust
+        self.min_secs += 1
+        if self.min_secs < 60:
+            return
+        cnt = min(self.min_cnt, 0xFFFF)
+        i = self.m_ix
+        for w in self.windows.values():
+            if w[0] <= _SEC_MAX:
+                continue
+            k = w[0] // 60
+            if self.m_fill >= k:
+                w[1] -= self.m_cnt[i - k]
+            w[1] += cnt
+        self.m_cnt[i] = cnt
+        self.m_gust[i] = min(int(self.min_gust * 100000), 0xFFFF)
+        n = len(self.m_cnt)
+        self.m_ix = 0 if i + 1 == n else i + 1
+        if self.m_fill < n:
+            self.m_fill += 1
+        self.min_cnt = self.min_secs = 0
+        self.min_gust = 0
+
+    def poll(self):
+        """
+        Takes one gust sample: counts the pulses since the previous call into the sliding gust
+        window and tracks the maximum average speed over the window. Must be called every
+        slot_ms, either by the poller launched by start() or by a scheduler.
+        """
+        now = time.ticks_ms()
+        count = self.ctr.value()
+        dt = time.ticks_diff(now, self.g_at)
+        if dt <= 0:
+            return
+        self._slot(self._count_diff(count, self.g_count), dt)
+        self._history(self._count_diff(count, self.g_count), dt)
+        self.g_at = now
+        self.g_count = count
+
+    def window(self, name, secs):
+        """
+        Register a named window of the last secs seconds for read_window(). Windows of up to
+        _SEC_MAX seconds are kept per second, longer ones per minute: they cover the last whole
+        minutes, lagging by up to a minute, so an hour takes 60 entries instead of 3600.
+        Registering a window that is longer than the history kept so far reallocates the
+        history, so all windows should be registered before the measurements start.
+        """
+        if secs <= 0:
+            raise ValueError("Invalid window length")
+        per_min = secs > _SEC_MAX
+        unit = 60 if per_min else 1
+        ring = self.m_cnt if per_min else self.h_cnt
+        n = max([secs] + [w[0] for w in self.windows.values() if (w[0] > _SEC_MAX) == per_min])
+        n //= unit
+        if ring is None or n > len(ring):
+            cnt = array.array("H", (0 for _ in range(n)))
+            gust = array.array("H", (0 for _ in range(n)))
+            if per_min:
+                self.m_cnt, self.m_gust, self.m_ix, self.m_fill = cnt, gust, 0, 0
+            else:
+                self.h_cnt, self.h_gust, self.h_ix, self.h_fill = cnt, gust, 0, 0
+            for w in self.windows.values():
+                if (w[0] > _SEC_MAX) == per_min:
+                    w[1] = 0
+            self.windows[name] = [secs, 0]
+        else:
+            # sum the history already in the ring
+            ix, fill = (self.m_ix, self.m_fill) if per_min else (self.h_ix, self.h_fill)
+            m = min(secs // unit, fill)
+            self.windows[name] = [secs, sum(ring[ix - j - 1] for j in range(m))]
+
+    def read_window(self, name):
+        """
+        Return a tuple with the average wind speed and the max gust over the named window, both
+        in mph (assuming the fct converts from Hz to mph), and the number of seconds it covers,
+        which is less than the window's length until enough history has been collected.
+        Reading a window has no effect on other windows nor on read().
+        """
+        secs, total = self.windows[name]
+        if secs > _SEC_MAX:
+            k = min(secs // 60, self.m_fill)
+            n, h, i = k * 60, self.m_gust, self.m_ix
+        else:
+            k = n = min(secs, self.h_fill)
+            h, i = self.h_gust, self.h_ix
+        if n == 0:
+            return (0, 0, 0)
+        g = 0
+        for j in range(1, k + 1):
+            if h[i - j] > g:
+                g = h[i - j]
+        return (self.to_speed(total / n), self.to_speed(g / 100), n)
+
+    async def _gust_poller(self):
+        self.g_at = time.ticks_ms()
+        self.g_count = self.ctr.value()
         while True:
-            await asyncio.sleep_ms(gust_ms)
-            now = time.ticks_ms()
-            count = self.ctr.value()
-            speed = self._count_diff(count, last_count) / time.ticks_diff(now, last_at)
-            # log.debug("Gust: %d-%d -> %d/s -> %.1f mph", count, last_count, 1000*speed, speed*2500)
-            if speed > self.wg_max:
-                self.wg_max = speed
-            last_at = now
-            last_count = count
-
-    def start(self, gust_ms=3000):
+            await asyncio.sleep_ms(self.slot_ms)
+            self.poll()
+
+    def start(self, gust_ms=None):
         """
-        Starts the measurements, including launching a background asyncio poller to measure the
-        wind gust speed every gust_ms interval.
-        The optional gust_ms parameter specifies over which time period wind speed is averaged for
-        the wind-gust metric.
+        Starts the measurements, including launching a background asyncio poller to sample the
+        pulse counter every slot_ms.
+        The optional gust_ms parameter changes the time period over which wind speed is averaged
+        for the wind-gust metric.
         Note that the NOAA / CWOP standard sampling is: 2 minute average for "wind speed" and
-        5 or 8 second average for "wind gust" (see https://www.ndbc.noaa.gov/measdes.shtml).
+        5 or 8 second average for "wind gust" (see https://www.ndbc.noaa.gov/measdes.shtml), the
+        WMO gust is the max of the 3 second running average.
         """
-        asyncio.Loop.create_task(self._gust_poller(gust_ms))
+        if gust_ms is not None:
+            self.gust_window(gust_ms, self.slot_ms)
+        asyncio.create_task(self._gust_poller())
 
     def read(self):
         """
         Reads the wind speed and returns a tuple with wind-speed and wind-gust, both in mph
         (assuming the fct converts from Hz to mph).
         The wind speed value is the average since the last call to read_wind.
-        The wind gust value is the max speed measured over a gust_ms interval (see start method)
-        since the last call to read_wind.
+        The wind gust value is the max speed measured over a sliding gust_ms window since the
+        last call to read_wind.
         """
         now = time.ticks_ms()
         count = self.ctr.value()
@@ -72,12 +365,10 @@ class Anemo:
             speed = 0
             gust = 0
         else:
-            speed = (
-                self._count_diff(count, self.ws_count)
-                / time.ticks_diff(now, self.ws_at)
-                * self.fct
+            speed = self.to_speed(
+                1000 * self._count_diff(count, self.ws_count) / time.ticks_diff(now, self.ws_at)
             )
-            gust = self.wg_max * self.fct
+            gust = self.to_speed(self.wg_max * 1000)
             log.debug(
                 "Wind: %d-%d=%d in %dms -> %.1f = %.1f mph",
                 count,
@@ -90,8 +381,29 @@ class Anemo:
         self.ws_count = count
         self.ws_at = now
         self.wg_max = 0
+        self.t_n = 0
+        self.t_mean = self.t_m2 = 0.0
         return (speed, gust)
 
+    def turbulence(self, min_hz=0.5):
+        """
+        Return the turbulence intensity, the standard deviation of the 1 second wind speeds
+        divided by their mean, since the last call to read(), or None if there are fewer than
+        two seconds or the mean is below min_hz, where the ratio is meaningless.
+        The standard deviation of the speed is that of the frequency scaled by the slope of
+        the calibration curve around the mean.
+        """
+        if self.t_n < 2 or self.t_mean < min_hz:
+            return None
+        sd = math.sqrt(self.t_m2 / (self.t_n - 1))
+        m = self.t_mean
+        if self.lut is None:
+            return sd / m
+        lo = max(m - sd, min_hz)
+        hi = m + sd
+        slope = (self.to_speed(hi) - self.to_speed(lo)) / (hi - lo)
+        return slope * sd / self.to_speed(m)
+
 
 class Vane:
     """
@@ -99,11 +411,12 @@ class Vane:
     degrees of rotation (direction) as an analog voltage.
     """
 
-    def __init__(self, pin, v_min, v_max, offset):
+    def __init__(self, pin, v_min, v_max, offset, samples=7):
         """
         Initialize the wind vane on the provided pin (either number or initialized machine.ADC
-        object) and configure it for the provided minimum ADC value, maximum value, and value
-        when pointing north.
+        object, which must read 10 bits) and configure it for the provided minimum ADC value,
+        maximum value, and value when pointing north. Each reading is the median of a burst of
+        samples ADC reads.
         """
         if isinstance(pin, int):
             self.pin = machine.ADC(machine.Pin(pin))
@@ -117,38 +430,66 @@ class Vane:
             self.pin = pin
         if v_min < 0 or v_min > 65535 or v_max < 0 or v_max > 65535 or v_min > v_max:
             raise ValueError("Invalid v_min or v_max")
+        if samples < 1:
+            raise ValueError("Invalid samples")
         self.v_min = v_min
         self.v_max = v_max
         self.offset = offset
-        self.obs_min = 65535  # observed min
-        self.obs_max = 0  # observed max
+        self.obs_min = 1023  # observed min raw value
+        self.obs_max = 0  # observed max raw value
         self.cal = ADCCal()  # atten=machine.ADC.ATTN_11DB, width=machine.ADC.WIDTH_10BIT)
+        self.buf = array.array("H", (0 for _ in range(samples)))  # burst of raw reads
+        # direction in degrees for each raw 10-bit value, folding in the calibration, the range
+        # v_min..v_max, and the offset
+        self.lut = array.array("H", (self._degrees(raw) for raw in range(1024)))
+        self.dir = None
+        self.poll_ms = 1000  # interval between poll() calls, set by whoever calls it
+        self.a_ms = 0  # ms polled since the average was last updated
+        # vector sums since the last read_vector(): speed-weighted and unit vectors, x pointing
+        # east and y north
+        self.vx = 0.0
+        self.vy = 0.0
+        self.vw = 0.0  # sum of the weights
+        self.ux = 0.0
+        self.uy = 0.0
+        self.vn = 0  # number of samples
+
+    def _degrees(self, raw):
+        # convert a raw reading to the direction in degrees
+        val = self.cal.correct(raw)
+        # calculate direction as a fraction 0..1
+        frac = (val - self.v_min) / (self.v_max - self.v_min)
+        if frac < 0:
+            frac += 1
+        return (int(frac * 360) + self.offset) % 360
 
     def min_max(self):
         """
         Return a tuple of observed min and max values
         """
-        return (self.obs_min, self.obs_max)
+        return (self.cal.correct(self.obs_min), self.cal.correct(self.obs_max))
 
     def _raw_read(self):
-        # oversample 8x and average
-        sum = 0
-        for _ in range(8):
-            sum += self.pin.read()
-        val = sum // 8
-        val = self.cal.correct(val)
+        # burst of reads, sorted in place to take the median, which rejects outliers
+        buf = self.buf
+        read = self.pin.read
+        n = len(buf)
+        for i in range(n):
+            v = read()
+            j = i
+            while j > 0 and buf[j - 1] > v:
+                buf[j] = buf[j - 1]
+                j -= 1
+            buf[j] = v
+        val = buf[n >> 1]
+        if val > 1023:
+            val = 1023
         # adjust observed min/max info
         if val < self.obs_min:
             self.obs_min = val
         if val > self.obs_max:
             self.obs_max = val
-        # calculate direction as a fraction 0..1
-        frac = (val - self.v_min) / (self.v_max - self.v_min)
-        if frac < 0:
-            frac += 1
-        # return direction in degrees
-        # print(val, frac, self.offset)
-        return (int(frac * 360) + self.offset) % 360
+        return self.lut[val]
 
     def _avg(self, old_dir, new_dir):
         # exponential decaying average, however, adjust so abs(new_dir-old_dir)<=180 to avoid
@@ -160,11 +501,40 @@ class Vane:
         avg_dir = (9 * old_dir + new_dir + 5) // 10
         return avg_dir % 360
 
+    def _vector(self, d, speed):
+        # add the unit vector of direction d weighted by speed to the vector sums
+        x = _SIN[d]
+        y = _SIN[d - 270]  # cos(d) = sin(d + 90), the negative index wraps around
+        self.vx += x * speed
+        self.vy += y * speed
+        self.vw += speed
+        self.ux += x
+        self.uy += y
+        self.vn += 1
+
+    def poll(self, speed=None):
+        """
+        Takes one direction sample and folds it into the vector sums, weighted by the current
+        wind speed if provided, and once per second into the average returned by read(), so
+        its time constant of about 10s doesn't depend on how often the vane is polled. Must be
+        called every poll_ms, either by the poller launched by start() or by a scheduler.
+        Returns the direction sampled.
+        """
+        new_dir = self._raw_read()
+        if self.dir is None:
+            self.dir = new_dir
+        else:
+            self.a_ms += self.poll_ms
+            if self.a_ms >= 1000:
+                self.a_ms -= 1000
+                self.dir = self._avg(self.dir, new_dir)
+        self._vector(new_dir, 1 if speed is None else speed)
+        return new_dir
+
     async def _vane_poller(self):
         while True:
             await asyncio.sleep_ms(1000)
-            new_dir = self._raw_read()
-            self.dir = self._avg(self.dir, new_dir)
+            self.poll()
 
     def start(self):
         """
@@ -172,10 +542,181 @@ class Vane:
         wind direction every second.
         """
         self.dir = self._raw_read()
-        asyncio.Loop.create_task(self._vane_poller())
+        asyncio.create_task(self._vane_poller())
 
     def read(self):
         """
         Return wind direction in degrees from north
         """
         return self.dir
+
+    def variance(self):
+        """
+        Return the circular variance of the direction samples since the last read_vector(),
+        from 0 (steady) to 1 (uniformly spread), or None if there are no samples.
+        """
+        if self.vn == 0:
+            return None
+        return 1 - math.sqrt(self.ux * self.ux + self.uy * self.uy) / self.vn
+
+    def sigma_theta(self):
+        """
+        Return the standard deviation of the wind direction in degrees of the samples since the
+        last read_vector(), using the Yamartino single-pass estimator on the sums of the unit
+        vectors, or None if there are fewer than two samples.
+        """
+        n = self.vn
+        if n < 2:
+            return None
+        r2 = (self.ux * self.ux + self.uy * self.uy) / (n * n)
+        eps = math.sqrt(1 - r2) if r2 < 1 else 0.0
+        # 0.1547 = 2/sqrt(3) - 1
+        return math.degrees(math.asin(eps) * (1 + 0.1547 * eps * eps * eps))
+
+    def read_vector(self):
+        """
+        Return a tuple with the vector average wind direction in degrees from north and the
+        magnitude of the resultant vector, over the samples since the last call. The samples
+        are weighted by the speeds passed to poll(), so the magnitude is the vector mean wind
+        speed; without speeds it is the mean resultant length, from 0 (variable) to 1 (steady).
+        In calm wind the direction is the unweighted vector average. Returns (None, 0) if there
+        are no samples.
+        """
+        n = self.vn
+        if n == 0:
+            return (None, 0)
+        x, y = self.vx, self.vy
+        mag = math.sqrt(x * x + y * y) / n
+        if self.vw <= 0:
+            x, y = self.ux, self.uy
+        d = int(math.degrees(math.atan2(x, y)) + 360.5) % 360
+        self.vx = self.vy = self.vw = self.ux = self.uy = 0.0
+        self.vn = 0
+        return (d, mag)
+
+
+
+class Sampler:
+    """
+    Sampler reads the anemometer's counter and the wind vane together every slot_ms of the
+    anemometer, from a single task, so each slot of the gust window has both its pulse count
+    and its direction. The direction samples are weighted by the speed over the same window,
+    the gust is paired with the direction of its own slots, and the wind rose gets one sample
+    per second.
+    """
+
+    def __init__(self, anemo, vane, rose=None):
+        self.anemo = anemo
+        self.vane = vane
+        vane.poll_ms = anemo.slot_ms
+        self.rose = rose
+        self.dirs = array.array("H", (0 for _ in range(len(anemo.s_cnt))))  # by gust slot
+        self.g_dir = None  # direction of the max gust since read_gust_dir()
+        self.r_slots = max(1000 // anemo.slot_ms, 1)  # slots per wind rose sample
+        self.r_n = 0
+
+    def poll(self):
+        """
+        Takes one aligned sample of speed and direction. Must be called every slot_ms of the
+        anemometer, either by the poller launched by start() or by a scheduler.
+        """
+        a = self.anemo
+        i = a.s_ix
+        g = a.wg_max
+        a.poll()
+        speed = a.speed()
+        d = self.vane.poll(speed)
+        if a.s_ix == i:
+            return  # no time elapsed, the slot wasn't recorded
+        self.dirs[i] = d
+        if a.wg_max > g:
+            self.g_dir = self._gust_dir()
+        if self.rose:
+            self.r_n += 1
+            if self.r_n >= self.r_slots:
+                self.r_n = 0
+                self.rose.add(d, speed)
+
+    def _gust_dir(self):
+        # vector average of the directions over the gust window, weighted by the pulse counts
+        x = y = 0.0
+        cnt = self.anemo.s_cnt
+        dirs = self.dirs
+        for i in range(len(cnt)):
+            d = dirs[i]
+            x += _SIN[d] * cnt[i]
+            y += _SIN[d - 270] * cnt[i]
+        return int(math.degrees(math.atan2(x, y)) + 360.5) % 360
+
+    def read_gust_dir(self):
+        """
+        Return the direction in degrees of the max gust since the last call, or None if there
+        was no gust. Call along with the anemometer's read(), which resets the max gust.
+        """
+        d = self.g_dir
+        self.g_dir = None
+        return d
+
+    async def _poller(self):
+        while True:
+            await asyncio.sleep_ms(self.anemo.slot_ms)
+            self.poll()
+
+    def start(self):
+        """
+        Starts the measurements, launching a single background asyncio poller for both the
+        anemometer and the vane, which replaces their own start().
+        """
+        self.anemo.g_at = time.ticks_ms()
+        self.anemo.g_count = self.anemo.ctr.value()
+        asyncio.create_task(self._poller())
+
+
+class Rose:
+    """
+    Rose accumulates a wind rose: the number of samples in each of 16 direction sectors and in
+    each speed bin, the bins being delimited by the ascending speed bounds, so bin 0 holds the
+    samples below bounds[0] (calm). Counts saturate at 65535.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.nbins = len(bounds) + 1
+        self.counts = array.array("H", (0 for _ in range(16 * self.nbins)))  # by sector, bin
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.n = 0
+        self.at = time.ticks_ms()
+
+    def add(self, d, speed):
+        """
+        Count a sample of direction d in degrees and speed in the units of the bounds.
+        """
+        b = 0
+        for v in self.bounds:
+            if speed < v:
+                break
+            b += 1
+        # sector 0 is centered on north and spans 348.75..11.25 degrees
+        i = (d * 2 + 22) // 45 % 16 * self.nbins + b
+        if self.counts[i] < 0xFFFF:
+            self.counts[i] += 1
+        self.n += 1
+
+    def encode(self):
+        """
+        Return the rose as JSON and reset it: the period in seconds, the bounds, the number of
+        samples, and the counts as a list per sector, clockwise from north, of counts per bin.
+        """
+        nb = self.nbins
+        msg = {
+            "period": time.ticks_diff(time.ticks_ms(), self.at) // 1000,
+            "bounds": self.bounds,
+            "n": self.n,
+            "rose": [list(self.counts[i : i + nb]) for i in range(0, 16 * nb, nb)],
+        }
+        self.reset()
+        return json.dumps(msg)
@@ -0,0 +1,94 @@
+import adaptive, sample, sched, time, wind
+import uasyncio as asyncio
+from sample import GUST, P_BME680
+
+print("Starting adaptive test")
+
+a = adaptive.Adaptive(15000, 120000, gust=8.0, rain=1, pressure=1.0)
+s = sample.Sample()
+
+# Test backing off while calm
+print("Test calm")
+s.set(GUST, 3.0)
+ivs = [a.update(s) for _ in range(5)]
+if ivs != [30000, 60000, 120000, 120000, 120000]:
+    print("Calm intervals {}".format(ivs))
+
+# Test gust
+print("Test gust")
+s.set(GUST, 9.5)
+if a.update(s) != 15000:
+    print("Gust interval {}, expected 15000".format(a.interval))
+s.set(GUST, 3.0)
+if a.update(s) != 30000:
+    print("After gust interval {}, expected 30000".format(a.interval))
+
+# Test rain, including wrap-around of the pulse counter
+print("Test rain")
+a.update(s, 32766)
+a.update(s, 32766)
+if a.interval != 120000:
+    print("No-rain interval {}, expected 120000".format(a.interval))
+if a.update(s, 1) != 15000:
+    print("Rain interval {}, expected 15000".format(a.interval))
+
+# Test pressure: a 2 hPa/h drop is volatile, but only once a window has elapsed
+print("Test pressure")
+a = adaptive.Adaptive(15000, 60000, pressure=1.0)
+s = sample.Sample()
+s.set(P_BME680, 1.0132)
+a.update(s)
+a.p_at = time.ticks_add(a.p_at, -adaptive._P_WINDOW)  # pretend the window has passed
+s.set(P_BME680, 1.0127)
+if a.update(s) != 15000:
+    print("Pressure interval {}, expected 15000".format(a.interval))
+
+# Test a gust between publishes with a stretched interval: the wind task's period stretches
+# with it, so the gust isn't reset by a wind read before it's published
+print("Test gust between publishes")
+
+
+class Ctr:
+    def __init__(self):
+        self.v = 0
+
+    def value(self):
+        return self.v
+
+
+async def publishes():
+    anemo = wind.Anemo(Ctr(), 1)  # 1 mph per Hz
+
+    def read_wind(c):
+        g = anemo.read()[1]
+        c.set(GUST, g * 0.44704)
+
+    a = adaptive.Adaptive(5000, 20000, gust=8.0)
+    a.interval = 20000
+    sc = sched.Scheduler()
+    sc.add("wind", 5000, read_wind, stretch=True)
+    sc.slow_ms = 20000  # set by the main loop along with the interval
+    sc.start()
+    await sc.settle()
+    await asyncio.sleep_ms(7000)
+    for _ in range(12):
+        anemo._slot(5, 250)  # a 3s gust of 20Hz, 8.9m/s
+    await asyncio.sleep_ms(13100)  # the publish after the next wind read
+    s = sample.Sample()
+    sc.collect(s)
+    if s.get(GUST, 0) < 8.0:
+        print("Published gust {}, expected 8.9".format(s.get(GUST)))
+    if a.update(s) != 5000:
+        print("Gust interval {}, expected 5000".format(a.interval))
+
+
+asyncio.run(publishes())
+
+# Test invalid bounds
+try:
+    adaptive.Adaptive(60000, 15000)
+    print("Invalid bounds accepted")
+except ValueError:
+    pass
+
+print("--END--")
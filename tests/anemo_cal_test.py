@@ -0,0 +1,62 @@
+import wind, time
+
+print("Starting anemo calibration test")
+
+
+class Ctr:
+    def value(self):
+        return 0
+
+
+def interp(table, hz):
+    # reference piecewise-linear evaluation with extrapolation at the ends
+    j = 0
+    while j < len(table) - 2 and hz > table[j + 1][0]:
+        j += 1
+    (h0, s0), (h1, s1) = table[j], table[j + 1]
+    return s0 + (s1 - s0) * (hz - h0) / (h1 - h0)
+
+
+# Test the default linear conversion is unchanged
+a = wind.Anemo(Ctr(), 2.5)
+if abs(a.to_speed(4) - 10) > 1e-6:
+    print("Linear {}, expected 10".format(a.to_speed(4)))
+
+# Test the curve at and between the points, with table points on the LUT grid
+print("Test curve")
+table = [(0, 0), (2, 4.0), (6, 14.0), (16, 42.0), (32, 92.0)]
+a.calibrate(table, offset=0.6, size=65)
+for hz in (0.1, 0.5, 1, 2, 3.3, 6, 10.25, 16, 20, 31.9, 32, 40):
+    exp = interp(table, hz) + 0.6
+    if abs(a.to_speed(hz) - exp) > 1e-3:
+        print("{}Hz: {:.4f}, expected {:.4f}".format(hz, a.to_speed(hz), exp))
+if a.to_speed(0) != 0:
+    print("Calm is {}".format(a.to_speed(0)))
+
+# Test a coarse LUT stays close to the curve off its grid
+a.calibrate(table, size=16)
+worst = max(abs(a.to_speed(k / 10) - interp(table, k / 10)) for k in range(1, 320))
+if worst > 0.5:
+    print("Coarse LUT error {:.3f}".format(worst))
+
+# Test the readings go through the curve
+print("Test readings")
+a.calibrate(table, offset=0.6, size=65)
+for _ in range(12):
+    a._slot(1, 250)  # 4Hz
+if abs(a.speed() - (interp(table, 4) + 0.6)) > 1e-3:
+    print("Speed {:.3f}".format(a.speed()))
+
+try:
+    a.calibrate([(0, 0), (5, 10), (5, 12)])
+    print("Non-ascending table accepted")
+except ValueError:
+    pass
+
+# Test the conversion is cheap: a LUT lookup regardless of the table size
+t0 = time.ticks_us()
+for k in range(1000):
+    a.to_speed(k / 40)
+print("  to_speed: {}us".format(time.ticks_diff(time.ticks_us(), t0) / 1000))
+
+print("--END--")
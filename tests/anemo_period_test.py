@@ -0,0 +1,101 @@
+import wind, time
+
+print("Starting anemo period test")
+
+
+class Ctr:
+    def value(self):
+        return 0
+
+
+class Pin:
+    def irq(self, handler=None, trigger=0):
+        self.handler = handler
+
+
+def pulses(a, now, hz, phase_us, n):
+    # record n pulses at hz, the last one phase_us before now, oldest first
+    per = int(1000000 / hz)
+    for k in range(n - 1, -1, -1):
+        a.pulses.record(time.ticks_add(now, -phase_us - k * per))
+
+
+pin = Pin()
+a = wind.Anemo(Ctr(), 1, pin=pin)
+try:
+    wind.Anemo(Ctr(), 1).period_mode()
+    print("Period mode accepted without a pin")
+except ValueError:
+    pass
+try:
+    a.period_mode(4, size=24)
+    print("Size that isn't a power of 2 accepted")
+except ValueError:
+    pass
+a.period_mode(4, size=32)
+if pin.handler != a.pulses._irq:
+    print("Interrupt handler not set")
+
+# Test the interrupt handler records timestamps around the ring
+print("Test handler")
+for _ in range(40):
+    pin.handler(pin)
+    time.sleep_ms(6)  # past the debounce
+if a.pulses.ix != 40 % 32 or a.pulses.n != 32:
+    print("Ring index {}, expected {}".format(a.pulses.ix, 40 % 32))
+
+# Test resolution: at 1.7Hz a 3s window holds 5 or 6 pulses, which counts quantize to 1.67 or
+# 2.0Hz, the periods give 1.7Hz wherever the pulses fall
+print("Test resolution")
+a.w_dt = 3000
+now = time.ticks_us()
+for phase in (0, 100000, 300000, 500000):
+    now = time.ticks_add(now, 3000000)  # each run's pulses come after the previous run's
+    n = 1 + (3000000 - phase - 1) * 17 // 10000000  # pulses within the window
+    pulses(a, now, 1.7, phase, n)
+    a.w_cnt = n
+    s = a._period_speed(now, n / 3000) * 1000
+    if abs(s - 1.7) > 0.01:
+        print("Phase {}: {:.3f}Hz, expected 1.7Hz (counts: {:.3f}Hz)".format(phase, s, n / 3))
+
+# Test the wind dropping: no pulse for longer than the period bounds the speed
+print("Test drop")
+now = time.ticks_add(now, 3000000)
+pulses(a, now, 4, 1500000, 4)
+a.w_cnt = 4
+s = a._period_speed(now, 4 / 3000) * 1000
+if abs(s - 1 / 1.5) > 0.01:
+    print("Dropping wind {:.3f}Hz, expected {:.3f}Hz".format(s, 1 / 1.5))
+
+# Test a single pulse falls back to the count
+a.w_cnt = 1
+pulses(a, now, 4, 200000, 1)
+if a._period_speed(now, 1 / 3000) != 1 / 3000:
+    print("Single pulse didn't fall back to the count")
+
+# Test bounces: a second edge shortly after each pulse is ignored, it doesn't add a near-zero
+# period that inflates the speed
+print("Test bounce")
+b = wind.Anemo(Ctr(), 1, pin=Pin())
+b.period_mode(4, size=32)
+b.w_dt = 3000
+per = 500000  # 2Hz
+for k in range(6, -1, -1):
+    t = time.ticks_add(now, -100000 - k * per)
+    b.pulses.record(t)
+    b.pulses.record(time.ticks_add(t, 800))
+b.w_cnt = 6
+s = b._period_speed(now, 6 / 3000) * 1000
+if abs(s - 2) > 0.01:
+    print("Bouncing {:.3f}Hz, expected 2Hz".format(s))
+
+# Test the counter bounds the entries used: old pulses in the ring are ignored
+print("Test bound")
+now = time.ticks_add(now, 3000000)  # pulses come in order, after the ones recorded so far
+pulses(a, now, 10, 0, 20)
+a.w_cnt = 3
+s = a._period_speed(now, 3 / 3000) * 1000
+if abs(s - 10) > 0.01:
+    print("Bounded {:.3f}Hz, expected 10Hz".format(s))
+
+print("--END--")
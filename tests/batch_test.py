@@ -0,0 +1,99 @@
+# Round-trip test of the batched binary telemetry format: encodes with the device modules and
+# decodes with the host decoder, then compares size and encoding speed against JSON.
+# Runs on the host: python3 tests/batch_test.py
+import sys, os, json, time, random, builtins
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(here, "..", "src"), os.path.join(here, "..", "host")]
+if not hasattr(builtins, "const"):
+    builtins.const = lambda x: x  # MicroPython builtin used by the device modules
+
+import batch, wxbatch
+from sample import *
+print("Starting batch test")
+
+random.seed(1)
+N = 10
+s = Sample()
+
+def fill(i):
+    s.clear()
+    s.ts = 660000000 + 60 * i
+    vals = {T_BME680: random.uniform(-10, 40), H_BME680: random.uniform(0, 100),
+        P_BME680: random.uniform(0.95, 1.05), G_BME680: random.randint(5000, 500000),
+        T_SHT31: random.uniform(-10, 40), H_SHT31: random.uniform(0, 100),
+        WIND: random.uniform(0, 30), GUST: random.uniform(0, 40), WDIR: random.randint(0, 359)}
+    if i % 3:
+        vals[PM25] = random.uniform(0, 200)
+        vals[AQI_PM25] = random.randint(0, 300)
+    for ix, v in vals.items():
+        s.set(ix, v)
+    return vals
+
+# Test round trip
+print("Test round trip")
+b = batch.Batch(N)
+expected = []
+for i in range(N):
+    expected.append(fill(i))
+    full = b.add(s)
+    if full != (i == N - 1):
+        print("Batch full at {}".format(i))
+payload = b.payload()
+recs = wxbatch.decode(payload)
+if len(recs) != N:
+    print("Decoded {} records, expected {}".format(len(recs), N))
+for i, (r, vals) in enumerate(zip(recs, expected)):
+    if r["ts"] != 660000000 + 60 * i + wxbatch.EPOCH_OFFSET:
+        print("Record {}: ts {}".format(i, r["ts"]))
+    if len(r) != len(vals) + 1:
+        print("Record {}: got fields {}".format(i, sorted(r)))
+    for ix, v in vals.items():
+        name = NAMES[ix].decode()
+        if abs(r.get(name, -999) - v) > 0.51 * 10 ** -DECIMALS[ix]:
+            print("Record {} field {}: got {}, expected {}".format(i, name, r.get(name), v))
+
+# Test NumPy decoding
+try:
+    import numpy
+except ImportError:
+    numpy = None
+if numpy:
+    print("Test NumPy decoding")
+    arr = wxbatch.to_numpy(payload)
+    for name in ("t_bme680", "pm25", "wdir", "h_si7021"):
+        col = [r.get(name, float("nan")) for r in recs]
+        if not numpy.allclose(arr[name], col, equal_nan=True):
+            print("Column {}: got {}, expected {}".format(name, arr[name], col))
+
+# Test corrupt payloads
+print("Test corrupt payloads")
+for bad in (payload[:-1], b"XX" + payload[2:], payload[:2] + b"\x09" + payload[3:]):
+    try:
+        wxbatch.decode(bad)
+        print("Decoded corrupt payload")
+    except wxbatch.DecodeError:
+        pass
+
+# Compare size and encoding speed against one JSON message per sample
+print("Compare against JSON")
+json_size = 0
+for i in range(N):
+    fill(i)
+    json_size += s.encode()
+print("  {} samples: JSON {} bytes in {} messages, batch {} bytes in 1 message ({:.0f}%)".format(
+    N, json_size, N, len(payload), 100 * len(payload) / json_size))
+reps = 2000
+t0 = time.perf_counter()
+for _ in range(reps):
+    s.encode()
+t1 = time.perf_counter()
+for _ in range(reps):
+    b.add(s)
+    if b.count == N:
+        b.payload()
+t2 = time.perf_counter()
+print("  encode per sample: JSON {:.1f}us, binary {:.1f}us".format(
+    (t1 - t0) / reps * 1e6, (t2 - t1) / reps * 1e6))
+
+print("--END--")
@@ -0,0 +1,130 @@
+import checkpoint, rain, time
+import uos as os
+
+print("Starting checkpoint test")
+
+PATH = "/ckpt_test"
+for i in (0, 1):
+    try:
+        os.remove(PATH + "." + str(i))
+    except OSError:
+        pass
+
+
+class Counter:
+    # the hardware counter, which restarts from zero after a reset
+    def __init__(self):
+        self.v = 0
+
+    def value(self):
+        return self.v
+
+
+# Test save and restore, including rotation between the two files
+print("Test rotation")
+ck = checkpoint.Checkpoint(PATH, "<ii", max_recs=4)
+if ck.restore() is not None:
+    print("Restored from an empty log")
+for i in range(10):
+    ck.save((i, -i))
+ck = checkpoint.Checkpoint(PATH, "<ii", max_recs=4)
+if ck.restore() != (9, -9) or ck.seq != 10:
+    print("Restored {} seq {}, expected (9, -9) seq 10".format(ck.restore(), ck.seq))
+size = ck.size
+for i in (0, 1):
+    if os.stat(PATH + "." + str(i))[6] > 4 * size:
+        print("Log file {} grew to {} bytes".format(i, os.stat(PATH + "." + str(i))[6]))
+
+# Test a record torn by a reset is skipped, and the next save doesn't append after it
+print("Test torn record")
+with open(PATH + "." + str(ck.cur), "ab") as f:
+    f.write(b"\x0b\x00\x00\x00\x07")
+ck = checkpoint.Checkpoint(PATH, "<ii", max_recs=4)
+if ck.restore() != (9, -9):
+    print("Restored {} after a torn record".format(ck.restore()))
+ck.save((10, -10))
+ck = checkpoint.Checkpoint(PATH, "<ii", max_recs=4)
+if ck.restore() != (10, -10):
+    print("Restored {} after saving past a torn record".format(ck.restore()))
+
+# Test a corrupt record is skipped
+with open(PATH + "." + str(ck.cur), "r+b") as f:
+    f.seek((ck.recs - 1) * ck.size + 6)
+    f.write(b"\xff")
+ck = checkpoint.Checkpoint(PATH, "<ii", max_recs=4)
+if ck.restore() != (9, -9):
+    print("Restored {} after a corrupt record".format(ck.restore()))
+
+# Test resets in the middle of a rain event: the event and day totals carry on
+print("Test rain reset")
+for i in (0, 1):
+    os.remove(PATH + "." + str(i))
+start = time.mktime((2020, 3, 6, 9, 0, 0, 4, 0))
+now = start
+
+
+def boot():
+    # a fresh gauge with a counter at zero, restored from the checkpoint log
+    ctr = Counter()
+    r = rain.Rain(ctr)
+    ck = checkpoint.Checkpoint(PATH, rain.STATE_FMT, max_recs=8)
+    st = ck.restore()
+    if st:
+        r.restore(st)
+    return ctr, r, ck
+
+
+def minutes(ctr, r, ck, n, tips):
+    # n minutes with tips per minute, reading and checkpointing every minute
+    global now
+    got = None
+    for _ in range(n):
+        now += 60
+        ctr.v = (ctr.v + tips) & 0x7FFF
+        got = r.read(now)
+        if r.dirty:
+            ck.save(r.state())
+            r.dirty = False
+    return got
+
+
+ctr, r, ck = boot()
+r.read(now, 0)
+minutes(ctr, r, ck, 10, 2)  # 0.2in
+writes = ck.writes
+minutes(ctr, r, ck, 30, 0)  # no tips: no checkpoints
+if ck.writes != writes:
+    print("{} checkpoints without tips".format(ck.writes - writes))
+ctr, r, ck = boot()  # reset mid-event
+got = minutes(ctr, r, ck, 5, 2)  # 0.1in
+if abs(got[1] - 0.3) > 0.001 or abs(got[2] - 0.3) > 0.001:
+    print("After reset: event {} today {}, expected 0.3 and 0.3".format(got[1], got[2]))
+ctr, r, ck = boot()  # reset again, right after the last tips
+got = minutes(ctr, r, ck, 1, 1)
+if abs(got[1] - 0.31) > 0.001 or abs(got[2] - 0.31) > 0.001:
+    print("After 2nd reset: event {} today {}, expected 0.31".format(got[1], got[2]))
+
+# Test the counter wrapping around during an event
+ctr.v = 0x7FFF - 1
+r.hw = ctr.v
+got = minutes(ctr, r, ck, 1, 4)
+if abs(got[1] - 0.35) > 0.001:
+    print("After wrap-around: event {}, expected 0.35".format(got[1]))
+
+# Test the event ends and the day resets across a reset
+print("Test rain reset across day")
+minutes(ctr, r, ck, 13 * 60, 0)
+ctr, r, ck = boot()
+got = minutes(ctr, r, ck, 1, 0)
+if got[1] != 0 or abs(got[2] - 0.35) > 0.001:
+    print("After event end: event {} today {}, expected 0 and 0.35".format(got[1], got[2]))
+while time.localtime(now)[3] != 7 or time.localtime(now)[4] != 59:
+    minutes(ctr, r, ck, 1, 0)
+ctr, r, ck = boot()
+got = minutes(ctr, r, ck, 2, 0)
+if got[2] != 0:
+    print("After 8am: today {}, expected 0".format(got[2]))
+
+for i in (0, 1):
+    os.remove(PATH + "." + str(i))
+print("--END--")
@@ -1,13 +1,252 @@
-import cwop, uasyncio as asyncio
+import cwop, socket, time, uasyncio as asyncio
+
+print("Starting CWOP test")
+
+# The test runs against stand-in servers on the local host: an HTTP server like the CWOP one on
+# port 8080 and an APRS-IS server like the one on port 14580, which record what they receive.
+HOST = "127.0.0.1"
+HTTP_PORT = 18080
+APRS_PORT = 14580
 
 cwop_config = {
-    "usr"    : "user N6TVE-11 pass 11394 vers esp-mp-wx 1.00",
-    "sta"    : "N6TVE-11",
-    "server" : "rotate.aprs2.net",
-    "coord"  : "3429.95N/11949.07W",
+    "usr": "user N6TVE-11 pass 11394 vers esp-mp-wx 1.00",
+    "sta": "N6TVE-11",
+    "server": HOST,
+    "coord": "3429.95N/11949.07W",
+    "baro_off": 0,
 }
+PACKET = "N6TVE-11>APESPW,TCPIP*:!3429.95N/11949.07W_325/028g037t127h70b09415XTvEWx"
+
+posted = []  # packets received by the servers
+logins = []
+mute = False  # the HTTP server doesn't respond
+hold = False  # the HTTP server holds its response until this is cleared
+hosts = []  # Host headers of the posts received
+
+
+async def http_server(r, w):
+    length = 0
+    while True:
+        line = await r.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+        if line.lower().startswith(b"host:"):
+            hosts.append(line[5:].strip().decode())
+    body = await r.read(length)
+    if mute:
+        await r.read()  # until the client gives up
+        w.close()
+        return
+    while hold:
+        await asyncio.sleep_ms(100)
+    posted.append(body.split(b"\r\n", 1)[-1].decode())
+    w.write(b"HTTP/1.0 200 OK\r\n")
+    await w.drain()
+    w.close()
+
+
+sessions = []  # writers of the open APRS-IS sessions
+
+
+async def aprs_server(r, w):
+    w.write(b"# aprsc stand-in\r\n")
+    await w.drain()
+    logins.append((await r.readline()).strip().decode())
+    w.write(b"# logresp N6TVE-11 verified, server TEST\r\n")
+    await w.drain()
+    sessions.append(w)
+    while True:
+        line = await r.readline()
+        if not line:
+            break
+        posted.append(line.strip().decode())
+    w.close()
+
+
+class Resolver:
+    # count the DNS lookups made by cwop, host names in names resolve to the given address
+    def __init__(self):
+        self.n = 0
+        self.names = {}
+
+    def getaddrinfo(self, host, port, *args):
+        self.n += 1
+        return socket.getaddrinfo(self.names.get(host, host), port, *args)
+
+
+ticks = 0
+
+
+async def ticker():
+    # runs every 100ms, to check that the event loop doesn't stall while sending
+    global ticks
+    while True:
+        await asyncio.sleep_ms(100)
+        ticks += 1
+
+
+def report():
+    return cwop.send_wx(temp=53, hum=70, winddir=325, windspeed=28, windgust=37, baro=0.9415)
+
+
+async def main():
+    global mute, hold, ticks
+    http = await asyncio.start_server(http_server, HOST, HTTP_PORT)
+    aprs = await asyncio.start_server(aprs_server, HOST, APRS_PORT)
+    dns = Resolver()
+    cwop.socket = dns
+    tk = asyncio.create_task(ticker())
+
+    # Test HTTP POST, the address is looked up once
+    print("Test HTTP post")
+    cwop._config = dict(cwop_config, port=HTTP_PORT)
+    await report()
+    await report()
+    if posted != [PACKET, PACKET]:
+        print("Posted {}, expected {}".format(posted, [PACKET, PACKET]))
+    if dns.n != 1:
+        print("Looked up the address {} times, expected once".format(dns.n))
+    if hosts != [HOST, HOST]:
+        print("Host headers {}, expected {}".format(hosts, [HOST, HOST]))
+
+    # Test a server that doesn't respond: the send times out and doesn't stall the event loop
+    print("Test HTTP timeout")
+    mute = True
+    cwop.RESPONSE_MS = 2000
+    ticks = 0
+    t0 = time.ticks_ms()
+    await report()
+    dt = time.ticks_diff(time.ticks_ms(), t0)
+    if dt < 2000 or dt > 3000:
+        print("Send took {}ms, expected the 2000ms timeout".format(dt))
+    if ticks < dt // 100 - 2:
+        print("Event loop ran {} times in {}ms".format(ticks, dt))
+    if len(posted) != 2:
+        print("Posted {} packets, expected 2".format(len(posted)))
+    if len(cwop._pool) != 1 or cwop._pool[0].fails != 1:
+        print("Server not marked as failed")
+    mute = False
+    cwop.RESPONSE_MS = 10000
+    cwop._pool.clear()
+
+    # Test the APRS-IS session: one login for several reports
+    print("Test APRS-IS session")
+    posted.clear()
+    cwop._config = dict(cwop_config, session=True, port=APRS_PORT)
+    for i in range(3):
+        await report()
+    await asyncio.sleep_ms(100)
+    if posted != [PACKET] * 3:
+        print("Sent {}, expected {}".format(posted, [PACKET] * 3))
+    if logins != [cwop_config["usr"]]:
+        print("Logins {}, expected one".format(logins))
+
+    # Test the server closing the session: the next report logs in again
+    print("Test APRS-IS session closed")
+    sessions[-1].close()
+    await asyncio.sleep_ms(100)
+    await report()
+    await asyncio.sleep_ms(100)
+    if len(posted) != 4 or len(logins) != 2:
+        print("Sent {} packets with {} logins, expected 4 and 2".format(len(posted), len(logins)))
+
+    # Test the aggregation: one report per period with the means, the max gust, and the latest
+    # wind and rain, and a report that waits for a slow upload is replaced by a newer one
+    print("Test aggregation")
+    cwop._close()
+    posted.clear()
+    cwop.start(None, dict(cwop_config, port=HTTP_PORT, period=60))
+    t0 = time.ticks_ms()
+    for i in range(6):
+        cwop.collect(
+            temp=10 + i,
+            hum=50 + 2 * i,
+            winddir=180 + i,
+            windspeed=5 + i,
+            windgust=(9, 20, 12, 8, 7, 6)[i],
+            rainrate=i,
+            rainevent=10 + i,
+            baro=1.0 + 0.001 * i,
+        )
+        await asyncio.sleep_ms(9000)
+    await asyncio.sleep_ms(time.ticks_diff(time.ticks_add(t0, 61000), time.ticks_ms()))
+    exp = "N6TVE-11>APESPW,TCPIP*:!3429.95N/11949.07W_185/010g020t054h55r005p015b10025XTvEWx"
+    if posted != [exp]:
+        print("Posted {}, expected {}".format(posted, [exp]))
+    await asyncio.sleep_ms(60000)
+    if len(posted) != 1:
+        print("Posted {} reports without samples, expected none".format(len(posted) - 1))
+    hold = True
+    cwop.RESPONSE_MS = 200000
+    for i in range(3):
+        cwop.collect(temp=10 + i)
+        await asyncio.sleep_ms(60000)  # the first report's upload is held up
+    hold = False
+    await asyncio.sleep_ms(1000)
+    cwop.RESPONSE_MS = 10000
+    exp = ["N6TVE-11>APESPW,TCPIP*:!3429.95N/11949.07W_.../...t%03dXTvEWx" % (t * 1.8 + 32)
+        for t in (10, 12)]
+    if posted[1:] != exp:
+        print("Posted {}, expected {}".format(posted[1:], exp))
+
+    # Test failover between servers: a failing server backs off, exponentially, and the reports go
+    # to the healthy one, the addresses are looked up again only when they expire or, at most
+    # once per backoff period, when all the servers fail
+    print("Test failover")
+    cwop._pool.clear()
+    cwop._config = dict(cwop_config, server=["127.0.0.2", HOST], port=HTTP_PORT)
+    cwop.BACKOFF = 10
+    cwop.DNS_TTL = 30
+    cwop.RESPONSE_MS = 500
+    dns.n = 0
+    posted.clear()
+    await report()
+    await report()
+    pool = {s.addr: s for s in cwop._pool}
+    bad, good = pool.get("127.0.0.2"), pool.get(HOST)
+    if len(posted) != 2 or dns.n != 2:
+        print("Posted {} reports with {} lookups, expected 2 and 2".format(len(posted), dns.n))
+    if not bad or not good or bad.fails != 1 or good.fails or good.latency is None:
+        print("Pool {}".format([(s.addr, s.fails, s.latency) for s in cwop._pool]))
+    mute = True
+    await report()  # the good server fails too, both back off
+    await report()  # nothing to try, not even a lookup
+    if len(posted) != 2 or dns.n != 2 or good.fails != 1:
+        print("Posted {} reports with {} lookups, expected 2 and 2".format(len(posted), dns.n))
+    await asyncio.sleep(11)
+    await report()  # both fail again and back off twice as long
+    for srv in (bad, good):
+        if srv.fails != 2 or not 19 <= srv.retry_at - time.time() <= 20:
+            print("{} failed {} times, retry in {}s".format(srv.addr, srv.fails,
+                srv.retry_at - time.time()))
+    mute = False
+    await asyncio.sleep(31)
+    n = dns.n
+    await report()  # the addresses expired and are looked up again
+    if len(posted) != 3 or dns.n != n + 2 or good.fails:
+        print("Posted {} reports with {} lookups, expected 3 and {}".format(len(posted), dns.n,
+            n + 2))
+
+    # Test the default server: the Host header is the host name the address was resolved from
+    print("Test default server")
+    cwop._pool.clear()
+    cwop._config = dict(cwop_config, port=HTTP_PORT)
+    del cwop._config["server"]
+    dns.names["rotate.aprs2.net"] = HOST
+    hosts.clear()
+    posted.clear()
+    await report()
+    if posted != [PACKET] or hosts != ["rotate.aprs2.net"]:
+        print("Posted {} with Host {}, expected {} with rotate.aprs2.net".format(posted, hosts,
+            [PACKET]))
+
+    cwop._close()
+    tk.cancel()
+    http.close()
+    aprs.close()
+
 
-cwop._config = cwop_config
-asyncio.run(
-    cwop.send_wx(temp=53, hum=70, winddir=325, windspeed=28, windgust=37, baro=9415)
-)
+asyncio.run(main())
+print("--END--")
@@ -0,0 +1,98 @@
+import wind
+
+print("Starting gust test")
+
+
+class Ctr:
+    def __init__(self):
+        self.v = 0
+
+    def value(self):
+        return self.v
+
+
+def feed(anemo, hz, slots):
+    # feed slots of 250ms at a pulse rate of hz, spreading fractional pulses across slots
+    acc = 0.0
+    for _ in range(slots):
+        acc += hz / 4
+        n = int(acc)
+        acc -= n
+        anemo._slot(n, 250)
+
+
+def block_gust(train, block):
+    # gust as measured by non-overlapping blocks of slots (the former method)
+    m = 0
+    for i in range(0, len(train) - block + 1, block):
+        m = max(m, sum(train[i : i + block]) / (block * 250))
+    return m
+
+
+# Test steady wind: gust equals the average
+print("Test steady")
+a = wind.Anemo(Ctr(), 1)  # 1 mph per Hz, so speed in mph equals Hz
+feed(a, 8, 40)
+if abs(a.wg_max * a.fct - 8) > 0.01:
+    print("Steady gust {}, expected 8".format(a.wg_max * a.fct))
+
+# Test no full window yet: no gust
+a = wind.Anemo(Ctr(), 1)
+feed(a, 20, 11)
+if a.wg_max != 0:
+    print("Gust {} before the window filled".format(a.wg_max))
+
+# Test gust straddling a 3s block boundary: 3s at 20Hz starting half-way into a block
+print("Test straddling gust")
+train = [1] * 6 + [5] * 12 + [1] * 30  # 4Hz base, 20Hz gust
+a = wind.Anemo(Ctr(), 1)
+for n in train:
+    a._slot(n, 250)
+g = a.wg_max * a.fct
+b = block_gust(train, 12) * 1000
+if abs(g - 20) > 0.01:
+    print("Rolling gust {}, expected 20".format(g))
+if b >= 15:
+    print("Block gust {}, expected under-reporting".format(b))
+
+# Test short gust: 1s at 40Hz averages to 16Hz over 3s wherever it falls
+print("Test short gust")
+for off in range(12):
+    train = [1] * (12 + off) + [10] * 4 + [1] * 20
+    a = wind.Anemo(Ctr(), 1)
+    for n in train:
+        a._slot(n, 250)
+    g = a.wg_max * a.fct
+    if abs(g - 16) > 0.01:
+        print("Offset {}: gust {}, expected 16".format(off, g))
+
+# Test poll with uneven slot durations and counter wrap-around
+print("Test jitter and wrap")
+c = Ctr()
+a = wind.Anemo(c, 1)
+c.v = 32760
+a.g_count = c.v
+for dt, n in ((240, 3), (260, 3), (250, 3), (300, 3)) * 3:
+    a._slot(a._count_diff((a.g_count + n) & 0x7FFF, a.g_count), dt)
+    a.g_count = (a.g_count + n) & 0x7FFF
+g = a.wg_max * a.fct
+if abs(g - 36 / 3.15) > 0.01:
+    print("Jitter gust {}, expected {}".format(g, 36 / 3.15))
+
+# Test read resets the max but keeps the window sliding
+print("Test read")
+a = wind.Anemo(Ctr(), 1)
+feed(a, 20, 12)
+a.ws_at = None
+a.read()
+feed(a, 4, 1)
+if abs(a.wg_max * a.fct - (11 * 5 + 1) * 4 / 12) > 0.01:
+    print("Gust after read {}".format(a.wg_max * a.fct))
+
+try:
+    wind.Anemo(Ctr(), 1, gust_ms=100)
+    print("Invalid window accepted")
+except ValueError:
+    pass
+
+print("--END--")
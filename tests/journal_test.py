@@ -0,0 +1,80 @@
+import journal, json
+import uasyncio as asyncio
+from sample import *
+print("Starting journal test")
+
+j = journal.Journal(path="/journal_test", ram_recs=5, seg_recs=12, batch_recs=4)
+s = Sample()
+
+def store(i):
+    s.clear()
+    s.ts = 1000 + i
+    s.set(WDIR, i)
+    j.store(s)
+
+class Client:
+    # stand-in for the MQTT client that collects the replayed records
+    def __init__(self): self.got = []
+    def isconnected(self): return True
+    async def publish(self, topic, msg, qos=0, sync=True):
+        await asyncio.sleep_ms(1)
+        self.got += json.loads(bytes(msg))
+
+# Test outage: 40 records with room for 2 segments of 10 (2 spills of 5) plus 5 in RAM, the
+# most recent segment is being filled with its first spill
+print("Test outage")
+for i in range(40):
+    store(i)
+if j.backlog() != 20 or j.dropped != 20:
+    print("Backlog {} dropped {}, expected 20 and 20".format(j.backlog(), j.dropped))
+
+# Test replay while new records keep arriving
+print("Test replay")
+client = Client()
+async def main():
+    asyncio.create_task(j.replay(client, "test", period_ms=5))
+    for i in range(40, 50):
+        await asyncio.sleep_ms(7)
+        store(i)
+    await asyncio.sleep_ms(500)
+asyncio.run(main())
+got = [r["ts"] - 1000 for r in client.got]
+if got != list(range(20, 50)):
+    print("Replayed {}, expected 20..49".format(got))
+if any(r["wdir"] != r["ts"] - 1000 for r in client.got):
+    print("Replayed records don't match")
+if j.backlog() != 0:
+    print("Backlog {} after replay".format(j.backlog()))
+
+# Test a reset during replay: a fresh journal resumes after the records already replayed from
+# flash, only the records that were in RAM are lost
+print("Test reset during replay")
+j = journal.Journal(path="/journal_reset", ram_recs=5, seg_recs=12, batch_recs=4)
+for i in range(20):
+    store(i)
+flash = j.backlog() - j.ram_cnt
+
+class Flaky(Client):
+    # the connection goes down after two batches
+    def isconnected(self): return len(self.got) < 8
+
+client = Flaky()
+async def replay(period_ms):
+    t = asyncio.create_task(j.replay(client, "test", period_ms=5))
+    await asyncio.sleep_ms(period_ms)
+    t.cancel()
+asyncio.run(replay(100))
+if len(client.got) != 8:
+    print("Replayed {} records before the reset, expected 8".format(len(client.got)))
+j = journal.Journal(path="/journal_reset", ram_recs=5, seg_recs=12, batch_recs=4)
+if j.backlog() != flash - 8:
+    print("Backlog {} after the reset, expected {}".format(j.backlog(), flash - 8))
+client = Client()
+asyncio.run(replay(500))
+got = [r["ts"] - 1000 for r in client.got]
+if got != list(range(8, flash)):
+    print("Replayed {} after the reset, expected 8..{}".format(got, flash - 1))
+if j.backlog() != 0:
+    print("Backlog {} after replay".format(j.backlog()))
+
+print("--END--")
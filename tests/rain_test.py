@@ -61,4 +61,80 @@ if True:
     print("Ending at", time.localtime(now+60))
     p(1, 0, (0, 0, 0))
 
+    # Test rolling 1-hour and 24-hour totals
+    print("Test rolling totals")
+    rain = rain.__class__(rain_ctr)
+
+    def tot(dt, dc, exp):
+        # add dt minutes to time, add dc to count, read and check the totals
+        global now, cnt
+        now += dt * 60
+        cnt = (cnt + dc) & 0x7FFF
+        rain.read(now, cnt)
+        got = rain.totals()
+        if not eq(got[0], exp[0]) or not eq(got[1], exp[1]):
+            print("At {} with count {} got totals {}, expected {}".format(
+                (now-start)/60, cnt, got, exp))
+
+    tot(0, 0, (0, 0))
+    for i in range(30):
+        tot(1, 1, (0.01*(i+1), 0.01*(i+1)))  # one tip a minute for 30 minutes
+    tot(30, 0, (0.30, 0.30))  # the first tip is still in the past hour
+    tot(1, 0, (0.29, 0.30))
+    tot(28, 0, (0.01, 0.30))
+    tot(1, 0, (0, 0.30))
+    tot(22*60, 5, (0.05, 0.35))
+    tot(20, 0, (0.05, 0.35))
+    tot(11, 0, (0.05, 0.34))  # the first tip left the past 24 hours
+    tot(29, 0, (0, 0.05))
+    tot(23*60-1, 0, (0, 0.05))
+    tot(1, 0, (0, 0))
+    tot(3*24*60, 3, (0.03, 0.03))  # a gap of days clears the history
+
+    # Test rain rate from the tip times
+    print("Test tip mode")
+
+    class Pin:
+        def irq(self, handler=None, trigger=None): self.handler = handler
+
+    try:
+        rain.__class__(rain_ctr).tip_mode()
+        print("Tip mode without a pin didn't raise")
+    except ValueError:
+        pass
+    pin = Pin()
+    rain = rain.__class__(rain_ctr, pin=pin)
+    rain.tip_mode(debounce_ms=50)
+    if pin.handler is None:
+        print("Tip mode didn't set the pin interrupt handler")
+    ms = 0
+
+    def tips(secs, dt, dc=1):
+        # tip dc times every dt seconds for secs seconds, then read with the minute's count
+        global now, cnt, ms
+        for i in range(secs // dt):
+            ms += dt * 1000
+            for j in range(dc):
+                rain.tip_times.record(ms + j * 10)  # a bounce follows each tip
+            cnt += 1
+        now += secs
+        ms += secs % dt * 1000
+        return rain.read(now, cnt, ms)
+
+    def chk(got, exp, what):
+        if not eq(got[0], exp):
+            print("{}: got rate {}, expected {}".format(what, got[0], exp))
+
+    tips(60, 60)
+    chk(tips(60, 60), 0.6, "Tip a minute")
+    chk(tips(60, 10, 2), 3.6, "Tip every 10s")  # bounces ignored, rate follows within a minute
+    chk(tips(60, 60), 0.01*3600*3/80, "Tip after 10s tips")  # the last 3 intervals: 10+10+60s
+    got = tips(120, 200)
+    chk(got, 0.01*3600/120, "No tip for 2 minutes")  # bounded by the time since the last tip
+    chk(tips(240, 300), 0, "No tip for 6 minutes")
+    rain = rain.__class__(rain_ctr, pin=pin)
+    rain.tip_mode(debounce_ms=50, tip_ms=500)
+    tips(60, 60)
+    chk(tips(60, 5), 0.01*3600/4.5, "Tip every 5s, 0.5s tips")
+
     print("--END--")
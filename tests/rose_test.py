@@ -0,0 +1,41 @@
+import wind, json
+
+print("Starting rose test")
+
+r = wind.Rose([1, 4, 8])
+
+# Test sector boundaries and bins
+print("Test sectors")
+for d, speed, sector, b in (
+    (0, 5, 0, 2),
+    (11, 5, 0, 2),
+    (12, 5, 1, 2),
+    (349, 0.5, 0, 0),
+    (348, 1, 15, 1),
+    (90, 8, 4, 3),
+    (180, 3.9, 8, 1),
+    (270, 100, 12, 3),
+):
+    before = r.counts[sector * 4 + b]
+    r.add(d, speed)
+    if r.counts[sector * 4 + b] != before + 1:
+        print("Dir {} speed {} not counted in sector {} bin {}".format(d, speed, sector, b))
+
+# Test encoding and reset
+print("Test encode")
+msg = json.loads(r.encode())
+if msg["n"] != 8 or msg["bounds"] != [1, 4, 8] or len(msg["rose"]) != 16:
+    print("Encoded {}".format(msg))
+if msg["rose"][0] != [1, 0, 2, 0] or sum(sum(s) for s in msg["rose"]) != 8:
+    print("Encoded counts {}".format(msg["rose"]))
+if r.n != 0 or any(r.counts):
+    print("Not reset")
+
+# Test saturation
+print("Test saturation")
+r.counts[0] = 0xFFFF
+r.add(0, 0)
+if r.counts[0] != 0xFFFF:
+    print("Count wrapped to {}".format(r.counts[0]))
+
+print("--END--")
@@ -0,0 +1,43 @@
+import sample, json, gc
+from sample import *
+print("Starting sample test")
+
+s = sample.Sample()
+
+def check(vals):
+    # set the values, encode, and compare the decoded JSON against the expected values
+    s.clear()
+    for ix, v in vals.items():
+        s.set(ix, v)
+    n = s.encode()
+    got = json.loads(bytes(s.buf[:n]))
+    for ix, v in vals.items():
+        exp = round(v, DECIMALS[ix])
+        name = NAMES[ix].decode()
+        if name not in got or abs(got[name] - exp) > 10 ** -DECIMALS[ix]:
+            print("Field {}: got {}, expected {}".format(name, got.get(name), exp))
+    if len(got) != len(vals):
+        print("Got {} fields, expected {}".format(len(got), len(vals)))
+
+print("Test empty record")
+check({})
+print("Test all fields")
+check({T_BME680: 21.456, H_BME680: 45.67, P_BME680: 0.98765, G_BME680: 123456, T_SI7021: -3.5,
+    H_SI7021: 100, T_SHT31: -0.004, H_SHT31: 0.05, WIND: 3.14159, GUST: 12.5, WDIR: 359,
+    PM25: 7.25, AQI_TVOC: 42, AQI_PM25: 0})
+print("Test sparse record")
+check({P_BME680: 1.01325, WDIR: 0})
+
+print("Test steady-state allocation")
+gc.collect()
+s.clear()
+s.set(T_BME680, 20)
+s.set(WDIR, 180)
+f0 = gc.mem_free()
+for _ in range(100):
+    s.encode()
+f1 = gc.mem_free()
+if f0 - f1 > 200:
+    print("Encoding allocated {} bytes".format(f0 - f1))
+
+print("--END--")
@@ -0,0 +1,102 @@
+import wind, time
+
+print("Starting sampler test")
+
+
+class Ctr:
+    def __init__(self):
+        self.v = 0
+
+    def value(self):
+        return self.v
+
+
+class Pin:
+    # the vane's ADC, the raw value is set by the test
+    def __init__(self):
+        self.raw = 0
+
+    def read(self):
+        return self.raw
+
+
+ctr = Ctr()
+pin = Pin()
+a = wind.Anemo(ctr, 1)
+v = wind.Vane(pin, 0, 3300, 0)
+rose = wind.Rose([1, 4, 8])
+s = wind.Sampler(a, v, rose)
+
+
+def raw_for(d):
+    # raw ADC value the vane reads as direction d
+    for raw in range(1024):
+        if v.lut[raw] >= d:
+            return raw
+
+
+def step(pulses, d):
+    # one 250ms slot with pulses counted and the vane pointing at d
+    ctr.v = (ctr.v + pulses) & 0x7FFF
+    pin.raw = raw_for(d)
+    a.g_at = time.ticks_add(time.ticks_ms(), -250)
+    s.poll()
+
+
+# Test the gust direction comes from the slots of the gust: a steady 4Hz northerly with a
+# 3s 20Hz gust from the east straddling a 3s block
+print("Test gust direction")
+a.g_count = ctr.v
+for _ in range(20):
+    step(1, 0)
+for _ in range(12):
+    step(5, 90)
+for _ in range(20):
+    step(1, 0)
+gd = s.read_gust_dir()
+if gd is None or abs(gd - v.lut[raw_for(90)]) > 1:
+    print("Gust direction {}, expected about 90".format(gd))
+if s.read_gust_dir() is not None:
+    print("Gust direction not reset")
+
+# Test the direction is weighted by the aligned speed: unweighted 12 of 52 samples from the east
+# give 17 degrees, weighted the gust pulls it further east
+print("Test weighted direction")
+d, m = v.read_vector()
+if not 25 < d < 90:
+    print("Vector direction {}, expected well east of 17".format(d))
+
+# Test the rose gets one sample per second
+print("Test rose")
+if rose.n != 52 // 4:
+    print("Rose samples {}, expected {}".format(rose.n, 52 // 4))
+
+# Test circular variance: steady then split between two opposite directions
+print("Test variance")
+for _ in range(8):
+    step(2, 180)
+if v.variance() > 0.001:
+    print("Steady variance {}".format(v.variance()))
+v.read_vector()
+for k in range(8):
+    step(2, 90 if k & 1 else 270)
+if abs(v.variance() - 1) > 0.01:
+    print("Split variance {}".format(v.variance()))
+
+# Test the vane's average follows a wind shift as fast when polled every slot as when polled
+# every second: it's updated once per second either way
+print("Test average time constant")
+for _ in range(400):
+    step(1, 0)  # settle on the north
+w = wind.Vane(pin, 0, 3300, 0)
+w.dir = v.read()
+pin.raw = raw_for(90)
+for _ in range(5):
+    w.poll()
+for _ in range(20):
+    step(1, 90)
+if v.poll_ms != 250 or abs(v.read() - w.read()) > 1:
+    print("Average {} after 5s polled every 250ms, {} polled every second".format(v.read(),
+        w.read()))
+
+print("--END--")
@@ -0,0 +1,133 @@
+import sample, sched, time
+import uasyncio as asyncio
+from sample import T_SHT31
+
+print("Starting scheduler test")
+
+runs = {}  # ticks_ms of the runs of each task
+active = 0  # tasks running at the moment
+max_active = 0
+
+
+def reader(name, fail=False, block_ms=0):
+    # return a task function that records its runs, sets T_SHT31 to the run count, and blocks
+    # for block_ms on its first run
+    runs[name] = []
+
+    def fn(c):
+        r = runs[name]
+        r.append(time.ticks_ms())
+        if block_ms and len(r) == 1:
+            time.sleep_ms(block_ms)
+        if fail:
+            raise OSError(5)
+        c.set(T_SHT31, len(r))
+
+    return fn
+
+
+def converter(name):
+    # return a task coroutine function that takes 300ms, like an I2C sensor conversion
+    runs[name] = []
+
+    async def fn(c):
+        global active, max_active
+        runs[name].append(time.ticks_ms())
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep_ms(300)
+        active -= 1
+        c.set(T_SHT31, 1)
+
+    return fn
+
+
+def idle(sc):
+    # the scheduler's tasks can't be stopped, let them do nothing for the rest of the test
+    for t in sc.tasks:
+        t.fn = lambda c: None
+
+
+def gaps(name):
+    r = runs[name]
+    return [time.ticks_diff(r[i], r[i - 1]) for i in range(1, len(r))]
+
+
+async def main():
+    global max_active
+
+    # Test staleness: a task that stops updating its cache is dropped after 3 periods, and its
+    # failures are counted until it runs fine again
+    print("Test staleness and errors")
+    sc = sched.Scheduler()
+    fn = reader("ok")
+    t = sc.add("flaky", 1000, fn)
+    sc.start()
+    await sc.settle()
+    t.fn = reader("flaky", fail=True)
+    await asyncio.sleep_ms(2500)
+    s = sample.Sample()
+    sc.collect(s)
+    if s.get(T_SHT31) != 1:
+        print("Collected {} after 2.5s, expected 1".format(s.get(T_SHT31)))
+    await asyncio.sleep_ms(600)
+    s.clear()
+    sc.collect(s)
+    if s.has(T_SHT31):
+        print("Collected {} after 3 periods, expected it stale".format(s.get(T_SHT31)))
+    if t.errors != len(runs["flaky"]) or t.errors < 3:
+        print("Counted {} errors in {} runs".format(t.errors, len(runs["flaky"])))
+    t.fn = fn
+    await asyncio.sleep_ms(1000)
+    s.clear()
+    sc.collect(s)
+    if t.errors != 0 or s.get(T_SHT31) != 2:
+        print("After recovery {} errors and {}, expected 0 and 2".format(t.errors, s.get(T_SHT31)))
+    idle(sc)
+
+    # Test the fast_ms cap: the periods shrink to it, and grow back when it's cleared
+    print("Test fast_ms")
+    sc = sched.Scheduler()
+    sc.add("slow", 10000, reader("slow"))
+    sc.fast_ms = 500
+    sc.start()
+    await asyncio.sleep_ms(2100)
+    if len(runs["slow"]) != 5:
+        print("Ran {} times in 2.1s with fast_ms 500, expected 5".format(len(runs["slow"])))
+    sc.fast_ms = 0
+    await asyncio.sleep_ms(5000)
+    if len(runs["slow"]) != 5:
+        print("Ran {} times with fast_ms cleared, expected 5".format(len(runs["slow"])))
+    idle(sc)
+
+    # Test missed periods: a run that takes several periods is followed by runs at the normal
+    # period, not by a burst catching up on the missed ones
+    print("Test missed periods")
+    sc = sched.Scheduler()
+    sc.add("stuck", 1000, reader("stuck", block_ms=3500))
+    sc.start()
+    await asyncio.sleep_ms(7000)
+    g = gaps("stuck")
+    if not g or g[0] < 3500 or min(g) < 900:
+        print("Runs {}ms apart, expected one 3500ms gap then 1000ms".format(g))
+    idle(sc)
+
+    # Test the lock: tasks sharing it don't overlap, without it they do
+    print("Test lock")
+    for lock in (None, asyncio.Lock()):
+        max_active = 0
+        sc = sched.Scheduler()
+        for name in ("a", "b", "c"):
+            sc.add(name, 1000, converter(name), lock)
+        sc.start()
+        await asyncio.sleep_ms(3000)
+        n = min(len(runs[name]) for name in ("a", "b", "c"))
+        if lock and max_active != 1 or not lock and max_active != 3:
+            print("{} tasks ran at once with lock {}".format(max_active, lock))
+        if n < 3:
+            print("A task ran only {} times in 3s".format(n))
+        idle(sc)
+
+
+asyncio.run(main())
+print("--END--")
@@ -0,0 +1,44 @@
+import stats, json, time
+print("Starting stats test")
+
+s = stats.Stats()
+sleepy = s.stage("sleepy")
+alloc = s.stage("alloc")
+if s.stage("sleepy") != sleepy or s.names != ["sleepy", "alloc"]:
+    print("Stages {} registered as {}".format(s.names, (sleepy, alloc)))
+
+# Test timing aggregates
+print("Test timing")
+for ms in (5, 20, 10):
+    s.begin(sleepy)
+    time.sleep_ms(ms)
+    s.end(sleepy)
+buf = None
+for _ in range(4):
+    s.begin(alloc)
+    buf = bytearray(1000)
+    s.end(alloc)
+msg = json.loads(s.encode())
+st = msg["stages"]["sleepy"]
+if st["n"] != 3:
+    print("Count {}, expected 3".format(st["n"]))
+if not (5000 <= st["t_min"] < 10000 and 20000 <= st["t_max"] < 25000):
+    print("Min {} max {}, expected about 5000 and 20000".format(st["t_min"], st["t_max"]))
+if not st["t_min"] <= st["t_avg"] <= st["t_max"]:
+    print("Average {} out of range".format(st["t_avg"]))
+
+# Test allocation, unless a garbage collection happened during every span
+print("Test allocation")
+st = msg["stages"]["alloc"]
+if st["a_max"] is not None and st["a_max"] < 1000:
+    print("Max allocation {}, expected at least 1000".format(st["a_max"]))
+if st["free"] <= 0:
+    print("Free {}".format(st["free"]))
+
+# Test reset
+print("Test reset")
+msg = json.loads(s.encode())
+if msg["stages"]:
+    print("Stages {} after reset".format(msg["stages"]))
+
+print("--END--")
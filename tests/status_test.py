@@ -0,0 +1,84 @@
+import framebuf, status
+
+print("Starting status display test")
+
+
+class Disp(framebuf.FrameBuffer):
+    # stand-in for the SSD1306 driver that records the transfers: (first page, last page, bytes)
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(width * height // 8)
+        super().__init__(self.buffer, width, height, framebuf.MONO_VLSB)
+        self.cmds = []
+        self.sent = []
+
+    def show(self):
+        self.sent.append((0, self.height // 8 - 1, len(self.buffer)))
+
+    def write_cmd(self, cmd):
+        self.cmds.append(cmd)
+
+    def write_data(self, buf):
+        # the page range is the last two commands of the addressing sequence
+        self.sent.append((self.cmds[-2], self.cmds[-1], len(buf)))
+        self.cmds.clear()
+
+
+LABELS = ("T ", "P ", "T2 ", "T3 ", "PM ", "W ", "M ")
+
+d = Disp()
+s = status.StatusDisplay(d)
+
+# Test the first screen: every page is dirty, sent with show()
+print("Test full screen")
+s.screen(LABELS)
+for i in range(len(LABELS)):
+    s.line(i, "%d" % i)
+s.flush()
+if d.sent != [(0, 7, 1024)]:
+    print("Sent {}, expected show()".format(d.sent))
+
+# Test changed lines: only their pages are sent, adjacent ones in one transfer
+print("Test changed pages")
+d.sent.clear()
+s.screen(LABELS)
+for i, v in enumerate(("0", "1x", "2x", "3", "4", "5", "6x")):
+    s.line(i, v)
+s.flush()
+if d.sent != [(1, 2, 256), (6, 6, 128)]:
+    print("Sent {}, expected pages 1-2 and 6".format(d.sent))
+
+# Test unchanged lines: nothing is sent
+d.sent.clear()
+s.line(1, "1x")
+s.flush()
+if d.sent:
+    print("Sent {} for unchanged lines".format(d.sent))
+
+# Test the big number modes: the screen switch sends everything, an unchanged update nothing,
+# and a new number only the pages of the digits
+print("Test big number")
+s.big("Wind dir: 270", "270o")
+s.flush()
+if d.sent != [(0, 7, 1024)]:
+    print("Sent {}, expected show()".format(d.sent))
+d.sent.clear()
+s.big("Wind dir: 270", "270o")
+s.flush()
+if d.sent:
+    print("Sent {} for an unchanged number".format(d.sent))
+s.big("Wind dir: 271", "271o")
+s.flush()
+if d.sent != [(0, 0, 128), (2, 7, 768)]:
+    print("Sent {}, expected the title and the digit pages".format(d.sent))
+
+# Test invalidate: the next update redraws everything
+d.sent.clear()
+s.invalidate()
+s.screen(LABELS)
+s.flush()
+if d.sent != [(0, 7, 1024)]:
+    print("Sent {} after invalidate, expected show()".format(d.sent))
+
+print("--END--")
@@ -0,0 +1,65 @@
+import wind, math
+
+print("Starting turbulence test")
+
+
+class Ctr:
+    def value(self):
+        return 0
+
+
+class Pin:
+    def read(self):
+        return 0
+
+
+# Test sigma-theta against the standard deviation computed from the stored samples
+print("Test sigma-theta")
+v = wind.Vane(Pin(), 0, 1000, 0)
+if v.sigma_theta() is not None:
+    print("Sigma-theta without samples")
+for dirs in ([90] * 10, [80, 100] * 10, [350, 10] * 10, [0, 15, 30, 45, 30, 15] * 5):
+    for d in dirs:
+        v._vector(d, 1)
+    mean = sum(((d + 180) % 360 - 180) for d in dirs) / len(dirs)
+    sd = math.sqrt(sum((((d + 180) % 360 - 180) - mean) ** 2 for d in dirs) / len(dirs))
+    st = v.sigma_theta()
+    if abs(st - sd) > max(0.05 * sd, 0.1):
+        print("Dirs {}..: sigma-theta {:.2f}, expected {:.2f}".format(dirs[:4], st, sd))
+    v.read_vector()
+
+# Test uniformly spread directions give the estimator's ceiling of about 103 degrees
+for d in range(0, 360, 10):
+    v._vector(d, 1)
+if abs(v.sigma_theta() - 103.9) > 0.5:
+    print("Uniform sigma-theta {:.1f}".format(v.sigma_theta()))
+
+# Test turbulence intensity from 1 second speeds alternating 8 and 12Hz
+print("Test turbulence")
+a = wind.Anemo(Ctr(), 1)
+if a.turbulence() is not None:
+    print("Turbulence without samples")
+for k in range(600):
+    c = 8 if k & 1 else 12
+    for _ in range(4):
+        a._history(c // 4, 250)
+exp = math.sqrt(600 * 4 / 599) / 10
+if abs(a.turbulence() - exp) > 1e-3:
+    print("Turbulence {:.4f}, expected {:.4f}".format(a.turbulence(), exp))
+
+# Test read() resets, and steady wind has no turbulence
+a.ws_at = None
+a.read()
+for _ in range(40):
+    a._history(2, 250)
+if a.turbulence() != 0:
+    print("Steady turbulence {}".format(a.turbulence()))
+
+# Test calm has no turbulence intensity
+a.read()
+for _ in range(40):
+    a._history(0, 250)
+if a.turbulence() is not None:
+    print("Calm turbulence {}".format(a.turbulence()))
+
+print("--END--")
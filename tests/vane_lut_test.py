@@ -0,0 +1,58 @@
+import wind
+from esp32_adccal import ADCCal
+
+print("Starting vane LUT test")
+
+
+class Pin:
+    def __init__(self):
+        self.vals = []
+
+    def read(self):
+        return self.vals.pop(0) if self.vals else 0
+
+
+pin = Pin()
+v = wind.Vane(pin, 140, 1600, 15)
+
+# Test the table matches the direct calculation for every raw value
+print("Test table")
+cal = ADCCal()
+for raw in range(1024):
+    frac = (cal.correct(raw) - 140) / (1600 - 140)
+    if frac < 0:
+        frac += 1
+    d = (int(frac * 360) + 15) % 360
+    if v.lut[raw] != d:
+        print("Raw {}: {} expected {}".format(raw, v.lut[raw], d))
+
+# Test the median rejects outliers in the burst
+print("Test median")
+pin.vals = [400, 401, 1023, 399, 0, 400, 402]
+d = v._raw_read()
+if d != v.lut[400]:
+    print("Median dir {} expected {}".format(d, v.lut[400]))
+if pin.vals:
+    print("Burst left {} reads".format(len(pin.vals)))
+
+# Test observed min/max in calibrated units
+print("Test min/max")
+pin.vals = [100] * 7
+v._raw_read()
+pin.vals = [900] * 7
+v._raw_read()
+if v.min_max() != (cal.correct(100), cal.correct(900)):
+    print("Min/max {}".format(v.min_max()))
+
+# Test out of range readings are clamped
+pin.vals = [4095] * 7
+if v._raw_read() != v.lut[1023]:
+    print("Out of range reading not clamped")
+
+try:
+    wind.Vane(pin, 140, 1600, 15, samples=0)
+    print("Invalid samples accepted")
+except ValueError:
+    pass
+
+print("--END--")
@@ -0,0 +1,56 @@
+import wind
+
+print("Starting vector test")
+
+
+class Pin:
+    def read(self):
+        return 0
+
+
+v = wind.Vane(Pin(), 0, 1000, 0)
+
+# Test the trig table
+print("Test table")
+for d, x, y in ((0, 0, 1), (90, 1, 0), (180, 0, -1), (270, -1, 0)):
+    v._vector(d, 1)
+    if abs(v.vx - x) > 1e-6 or abs(v.vy - y) > 1e-6:
+        print("Dir {}: {},{} expected {},{}".format(d, v.vx, v.vy, x, y))
+    v.read_vector()
+
+# Test averaging across north, where the arithmetic mean is wrong
+print("Test north")
+for d in (350, 10, 355, 5):
+    v._vector(d, 5)
+d, m = v.read_vector()
+if d != 0 or abs(m - 5 * (wind._SIN[80] + wind._SIN[85]) / 2) > 1e-3:
+    print("Across north {} {}".format(d, m))
+
+# Test speed weighting: a strong westerly dominates light easterly puffs
+print("Test weighting")
+for _ in range(4):
+    v._vector(270, 10)
+    v._vector(90, 1)
+d, m = v.read_vector()
+if d != 270 or abs(m - 4.5) > 1e-3:
+    print("Weighted {} {}, expected 270 4.5".format(d, m))
+
+# Test calm: the unweighted direction is used, magnitude 0
+print("Test calm")
+for d in (40, 50, 60):
+    v._vector(d, 0)
+d, m = v.read_vector()
+if d != 50 or m != 0:
+    print("Calm {} {}, expected 50 0".format(d, m))
+
+# Test reset and the mean resultant length without speeds
+print("Test reset")
+if v.read_vector() != (None, 0):
+    print("Not reset")
+for d in (0, 90):
+    v._vector(d, 1)
+d, m = v.read_vector()
+if d != 45 or abs(m - 0.7071) > 1e-3:
+    print("Unit {} {}, expected 45 0.707".format(d, m))
+
+print("--END--")
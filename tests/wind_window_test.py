@@ -0,0 +1,119 @@
+import wind
+
+print("Starting wind window test")
+
+
+class Ctr:
+    def __init__(self):
+        self.v = 0
+
+    def value(self):
+        return self.v
+
+
+def feed(anemo, hz, secs):
+    # feed secs seconds of 250ms slots at a pulse rate of hz (a multiple of 4)
+    for _ in range(secs * 4):
+        anemo._slot(hz // 4, 250)
+        anemo._history(hz // 4, 250)
+
+
+def near(a, b):
+    return abs(a - b) < 0.01
+
+
+a = wind.Anemo(Ctr(), 1)  # 1 mph per Hz, so speeds in mph equal Hz
+a.window("2m", 120)
+a.window("10m", 600)
+a.window("1h", 3600)
+
+# Test partial windows before enough history
+print("Test partial")
+if a.read_window("1h") != (0, 0, 0):
+    print("Empty window {}".format(a.read_window("1h")))
+feed(a, 8, 60)
+for name in ("2m", "10m", "1h"):
+    w, g, n = a.read_window(name)
+    if n != 60 or not near(w, 8) or not near(g, 8):
+        print("{}: {} {} {}, expected 8 8 60".format(name, w, g, n))
+
+# Test windows sliding: 10 min at 8Hz then 2 min at 20Hz with a 40Hz gust
+print("Test sliding")
+feed(a, 8, 540)
+feed(a, 20, 50)
+feed(a, 40, 3)
+feed(a, 20, 67)
+w, g, n = a.read_window("2m")
+if n != 120 or not near(w, 20 + 60 / 120) or not near(g, 40):
+    print("2m: {} {} {}".format(w, g, n))
+w, g, n = a.read_window("10m")
+if n != 600 or not near(w, (480 * 8 + 117 * 20 + 3 * 40) / 600) or not near(g, 40):
+    print("10m: {} {} {}".format(w, g, n))
+w, g, n = a.read_window("1h")
+if n != 720 or not near(w, (600 * 8 + 117 * 20 + 3 * 40) / 720) or not near(g, 40):
+    print("1h: {} {} {}".format(w, g, n))
+
+# Test the gust leaving the window
+print("Test gust expiry")
+feed(a, 8, 123)  # the 3s gust window lags by up to 3s
+w, g, n = a.read_window("2m")
+if not near(w, 8) or not near(g, 8):
+    print("2m after gust: {} {}".format(w, g))
+if not near(a.read_window("10m")[1], 40):
+    print("10m lost the gust")
+
+# Test the hour is kept per minute: a per-second ring as long as the longest short window, a
+# per-minute ring for the hour, which only covers whole minutes
+print("Test minute ring")
+if len(a.h_cnt) != 600 or len(a.m_cnt) != 60:
+    print("Rings of {}s and {}min, expected 600 and 60".format(len(a.h_cnt), len(a.m_cnt)))
+n = a.read_window("1h")[2]
+feed(a, 8, 30)
+if a.read_window("1h")[2] != n:
+    print("1h covers {}s after half a minute, expected {}".format(a.read_window("1h")[2], n))
+feed(a, 8, 30)
+if a.read_window("1h")[2] != n + 60:
+    print("1h covers {}s after a minute, expected {}".format(a.read_window("1h")[2], n + 60))
+c = wind.Anemo(Ctr(), 1)
+c.window("1h", 3600)
+feed(c, 8, 3660)
+feed(c, 20, 60)
+w, g, n = c.read_window("1h")
+if n != 3600 or not near(w, (59 * 8 + 20) / 60) or not near(g, 20):
+    print("1h after wrapping: {} {} {}".format(w, g, n))
+if c.h_cnt is not None:
+    print("Per-second ring allocated for an hour window")
+
+# Test independent consumers: read() and read_window() don't disturb each other
+print("Test consumers")
+before = a.read_window("10m")
+a.ws_at = None
+a.read()
+a.read_window("2m")
+if a.read_window("10m") != before:
+    print("10m changed from {} to {}".format(before, a.read_window("10m")))
+
+# Test the window sums match a recomputation over the ring after wrapping around many times
+print("Test ring wrap")
+b = wind.Anemo(Ctr(), 1)
+b.window("a", 7)
+b.window("b", 10)
+for i in range(95):
+    feed(b, 4 * (i % 5), 1)
+for name, secs in (("a", 7), ("b", 10)):
+    exp = sum(4 * ((94 - j) % 5) for j in range(secs)) / secs
+    if not near(b.read_window(name)[0], exp):
+        print("{}: {} expected {}".format(name, b.read_window(name)[0], exp))
+
+# Test registering a shorter window later sums the history that's there
+b.window("c", 5)
+exp = sum(4 * ((94 - j) % 5) for j in range(5)) / 5
+if not near(b.read_window("c")[0], exp) or b.read_window("c")[2] != 5:
+    print("Late window: {} expected {}".format(b.read_window("c"), exp))
+
+# Test a stall pushes zero seconds
+b._history(0, 60000)
+if b.read_window("b")[:3:2] != (0, 10):
+    print("After stall: {}".format(b.read_window("b")))
+
+print("--END--")